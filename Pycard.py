@@ -1,16 +1,149 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, filedialog, ttk
-import json
+import base64
+import itertools
 import random
 import datetime
 import os
-import csv
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import re
+import time
+import bulk
+from activity import DailyActivity, format_duration
+from cards import (SEARCH_KEYS, assign_card_ids, new_card, parse_tags, touch_card,
+                   validate_text_input)
+from charts import ChartRenderer, charts_available, render_activity_chart
+from filtered import PRESETS, FilteredDeck
+from history import ReviewHistory
+from index import CardIndex, DayLoads, bitmap_count, bitmap_indices
+from query import QueryError, search
+from review_queue import DEFAULT_DAILY_LIMIT, MergedDueQueue, reviews_today
+from scheduler import fit_decks, group_reviews_by_deck, schedule_review
+from storage import (SCHEMA_VERSION, SNAPSHOT_EXTENSIONS, DeckStore, merge_deck_cards,
+                     read_snapshot, write_snapshot)
+from apkg import ApkgReader, write_apkg
+from exporter import BASIC_FIELDS, FORMATS, FULL_FIELDS, export_collection, export_per_deck
+from importer import collect_import_files, import_files
+from integrity import canonical_decks, vacuum
+from jobs import JobRunner
+from media import IMAGE_FIELDS, ImageCache, MediaStore, card_images, supported_extensions
+from memreport import MemoryProfiler, measure, tk_report
+from plugins import (HOOKS, PLUGIN_DIR, load_plugins, valid_import_row, valid_quality,
+                     valid_rendered)
+from sync import read_sync_state, record_changes, sync_collection
+from undo import (CardEdit, CardMoves, CardRows, DeckPresence, DeckRename, ReviewAnswer,
+                  UndoError, UndoLog)
+
+def write_collection(context, store, settings, deck_counts, changed, journal, overwrite):
+    """Tarefa de gravação (ver FlashcardApp.save_data). Retorna False se
+    outro processo gravou depois que a gravação foi preparada."""
+    with store.lock():
+        if overwrite:
+            if store.exists():
+                store.read_manifest()
+        elif store.exists() and store.changed_on_disk():
+            return False
+        store.save(settings, deck_counts, changed)
+        record_changes(store.directory, journal)
+    return True
+
+
+def read_apkg_cards(context, path, target=None):
+    """Tarefa de leitura de um .apkg: ({baralho: cartões}, ignorados).
+    target, se informado, junta todos os cartões em um único baralho."""
+    by_deck = {}
+    with ApkgReader(path) as reader:
+        total = reader.count()
+        done = 0
+        for batch in reader.batches():
+            context.check()
+            for deck_name, card in batch:
+                by_deck.setdefault(target or deck_name, []).append(card)
+            # Chaves de busca calculadas aqui, fora da thread do Tk
+            SEARCH_KEYS.add_cards([card for _, card in batch])
+            done += len(batch)
+            context.progress(done + reader.skipped, total, f"{done} cartões")
+        return by_deck, reader.skipped
+
+
+def write_backup(context, directory, path):
+    """Grava um backup da coleção lida da pasta de dados, baralho a baralho"""
+    store = DeckStore(directory)
+    flashcards = []
+    decks = {}
+    with store.lock():
+        manifest = store.read_manifest()
+        names = list(manifest["decks"])
+        for n, deck_name in enumerate(names):
+            context.check()
+            context.progress(n, len(names), deck_name)
+            cards = store.load_deck(deck_name)
+            decks[deck_name] = list(range(len(flashcards), len(flashcards) + len(cards)))
+            flashcards.extend(cards)
+    data = {"flashcards": flashcards, "decks": decks, "schema": store.schema}
+    data.update(manifest["settings"])
+    write_snapshot(path, data)
+
+
+def collection_stats(cards):
+    """Contagens da tela de estatísticas em uma única passada (as datas são
+    comparadas como texto, sem strptime)"""
+    current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    total = pending = reviewed = easy = medium = hard = 0
+    for card in cards:
+        total += 1
+        if not card["next_review"] or card["next_review"] <= current_date:
+            pending += 1
+        if card["last_review"]:
+            reviewed += 1
+        if card["ease_factor"] >= 2.8:
+            easy += 1
+        elif card["ease_factor"] >= 2.2:
+            medium += 1
+        else:
+            hard += 1
+    return {"total": total, "pending": pending, "reviewed": reviewed,
+            "easy": easy, "medium": medium, "hard": hard}
+
+
+def track_cards(context, sources, total):
+    """Repassa (baralho, cartões) de uma exportação informando o progresso e
+    verificando o cancelamento a cada PROGRESS_BATCH cartões"""
+    done = 0
+    
+    def counted(cards):
+        nonlocal done
+        for n, card in enumerate(cards):
+            if n % PROGRESS_BATCH == 0:
+                context.check()
+                context.progress(done, total, f"{done}/{total} cartões")
+            done += 1
+            yield card
+    
+    for deck_name, cards in sources:
+        yield deck_name, counted(cards)
+
+
+# Máximo de cartões exibidos na lista (a busca conta todos)
+LIST_LIMIT = 5000
+# Cartões entre dois avisos de progresso (e verificações de cancelamento)
+PROGRESS_BATCH = 10000
+# Tempo que uma mensagem passageira fica na barra de status
+STATUS_MESSAGE_MS = 4000
+# Semanas do calendário de atividade e dias dos gráficos de atividade
+HEATMAP_WEEKS = 53
+TREND_DAYS = 90
+# Os plugins são carregados depois que a primeira tela aparece
+PLUGIN_LOAD_DELAY_MS = 500
+# Backups: a compressão é escolhida pela extensão (ver storage.write_snapshot)
+BACKUP_FILETYPES = [("JSON comprimido (gzip)", "*.json.gz"), ("JSON comprimido (xz)", "*.json.xz"),
+                    ("JSON files", "*.json"), ("All files", "*.*")]
 
 class FlashcardApp:
     def __init__(self, root):
+        # Com PYCARD_TRACEMALLOC=1 o relatório de memória enxerga as
+        # alocações desde a inicialização (ver memreport.py)
+        self.memory_profiler = MemoryProfiler()
+        if os.environ.get("PYCARD_TRACEMALLOC"):
+            self.memory_profiler.start_tracing()
         self.root = root
         self.root.title("Sistema de Flashcards - Estilo Anki")
         self.root.geometry("800x600")
@@ -28,21 +161,128 @@ class FlashcardApp:
         # Inicializar variáveis
         self.flashcards = []
         self.decks = {}
+        self.next_card_id = 1
+        self.scheduler_params = {}
+        self.daily_limits = {}
+        self.load_balance = False
+        self.unloaded_decks = {}
+        self.dirty_decks = set()
+        self.deck_base = {}
+        self.sync_journal = []
+        self.collection_version = 0
+        self.card_index = None
+        self.day_loads = DayLoads()
+        self.filtered_decks = {}
+        self.chart_renderer = ChartRenderer()
+        self.chart_image = None
+        self.store = DeckStore("flashcards_data")
+        self.history = ReviewHistory("review_history")
+        # Resumo diário das revisões (calendário, sequência, retenção)
+        self.activity = DailyActivity(self.history)
+        self.activity_renderer = ChartRenderer(render_activity_chart)
+        self.activity_image = None
+        # Imagens: nada é lido até um cartão com imagem ser exibido
+        self.media = MediaStore()
+        self.image_cache = ImageCache(self.media)
         self.current_deck = "Geral"
+        self.current_tag = "Todas"
         self.current_card = None
+        self.upcoming_card = None
+        self.session_name = None
+        self.session_deadline = None
+        self.session_reviewed = 0
         self.showing_answer = False
         self.bidirectional_mode = False
+        # Desfazer/refazer (ver undo.py); a tela atual é redesenhada depois
+        self.undo_log = UndoLog()
+        self.review_queue = None
+        self.current_view = None
+        self.status_message = ""
+        # Tarefas em segundo plano (ver jobs.py) e gravação em andamento
+        self.jobs = JobRunner(root, on_change=self.update_status_bar,
+                              report_error=self.report_job_error)
+        self.save_job = None
+        self.save_requested = False
+        self.save_overwrite = False
+        self.save_callbacks = []
         self.load_data()
         
         # Aplicar tema
         self.apply_theme()
         
+        # Barra de status das tarefas, fora do frame principal (que é limpo
+        # a cada tela)
+        self.create_status_bar()
+        
         # Frame principal
         self.main_frame = tk.Frame(root)
         self.main_frame.pack(pady=20, padx=20, fill="both", expand=True)
         
+        # Atalhos de desfazer/refazer (nos campos de texto ficam com o campo)
+        self.root.bind("<Control-z>", lambda e: self.undo_shortcut(e, self.undo))
+        self.root.bind("<Control-y>", lambda e: self.undo_shortcut(e, self.redo))
+        self.root.bind("<Control-Shift-Z>", lambda e: self.undo_shortcut(e, self.redo))
+        
         # Interface inicial - Menu principal
         self.show_main_menu()
+        self.root.after(PLUGIN_LOAD_DELAY_MS, self.activate_plugins)
+    
+    def activate_plugins(self):
+        """Carrega os plugins da pasta plugins/ (ver plugins.py)"""
+        failed = load_plugins(PLUGIN_DIR)
+        if failed:
+            messagebox.showwarning("Plugins", "Plugins não carregados:\n\n" + 
+                                   "\n".join(f"{name}: {error}" for name, error in failed))
+        elif HOOKS.loaded:
+            self.show_status(f"🔌 {len(HOOKS.loaded)} plugin(s) carregado(s)")
+    
+    def create_status_bar(self):
+        """Barra inferior com a tarefa em andamento, progresso e cancelamento"""
+        self.status_bar = tk.Frame(self.root)
+        self.status_bar.pack(side=tk.BOTTOM, fill="x")
+        self.status_label = tk.Label(self.status_bar, text="", font=("Arial", 10), anchor="w")
+        self.status_label.pack(side=tk.LEFT, padx=10, fill="x", expand=True)
+        self.status_cancel = tk.Button(self.status_bar, text="✖", font=("Arial", 9),
+                                       command=self.cancel_current_job)
+        self.status_progress = ttk.Progressbar(self.status_bar, length=160, mode="determinate")
+    
+    def update_status_bar(self):
+        """Mostra a primeira tarefa ativa (e quantas mais há)"""
+        if not hasattr(self, "status_bar"):
+            return
+        active = self.jobs.active
+        self.status_progress.pack_forget()
+        self.status_cancel.pack_forget()
+        if not active:
+            self.status_label.config(text=self.status_message)
+            return
+        job = active[0]
+        text = f"⏳ {job.title}"
+        if job.message:
+            text += f" — {job.message}"
+        if len(active) > 1:
+            text += f"  (+{len(active) - 1} tarefa(s))"
+        self.status_label.config(text=text)
+        if job.cancellable:
+            self.status_cancel.pack(side=tk.RIGHT, padx=5)
+        fraction = job.fraction
+        self.status_progress.pack(side=tk.RIGHT, padx=5, pady=2)
+        if fraction is None:
+            self.status_progress.config(mode="indeterminate")
+            self.status_progress.step(10)
+        else:
+            self.status_progress.config(mode="determinate", value=fraction * 100)
+    
+    def cancel_current_job(self):
+        """Cancela a primeira tarefa cancelável em andamento"""
+        for job in self.jobs.active:
+            if job.cancellable:
+                job.cancel()
+                self.status_label.config(text=f"⏳ {job.title} — cancelando...")
+                return
+    
+    def report_job_error(self, job, error):
+        messagebox.showerror("Erro", f"Erro em '{job.title}': {error}")
     
     def apply_theme(self):
         """Aplica o tema selecionado"""
@@ -50,64 +290,566 @@ class FlashcardApp:
         self.root.configure(bg=theme["bg"])
     
     def load_data(self):
-        """Carrega os flashcards e baralhos do arquivo JSON"""
+        """Carrega as configurações e a lista de baralhos.
+        
+        Os cartões de cada baralho são lidos sob demanda, na primeira vez em
+        que o baralho é usado (ver ensure_deck_loaded). Um arquivo único
+        flashcards_data.json do formato antigo (ou .json.gz/.json.xz) é migrado no próximo salvamento.
+        """
+        self.flashcards = []
+        self.decks = {"Geral": []}
+        self.unloaded_decks = {}
+        self.dirty_decks = set()
+        self.deck_base = {}
+        self.card_index = None
         try:
-            if os.path.exists("flashcards_data.json"):
-                with open("flashcards_data.json", "r", encoding="utf-8") as file:
-                    data = json.load(file)
-                    self.flashcards = data.get("flashcards", [])
-                    self.decks = data.get("decks", {"Geral": []})
-                    self.current_theme = data.get("theme", "claro")
-                    self.font_size = data.get("font_size", 12)
-                    
-                    # Garantir que todos os flashcards estejam em algum baralho
-                    all_deck_cards = set()
-                    for deck_cards in self.decks.values():
-                        all_deck_cards.update(deck_cards)
-                    
-                    for i, card in enumerate(self.flashcards):
-                        if i not in all_deck_cards:
-                            self.decks["Geral"].append(i)
+            if self.store.exists():
+                manifest = self.store.read_manifest()
+                if self.store.schema < SCHEMA_VERSION:
+                    # Pasta gravada por uma versão anterior: verificada e
+                    # compactada uma única vez (ver integrity.py)
+                    self.check_integrity()
+                    manifest = self.store.read_manifest()
+                self.apply_settings(manifest["settings"])
+                self.decks = {deck_name: [] for deck_name in manifest["decks"]}
+                self.unloaded_decks = dict(manifest["decks"])
+                if "Geral" not in self.decks:
+                    self.decks["Geral"] = []
+                    self.dirty_decks.add("Geral")
             else:
-                self.flashcards = []
-                self.decks = {"Geral": []}
+                legacy = [name for name in ("flashcards_data" + ext for ext in SNAPSHOT_EXTENSIONS)
+                          if os.path.exists(name)]
+                if legacy:
+                    self.load_snapshot(read_snapshot(legacy[0]))
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao carregar dados: {e}")
             self.flashcards = []
             self.decks = {"Geral": []}
+            self.unloaded_decks = {}
+    
+    def check_integrity(self):
+        """Verificação e compactação da pasta de dados na abertura; só avisa
+        se algo foi corrigido"""
+        try:
+            report = vacuum(self.store)
+        except Exception as e:
+            messagebox.showwarning("Verificação", f"Não foi possível verificar os dados: {e}")
+            return
+        if report.problems:
+            messagebox.showinfo("Verificação", "Problemas corrigidos na coleção:\n\n"
+                                + report.format())
+    
+    def apply_settings(self, settings):
+        """Aplica as configurações salvas"""
+        self.current_theme = settings.get("theme", "claro")
+        self.font_size = settings.get("font_size", 12)
+        self.next_card_id = settings.get("next_card_id", 1)
+        self.scheduler_params = settings.get("scheduler_params", {})
+        self.daily_limits = settings.get("daily_limits", {})
+        self.load_balance = settings.get("load_balance", False)
+        self.filtered_decks = {}
+        for name, query in settings.get("filtered_decks", PRESETS).items():
+            try:
+                self.filtered_decks[name] = FilteredDeck(name, query)
+            except QueryError:
+                pass  # consulta de uma versão futura ou editada à mão
+    
+    def get_settings(self):
+        """Retorna as configurações a serem salvas"""
+        return {
+            "theme": self.current_theme,
+            "font_size": self.font_size,
+            "next_card_id": self.next_card_id,
+            "scheduler_params": self.scheduler_params,
+            "daily_limits": self.daily_limits,
+            "load_balance": self.load_balance,
+            "filtered_decks": {name: deck.query for name, deck in self.filtered_decks.items()}
+        }
+    
+    def load_snapshot(self, data):
+        """Substitui a coleção pelo conteúdo de um arquivo único (formato
+        antigo ou backup); todos os baralhos passam a ser regravados"""
+        self.apply_settings(data)
+        self.flashcards = data.get("flashcards", [])
+        self.decks = data.get("decks", {"Geral": []})
+        self.decks.setdefault("Geral", [])
+        self.unloaded_decks = {}
+        self.next_card_id = assign_card_ids(self.flashcards, self.next_card_id)
+        if data.get("schema", 0) < SCHEMA_VERSION:
+            # Arquivo antigo: posições inválidas ou repetidas, cartões em
+            # mais de um baralho e órfãos (que vão para "Geral")
+            self.decks, _ = canonical_decks(self.flashcards, self.decks)
+        
+        self.dirty_decks = set(self.decks)
+        self.deck_base = {}
+        self.card_index = None
+        self.undo_log.clear()
+    
+    def snapshot(self):
+        """Retorna a coleção inteira no formato de arquivo único"""
+        self.load_all_decks()
+        data = {
+            "flashcards": self.flashcards,
+            "decks": self.decks
+        }
+        data.update(self.get_settings())
+        return data
+    
+    def ensure_deck_loaded(self, deck_name):
+        """Lê os cartões de um baralho ainda não carregado"""
+        if deck_name not in self.unloaded_decks:
+            return
+        try:
+            cards = self.store.load_deck(deck_name)
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao carregar o baralho '{deck_name}': {e}")
+            return
+        self.adopt_deck(deck_name, cards)
+    
+    def adopt_deck(self, deck_name, cards):
+        """Acrescenta à coleção os cartões de um baralho não carregado, lidos
+        aqui ou por uma tarefa em segundo plano"""
+        del self.unloaded_decks[deck_name]
+        self.next_card_id = assign_card_ids(cards, self.next_card_id)
+        self.deck_base[deck_name] = self.card_stamps(cards)
+        start = len(self.flashcards)
+        self.flashcards.extend(cards)
+        self.decks[deck_name] = list(range(start, len(self.flashcards)))
+        self.card_index = None
+    
+    def load_all_decks(self):
+        """Carrega todos os baralhos (para telas que usam a coleção inteira)"""
+        for deck_name in list(self.unloaded_decks):
+            self.ensure_deck_loaded(deck_name)
+    
+    def get_card_index(self):
+        """Índice em bitmap dos cartões carregados (ver index.py).
+        
+        É recriado depois de mudanças na disposição da lista (cartões
+        removidos, carregados ou movidos de baralho, que zeram
+        self.card_index); alterações de um cartão usam reindex_cards, e o
+        desfazer/refazer o atualiza no lugar (ver undo.py).
+        """
+        if self.card_index is None or self.card_index.size != len(self.flashcards):
+            self.card_index = CardIndex(self.flashcards, self.decks, self.day_loads)
+        return self.card_index
+    
+    def day_load(self, day):
+        """Cartões agendados para o dia "AAAA-MM-DD" (ver
+        scheduler.balanced_interval): os carregados pela contagem do índice e
+        os dos baralhos não carregados pela contagem gravada no manifesto"""
+        load = self.get_card_index().day_load(day)
+        for deck_name in self.unloaded_decks:
+            load += self.store.deck_due_days(deck_name).get(day, 0)
+        return load
+    
+    def reindex_cards(self, indices):
+        """Atualiza no índice (e nos baralhos filtrados) tags, suspensão,
+        agendamento e texto dos cartões alterados"""
+        if self.card_index is None:
+            return
+        owners = self.card_index.owners() if self.filtered_decks else None
+        for i in indices:
+            self.card_index.update_card(i)
+            for filtered_deck in self.filtered_decks.values():
+                filtered_deck.update_card(self.card_index, self.flashcards[i], owners[i])
+    
+    def card_deck_name(self, card):
+        """Nome do baralho de um cartão (o próprio dicionário)"""
+        index = self.get_card_index()
+        position = index.position(card)
+        if position is None:
+            return self.current_deck
+        return index.owners()[position] or "Geral"
+    
+    def deck_size(self, deck_name):
+        """Número de cartões de um baralho, sem precisar carregá-lo"""
+        if deck_name in self.unloaded_decks:
+            return self.unloaded_decks[deck_name]
+        return len(self.decks.get(deck_name, []))
+    
+    def find_card_deck(self, idx):
+        """Retorna o nome do baralho que contém o cartão"""
+        for deck_name, deck_cards in self.decks.items():
+            if idx in deck_cards:
+                return deck_name
+        return "Geral"
+    
+    def undo_entries(self, indices):
+        """[(cartão, posição, baralho)] dos cartões, para os passos do UndoLog"""
+        owners = self.get_card_index().owners()
+        return [(self.flashcards[i], i, owners[i] or "Geral") for i in indices]
     
-    def save_data(self):
-        """Salva os flashcards e baralhos no arquivo JSON"""
+    def card_stamps(self, cards):
+        """Carimbos de modificação {id: mod}, usados como base do merge"""
+        return {card["id"]: card.get("mod", 0) for card in cards}
+    
+    def remove_cards(self, indices):
+        """Remove vários cartões em uma única passada, reajustando os índices
+        de todos os baralhos"""
+        if not indices:
+            return
+        bulk.remove_cards(self.flashcards, self.decks, indices)
+        self.card_index = None
+    
+    def replace_deck_cards(self, deck_name, cards):
+        """Substitui o conteúdo de um baralho carregado.
+        
+        Cartões que continuam no baralho (mesmo id) são atualizados no próprio
+        dicionário, para que telas abertas (ex.: uma revisão) os vejam.
+        """
+        current = {self.flashcards[i]["id"]: self.flashcards[i] for i in self.decks[deck_name]}
+        self.remove_cards(self.decks[deck_name])
+        start = len(self.flashcards)
+        for card in cards:
+            existing = current.get(card.get("id"))
+            if existing is not None and existing is not card:
+                existing.clear()
+                existing.update(card)
+                card = existing
+            self.flashcards.append(card)
+        self.decks[deck_name] = list(range(start, len(self.flashcards)))
+        self.card_index = None
+    
+    def rename_deck_in_memory(self, old_name, new_name):
+        """Renomeia um baralho nas estruturas em memória"""
+        self.decks[new_name] = self.decks.pop(old_name)
+        if old_name in self.unloaded_decks:
+            self.unloaded_decks[new_name] = self.unloaded_decks.pop(old_name)
+        if old_name in self.dirty_decks:
+            self.dirty_decks.discard(old_name)
+            self.dirty_decks.add(new_name)
+        if old_name in self.deck_base:
+            self.deck_base[new_name] = self.deck_base.pop(old_name)
+        if old_name in self.scheduler_params:
+            self.scheduler_params[new_name] = self.scheduler_params.pop(old_name)
+        if old_name in self.daily_limits:
+            self.daily_limits[new_name] = self.daily_limits.pop(old_name)
+        if self.current_deck == old_name:
+            self.current_deck = new_name
+        self.card_index = None
+    
+    def drop_deck_in_memory(self, deck_name):
+        """Remove um baralho e seus cartões das estruturas em memória"""
+        self.remove_cards(self.decks.pop(deck_name))
+        if self.card_index is not None:
+            self.card_index.remove_deck(deck_name)
+        self.unloaded_decks.pop(deck_name, None)
+        self.dirty_decks.discard(deck_name)
+        self.deck_base.pop(deck_name, None)
+        if self.current_deck == deck_name:
+            self.current_deck = "Geral"
+    
+    def merge_external_changes(self):
+        """Incorpora o que outros processos gravaram desde a última leitura.
+        
+        Deve ser chamado com o lock da pasta de dados. Só os baralhos cuja
+        versão mudou no manifesto são relidos; baralhos com alterações locais
+        ainda não gravadas passam por um merge cartão a cartão. Os arquivos
+        identificam os baralhos, para reconhecer renomeações e exclusões.
+        Retorna os cartões em conflito.
+        """
+        if not self.store.exists() or not self.store.changed_on_disk():
+            return []
+        
+        local_files = dict(self.store.deck_files)
+        old_disk_names = {file_name: deck_name for deck_name, file_name in self.store.disk_files.items()}
+        known_versions = dict(self.store.file_versions)
+        manifest = self.store.read_manifest()
+        external_files = dict(self.store.deck_files)
+        self.collection_version += 1
+        
+        settings = manifest["settings"]
+        self.next_card_id = max(self.next_card_id, settings.get("next_card_id", 1))
+        for deck_name, params in settings.get("scheduler_params", {}).items():
+            self.scheduler_params.setdefault(deck_name, params)
+        for deck_name, limit in settings.get("daily_limits", {}).items():
+            self.daily_limits.setdefault(deck_name, limit)
+        for name, query in settings.get("filtered_decks", {}).items():
+            if name not in self.filtered_decks:
+                try:
+                    self.filtered_decks[name] = FilteredDeck(name, query)
+                except QueryError:
+                    pass
+        
+        local_names = {file_name: deck_name for deck_name, file_name in local_files.items()}
+        external_file_set = set(external_files.values())
+        files = {}
+        conflicts = []
+        
+        # Baralhos excluídos por outro processo
+        for deck_name, file_name in local_files.items():
+            if file_name in old_disk_names and file_name not in external_file_set:
+                if deck_name in self.dirty_decks:
+                    # Alterado aqui: mantido, ganha um arquivo novo ao salvar
+                    conflicts.extend(self.flashcards[i] for i in self.decks.get(deck_name, []))
+                elif deck_name in self.decks:
+                    self.drop_deck_in_memory(deck_name)
+        
+        for deck_name, file_name in external_files.items():
+            local_name = local_names.get(file_name)
+            if local_name is None and file_name in old_disk_names:
+                continue  # excluído aqui; a exclusão será gravada
+            if local_name is None:
+                # Baralho novo lá
+                local_name = deck_name
+                if local_name not in self.decks:
+                    self.decks[local_name] = []
+                    self.unloaded_decks[local_name] = manifest["decks"][deck_name]
+                    files[local_name] = file_name
+                    continue
+            elif (deck_name != old_disk_names.get(file_name) and 
+                  local_name == old_disk_names.get(file_name) and deck_name not in self.decks):
+                # Renomeado lá (e não aqui)
+                self.rename_deck_in_memory(local_name, deck_name)
+                local_name = deck_name
+            files[local_name] = file_name
+            
+            if self.store.file_versions.get(file_name) == known_versions.get(file_name):
+                continue
+            if local_name in self.unloaded_decks:
+                self.unloaded_decks[local_name] = manifest["decks"][deck_name]
+                continue
+            
+            theirs = self.store.load_deck(deck_name)
+            if local_name in self.dirty_decks:
+                ours = [self.flashcards[i] for i in self.decks[local_name]]
+                merged, deck_conflicts, collisions = merge_deck_cards(
+                    self.deck_base.get(local_name, {}), ours, theirs)
+                conflicts.extend(deck_conflicts)
+                for card in collisions:
+                    del card["id"]
+                self.next_card_id = assign_card_ids(collisions, self.next_card_id)
+            else:
+                merged = theirs
+            self.replace_deck_cards(local_name, merged)
+            self.deck_base[local_name] = self.card_stamps(theirs)
+        
+        self.store.deck_files = files
+        if "Geral" not in self.decks:
+            self.decks["Geral"] = []
+            self.dirty_decks.add("Geral")
+        return conflicts
+    
+    def report_conflicts(self, conflicts):
+        """Avisa sobre cartões alterados aqui e em outro processo"""
+        if not conflicts:
+            return
+        fronts = "\n".join(f"• {card['front'][:40]}" for card in conflicts[:5])
+        if len(conflicts) > 5:
+            fronts += f"\n... e mais {len(conflicts) - 5}"
+        messagebox.showwarning("Conflito", 
+                               f"{len(conflicts)} cartão(ões) foram alterados aqui e em outro "
+                               f"programa ao mesmo tempo. A alteração mais recente foi mantida:\n\n{fronts}")
+    
+    def check_external_changes(self):
+        """Incorpora alterações feitas por outros processos (uma verificação
+        de mtime quando não há nenhuma). Com uma gravação em andamento, que
+        também altera o manifesto, a verificação fica para quando ela terminar."""
+        if self.save_job is not None:
+            self.after_save(self.check_external_changes_later)
+            return
+        if not self.store.exists() or not self.store.changed_on_disk():
+            return
+        try:
+            with self.store.lock():
+                conflicts = self.merge_external_changes()
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao recarregar dados: {e}")
+            return
+        self.report_conflicts(conflicts)
+    
+    def check_external_changes_later(self):
+        """check_external_changes adiado: se algo foi incorporado, o menu
+        principal (que pediu a verificação) é redesenhado"""
+        version = self.collection_version
+        self.check_external_changes()
+        if self.collection_version != version and self.current_view == self.show_main_menu:
+            self.show_main_menu()
+    
+    def save_data(self, *changed_decks, overwrite=False):
+        """Salva as configurações e os baralhos alterados.
+        
+        Apenas os arquivos dos baralhos informados (ou pendentes de um
+        salvamento anterior) são regravados; o manifesto é sempre atualizado.
+        Antes de gravar, as alterações de outros processos são incorporadas,
+        a menos que overwrite seja verdadeiro (restauração de backup).
+        
+        A gravação roda em segundo plano, na fila serial de tarefas; pedidos
+        feitos enquanto uma gravação está em andamento são juntados em uma
+        única gravação seguinte. Use wait_for_save para esperar.
+        """
+        self.dirty_decks.update(changed_decks)
+        self.save_overwrite = self.save_overwrite or overwrite
+        if self.save_job is not None:
+            self.save_requested = True
+            return
+        self.start_save()
+    
+    def start_save(self):
+        """Prepara (na thread do Tk) e agenda uma gravação"""
+        overwrite = self.save_overwrite
+        self.save_overwrite = self.save_requested = False
+        conflicts = []
         try:
-            data = {
-                "flashcards": self.flashcards,
-                "decks": self.decks,
-                "theme": self.current_theme,
-                "font_size": self.font_size
-            }
-            with open("flashcards_data.json", "w", encoding="utf-8") as file:
-                json.dump(data, file, ensure_ascii=False, indent=4)
+            if not overwrite and self.store.exists() and self.store.changed_on_disk():
+                # Outro processo gravou: incorporar antes, sob o lock
+                with self.store.lock():
+                    conflicts = self.merge_external_changes()
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao salvar dados: {e}")
+            self.run_save_callbacks()
+            return
+        
+        deck_counts = {deck_name: self.deck_size(deck_name) for deck_name in self.decks}
+        # Cópias rasas: a revisão pode alterar os cartões durante a gravação
+        changed = {deck_name: [dict(self.flashcards[i]) for i in self.decks[deck_name]]
+                   for deck_name in self.dirty_decks
+                   if deck_name in self.decks and deck_name not in self.unloaded_decks}
+        HOOKS.call("before_save", changed)
+        dirty, self.dirty_decks = self.dirty_decks, set()
+        journal, self.sync_journal = self.sync_journal, []
+        
+        def done(written):
+            self.save_job = None
+            if not written:
+                # Outro processo gravou entre a preparação e o lock: refazer
+                self.dirty_decks |= dirty
+                self.sync_journal[:0] = journal
+                self.start_save()
+                return
+            for deck_name, cards in changed.items():
+                self.deck_base[deck_name] = self.card_stamps(cards)
+            self.collection_version += 1
+            if self.save_requested:
+                self.start_save()
+            else:
+                self.run_save_callbacks()
+        
+        def failed(error):
+            self.save_job = None
+            self.dirty_decks |= dirty
+            self.sync_journal[:0] = journal
+            messagebox.showerror("Erro", f"Erro ao salvar dados: {error}")
+            self.run_save_callbacks()
+        
+        job = self.jobs.submit("Salvando", write_collection, self.store, self.get_settings(),
+                               deck_counts, changed, journal, overwrite,
+                               on_done=done, on_error=failed, serial=True, cancellable=False)
+        if job.running:
+            self.save_job = job
+        self.report_conflicts(conflicts)
+    
+    def wait_for_save(self):
+        """Espera a gravação em andamento (antes de mexer no DeckStore ou de
+        entregar a pasta de dados a outro código). Bloqueia a thread do Tk:
+        fora das operações que precisam do DeckStore na hora, use after_save."""
+        while self.save_job is not None:
+            self.jobs.wait(self.save_job)
+    
+    def after_save(self, callback):
+        """Chama callback (na thread do Tk) quando não houver gravação em
+        andamento nem pedida; na hora, se não houver nenhuma"""
+        if self.save_job is None:
+            callback()
+        elif callback not in self.save_callbacks:
+            self.save_callbacks.append(callback)
+    
+    def run_save_callbacks(self):
+        callbacks, self.save_callbacks = self.save_callbacks, []
+        for callback in callbacks:
+            callback()
+    
+    def undo_shortcut(self, event, action):
+        """Ctrl+Z/Ctrl+Y fora dos campos de texto (neles o atalho é do campo)"""
+        if isinstance(event.widget, (tk.Entry, tk.Text)):
+            return
+        action()
+    
+    def undo(self):
+        """Desfaz a última alteração da coleção (Ctrl+Z)"""
+        queue, current = self.review_queue, self.current_card
+        answer = self.apply_undo_step()
+        if answer is False:
+            return
+        if queue is not None and answer is not None:
+            # Na revisão: o cartão respondido volta a ser exibido, antes do atual
+            self.session_reviewed -= 1
+            self.requeue_card(queue, current)
+            self.requeue_card(queue, answer.card)
+            self.show_card(queue)
+        elif self.current_view is not None:
+            self.current_view()
+    
+    def redo(self):
+        """Refaz a última alteração desfeita (Ctrl+Y ou Ctrl+Shift+Z)"""
+        queue, current = self.review_queue, self.current_card
+        answer = self.apply_undo_step(redo=True)
+        if answer is False:
+            return
+        if queue is not None and answer is not None and answer.card is current:
+            # A resposta do cartão exibido foi refeita: segue para o próximo
+            self.session_reviewed += 1
+            self.show_card(queue)
+        elif self.current_view is not None:
+            self.current_view()
+    
+    def apply_undo_step(self, redo=False):
+        """Desfaz (ou refaz) um passo do UndoLog e grava os baralhos
+        alterados. Retorna a resposta de revisão do passo (ou None), ou False
+        se não havia passo ou ele não pôde ser aplicado."""
+        title = self.undo_log.redo_title if redo else self.undo_log.undo_title
+        if title is None:
+            self.show_status("Nada para refazer" if redo else "Nada para desfazer")
+            return False
+        try:
+            title, ops, changed = (self.undo_log.redo if redo else self.undo_log.undo)(self)
+        except UndoError as e:
+            messagebox.showwarning("Desfazer", f"Não foi possível aplicar '{title}': {e}")
+            return False
+        self.save_data(*changed)
+        self.show_status(f"{'↪️ Refeito' if redo else '↩️ Desfeito'}: {title}")
+        return next((op for op in ops if isinstance(op, ReviewAnswer)), None)
+    
+    def requeue_card(self, queue, card):
+        """Devolve um cartão à fila da revisão para ser o próximo exibido"""
+        if card is None:
+            return
+        if isinstance(queue, MergedDueQueue):
+            queue.unpop(card, self.card_deck_name(card))
+        else:
+            queue.append(card)
+            self.upcoming_card = card   # show_card não sorteia outro
+    
+    def show_status(self, text):
+        """Mensagem passageira na barra de status"""
+        self.status_message = text
+        self.update_status_bar()
+        
+        def clear():
+            if self.status_message == text:
+                self.status_message = ""
+                self.update_status_bar()
+        
+        if self.root is not None:
+            self.root.after(STATUS_MESSAGE_MS, clear)
     
     def clear_frame(self):
         """Limpa todos os widgets do frame principal"""
+        self.review_queue = None
+        self.current_view = None
         for widget in self.main_frame.winfo_children():
             widget.destroy()
     
     def validate_text_input(self, text):
         """Valida entrada de texto para evitar apenas espaços ou caracteres inválidos"""
-        text = text.strip()
-        if not text:
-            return False
-        # Verificar se não é apenas espaços ou caracteres especiais
-        if not re.search(r'[a-zA-Z0-9À-ÿ]', text):
-            return False
-        return True
+        return validate_text_input(text)
     
     def show_main_menu(self):
         """Exibe o menu principal"""
+        self.check_external_changes()
         self.clear_frame()
+        self.current_view = self.show_main_menu
         theme = self.themes[self.current_theme]
         
         # Frame do título
@@ -132,6 +874,21 @@ class FlashcardApp:
         deck_combo.pack(side=tk.LEFT, padx=5)
         deck_combo.bind("<<ComboboxSelected>>", self.change_deck)
         
+        # Tag das revisões (dos baralhos carregados)
+        self.get_deck_cards(self.current_deck)
+        tag_options = ["Todas"] + self.get_card_index().tags()
+        if self.current_tag not in tag_options:
+            self.current_tag = "Todas"
+        tag_label = tk.Label(deck_frame, text="Tag:", 
+                            font=("Arial", self.font_size), bg=theme["bg"], fg=theme["fg"])
+        tag_label.pack(side=tk.LEFT, padx=(15, 5))
+        
+        self.tag_var = tk.StringVar(value=self.current_tag)
+        tag_combo = ttk.Combobox(deck_frame, textvariable=self.tag_var, 
+                                values=tag_options, state="readonly", width=12)
+        tag_combo.pack(side=tk.LEFT, padx=5)
+        tag_combo.bind("<<ComboboxSelected>>", self.change_tag)
+        
         # Botões principais
         buttons_frame = tk.Frame(self.main_frame, bg=theme["bg"])
         buttons_frame.pack(pady=20)
@@ -152,6 +909,18 @@ class FlashcardApp:
                               bg="#2196f3", fg="white", pady=8)
         btn_review.pack(side=tk.LEFT, padx=5)
         
+        btn_all = tk.Button(row1, text="🌐 Revisar Todos", 
+                           font=("Arial", self.font_size), width=20, 
+                           command=self.start_all_review,
+                           bg="#3f51b5", fg="white", pady=8)
+        btn_all.pack(side=tk.LEFT, padx=5)
+        
+        btn_filtered = tk.Button(row1, text="🎯 Estudo Personalizado", 
+                                font=("Arial", self.font_size), width=20, 
+                                command=self.show_filtered_decks,
+                                bg="#673ab7", fg="white", pady=8)
+        btn_filtered.pack(side=tk.LEFT, padx=5)
+        
         # Segunda linha de botões
         row2 = tk.Frame(buttons_frame, bg=theme["bg"])
         row2.pack(pady=5)
@@ -168,6 +937,19 @@ class FlashcardApp:
                              bg="#ff9800", fg="white", pady=8)
         btn_decks.pack(side=tk.LEFT, padx=5)
         
+        btn_sync = tk.Button(row2, text="🔁 Sincronizar", 
+                            font=("Arial", self.font_size), width=20, 
+                            command=self.sync_now,
+                            bg="#009688", fg="white", pady=8)
+        btn_sync.pack(side=tk.LEFT, padx=5)
+        
+        undo_title = self.undo_log.undo_title
+        btn_undo = tk.Button(row2, text="↩️ Desfazer", 
+                            font=("Arial", self.font_size), width=20, 
+                            command=self.undo, bg="#455a64", fg="white", pady=8,
+                            state=tk.NORMAL if undo_title else tk.DISABLED)
+        btn_undo.pack(side=tk.LEFT, padx=5)
+        
         # Terceira linha de botões
         row3 = tk.Frame(buttons_frame, bg=theme["bg"])
         row3.pack(pady=5)
@@ -178,6 +960,12 @@ class FlashcardApp:
                               bg="#607d8b", fg="white", pady=8)
         btn_import.pack(side=tk.LEFT, padx=2)
         
+        btn_import_folder = tk.Button(row3, text="📂 Importar Pasta", 
+                                     font=("Arial", self.font_size), width=14, 
+                                     command=self.import_folder,
+                                     bg="#607d8b", fg="white", pady=8)
+        btn_import_folder.pack(side=tk.LEFT, padx=2)
+        
         btn_export = tk.Button(row3, text="📤 Exportar", 
                               font=("Arial", self.font_size), width=12, 
                               command=self.export_flashcards,
@@ -203,12 +991,8 @@ class FlashcardApp:
         deck_cards = self.get_deck_cards(self.current_deck)
         total_cards = len(deck_cards)
         
-        # Calcular cartões pendentes para hoje
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        pending_cards = sum(1 for i in deck_cards 
-                           if i < len(self.flashcards) and 
-                           (not self.flashcards[i]["next_review"] or 
-                            self.flashcards[i]["next_review"] <= current_date))
+        # Cartões pendentes para hoje (interseção de bitmaps, sem percorrer os cartões)
+        pending_cards = bitmap_count(self.review_bitmap(due=True))
         
         stats_text = f"📚 Total no baralho '{self.current_deck}': {total_cards} | "
         stats_text += f"⏰ Pendentes hoje: {pending_cards}"
@@ -229,13 +1013,28 @@ class FlashcardApp:
         self.current_deck = self.deck_var.get()
         self.show_main_menu()
     
+    def change_tag(self, event=None):
+        """Muda a tag das revisões"""
+        self.current_tag = self.tag_var.get()
+        self.show_main_menu()
+    
+    def review_bitmap(self, due=True):
+        """Cartões do baralho atual (e da tag escolhida) não suspensos,
+        pendentes se due for verdadeiro"""
+        self.ensure_deck_loaded(self.current_deck)
+        tags = () if self.current_tag == "Todas" else (self.current_tag,)
+        return self.get_card_index().query(self.current_deck, tags, 
+                                           due=True if due else None, suspended=False)
+    
     def get_deck_cards(self, deck_name):
         """Retorna os índices dos flashcards de um baralho específico"""
+        self.ensure_deck_loaded(deck_name)
         return self.decks.get(deck_name, [])
     
     def manage_decks(self):
         """Interface para gerenciar baralhos"""
         self.clear_frame()
+        self.current_view = self.manage_decks
         theme = self.themes[self.current_theme]
         
         title_label = tk.Label(self.main_frame, text="🗂️ Gerenciar Baralhos", 
@@ -256,8 +1055,10 @@ class FlashcardApp:
         scrollbar.config(command=self.deck_listbox.yview)
         
         # Preencher lista de baralhos
-        for deck_name, cards in self.decks.items():
-            self.deck_listbox.insert(tk.END, f"{deck_name} ({len(cards)} cartões)")
+        for deck_name in self.decks:
+            limit = self.daily_limits.get(deck_name, DEFAULT_DAILY_LIMIT)
+            self.deck_listbox.insert(tk.END, f"{deck_name} ({self.deck_size(deck_name)} cartões, "
+                                             f"até {limit} revisões/dia)")
         
         # Botões de gerenciamento
         btn_frame = tk.Frame(self.main_frame, bg=theme["bg"])
@@ -278,11 +1079,35 @@ class FlashcardApp:
                               command=self.delete_deck)
         btn_delete.grid(row=0, column=2, padx=5)
         
+        btn_limit = tk.Button(btn_frame, text="📏 Limite Diário", 
+                             font=("Arial", self.font_size), bg="#607d8b", fg="white",
+                             command=self.set_daily_limit)
+        btn_limit.grid(row=0, column=3, padx=5)
+        
         btn_back = tk.Button(self.main_frame, text="⬅️ Voltar", 
                             font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
                             command=self.show_main_menu)
         btn_back.pack(pady=10)
     
+    def set_daily_limit(self):
+        """Define quantas revisões por dia um baralho fornece em "Revisar Todos"
+        """
+        try:
+            selected_idx = self.deck_listbox.curselection()[0]
+        except IndexError:
+            messagebox.showwarning("Aviso", "Selecione um baralho.")
+            return
+        deck_name = list(self.decks.keys())[selected_idx]
+        limit = simpledialog.askinteger("Limite Diário", 
+                                        f"Revisões por dia do baralho '{deck_name}':",
+                                        initialvalue=self.daily_limits.get(deck_name, DEFAULT_DAILY_LIMIT),
+                                        minvalue=0, maxvalue=100000)
+        if limit is None:
+            return
+        self.daily_limits[deck_name] = limit
+        self.save_data()
+        self.manage_decks()
+    
     def create_deck(self):
         """Cria um novo baralho"""
         name = simpledialog.askstring("Novo Baralho", "Nome do baralho:")
@@ -290,7 +1115,9 @@ class FlashcardApp:
             name = name.strip()
             if name not in self.decks:
                 self.decks[name] = []
-                self.save_data()
+                self.sync_journal.append({"op": "add_deck", "name": name})
+                self.undo_log.record(f"criar o baralho '{name}'", DeckPresence(name, True))
+                self.save_data(name)
                 messagebox.showinfo("Sucesso", f"Baralho '{name}' criado!")
                 self.manage_decks()
             else:
@@ -313,9 +1140,12 @@ class FlashcardApp:
             if new_name and self.validate_text_input(new_name):
                 new_name = new_name.strip()
                 if new_name not in self.decks:
-                    self.decks[new_name] = self.decks.pop(old_name)
-                    if self.current_deck == old_name:
-                        self.current_deck = new_name
+                    self.wait_for_save()
+                    self.rename_deck_in_memory(old_name, new_name)
+                    self.store.rename_deck(old_name, new_name)
+                    self.sync_journal.append({"op": "rename_deck", "old": old_name, "new": new_name})
+                    self.undo_log.record(f"renomear o baralho '{old_name}'",
+                                         DeckRename(old_name, new_name))
                     self.save_data()
                     messagebox.showinfo("Sucesso", f"Baralho renomeado para '{new_name}'!")
                     self.manage_decks()
@@ -340,14 +1170,30 @@ class FlashcardApp:
                                          f"Excluir o baralho '{deck_name}'? Os cartões serão movidos para 'Geral'.")
             if confirm:
                 # Mover cartões para o baralho Geral
+                self.ensure_deck_loaded(deck_name)
+                self.ensure_deck_loaded("Geral")
                 cards_to_move = self.decks[deck_name]
+                self.undo_log.record(
+                    f"excluir o baralho '{deck_name}'",
+                    CardMoves(((self.flashcards[i], i, deck_name) for i in cards_to_move), "Geral"),
+                    DeckPresence(deck_name, False, list(self.decks).index(deck_name),
+                                 self.scheduler_params.get(deck_name),
+                                 self.daily_limits.get(deck_name)))
                 self.decks["Geral"].extend(cards_to_move)
+                for i in cards_to_move:
+                    touch_card(self.flashcards[i])
                 del self.decks[deck_name]
+                self.card_index = None
+                self.dirty_decks.discard(deck_name)
+                self.deck_base.pop(deck_name, None)
+                self.scheduler_params.pop(deck_name, None)
+                self.daily_limits.pop(deck_name, None)
+                self.sync_journal.append({"op": "delete_deck", "name": deck_name})
                 
                 if self.current_deck == deck_name:
                     self.current_deck = "Geral"
                 
-                self.save_data()
+                self.save_data("Geral")
                 messagebox.showinfo("Sucesso", f"Baralho '{deck_name}' excluído!")
                 self.manage_decks()
         except IndexError:
@@ -399,6 +1245,18 @@ class FlashcardApp:
                                 bg=theme["card_bg"], fg=theme["fg"])
         self.back_text.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
         
+        # Tags
+        tags_label = tk.Label(entry_frame, text="Tags:", 
+                             font=("Arial", self.font_size), bg=theme["bg"], fg=theme["fg"])
+        tags_label.grid(row=2, column=0, padx=10, pady=10, sticky="nw")
+        
+        self.tags_var = tk.StringVar()
+        tags_entry = tk.Entry(entry_frame, textvariable=self.tags_var, 
+                             font=("Arial", self.font_size))
+        tags_entry.grid(row=2, column=1, padx=10, pady=10, sticky="ew")
+        
+        self.create_image_fields(entry_frame, 3)
+        
         entry_frame.grid_columnconfigure(1, weight=1)
         
         # Frame para botões
@@ -417,6 +1275,58 @@ class FlashcardApp:
                               command=self.show_main_menu)
         cancel_btn.grid(row=0, column=1, padx=10)
     
+    def create_image_fields(self, entry_frame, row, card=None):
+        """Linha do formulário para escolher as imagens da frente e do verso;
+        a escolha fica em self.image_choice até o cartão ser salvo"""
+        theme = self.themes[self.current_theme]
+        self.image_choice = {field: card.get(field) if card else None for field in IMAGE_FIELDS}
+        
+        images_label = tk.Label(entry_frame, text="Imagens:", 
+                               font=("Arial", self.font_size), bg=theme["bg"], fg=theme["fg"])
+        images_label.grid(row=row, column=0, padx=10, pady=10, sticky="nw")
+        
+        images_frame = tk.Frame(entry_frame, bg=theme["bg"])
+        images_frame.grid(row=row, column=1, padx=10, pady=10, sticky="w")
+        
+        for column, (field, side) in enumerate(zip(IMAGE_FIELDS, ("Frente", "Verso"))):
+            status = tk.Label(images_frame, font=("Arial", 10), bg=theme["bg"], fg=theme["fg"])
+            
+            def show_status(field=field, side=side, status=status):
+                status.config(text=f"{side}: {'✅' if self.image_choice[field] else '—'}")
+            
+            def choose(field=field, show_status=show_status):
+                path = filedialog.askopenfilename(
+                    title="Escolher Imagem",
+                    filetypes=[("Imagens", " ".join("*" + ext for ext in supported_extensions())),
+                               ("All files", "*.*")])
+                if not path:
+                    return
+                try:
+                    self.image_choice[field] = self.media.add(path)
+                except (OSError, ValueError) as e:
+                    messagebox.showerror("Erro", f"Erro ao adicionar imagem: {e}")
+                    return
+                show_status()
+            
+            def remove(field=field, show_status=show_status):
+                self.image_choice[field] = None
+                show_status()
+            
+            status.grid(row=0, column=column * 3, padx=(0, 5))
+            tk.Button(images_frame, text=f"🖼️ {side}...", font=("Arial", 10), 
+                     command=choose).grid(row=0, column=column * 3 + 1)
+            tk.Button(images_frame, text="✖", font=("Arial", 10), 
+                     command=remove).grid(row=0, column=column * 3 + 2, padx=(2, 15))
+            show_status()
+    
+    def apply_image_choice(self, card):
+        """Grava no cartão as imagens escolhidas no formulário"""
+        for field, name in self.image_choice.items():
+            if name:
+                card[field] = name
+            else:
+                card.pop(field, None)
+    
     def save_new_flashcard(self):
         """Salva um novo flashcard"""
         front = self.front_text.get("1.0", "end-1c").strip()
@@ -426,32 +1336,34 @@ class FlashcardApp:
             messagebox.showwarning("Aviso", "Preencha todos os campos com conteúdo válido!")
             return
         
-        # Criar novo flashcard
-        new_card = {
-            "front": front,
-            "back": back,
-            "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "last_review": None,
-            "next_review": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "ease_factor": 2.5,
-            "interval": 0,
-            "repetitions": 0,
-            "correct_streak": 0,
-            "total_reviews": 0
-        }
-        
         # Adicionar ao final da lista e ao baralho selecionado
-        self.flashcards.append(new_card)
         deck_name = self.new_card_deck.get()
+        self.ensure_deck_loaded(deck_name)
+        card = new_card(front, back)
+        SEARCH_KEYS.add_cards([card])
+        if self.duplicate_cards(deck_name, [card]) and not messagebox.askyesno(
+                "Duplicado", f"Já existe um cartão com esta frente em '{deck_name}'.\n\n"
+                             "Criar mesmo assim?"):
+            return
+        tags = parse_tags(self.tags_var.get())
+        if tags:
+            card["tags"] = tags
+        self.apply_image_choice(card)
+        self.next_card_id = assign_card_ids([card], self.next_card_id)
+        self.flashcards.append(card)
         self.decks[deck_name].append(len(self.flashcards) - 1)
+        self.undo_log.record("criar cartão", CardRows(
+            [(card, len(self.flashcards) - 1, deck_name)], True))
+        self.notify_created([card], deck_name)
         
-        self.save_data()
+        self.save_data(deck_name)
         messagebox.showinfo("Sucesso", "Flashcard criado com sucesso!")
         self.show_main_menu()
     
     def list_flashcards(self):
         """Lista flashcards com busca e filtros"""
         self.clear_frame()
+        self.current_view = self.update_flashcard_list
         theme = self.themes[self.current_theme]
         
         title_label = tk.Label(self.main_frame, text="📋 Lista de Flashcards", 
@@ -477,13 +1389,44 @@ class FlashcardApp:
                                font=("Arial", self.font_size), bg=theme["bg"], fg=theme["fg"])
         filter_label.pack(side=tk.LEFT, padx=(20, 5))
         
-        self.filter_deck = tk.StringVar(value="Todos")
+        # Começar pelo baralho atual: "Todos" carrega a coleção inteira
+        self.filter_deck = tk.StringVar(value=self.current_deck)
         deck_options = ["Todos"] + list(self.decks.keys())
         deck_filter = ttk.Combobox(search_frame, textvariable=self.filter_deck, 
                                   values=deck_options, state="readonly", width=15)
         deck_filter.pack(side=tk.LEFT, padx=5)
         deck_filter.bind("<<ComboboxSelected>>", self.update_flashcard_list)
         
+        # Filtros de tag e de estado, combinados com o de baralho
+        filter_frame = tk.Frame(self.main_frame, bg=theme["bg"])
+        filter_frame.pack(fill="x")
+        
+        tag_label = tk.Label(filter_frame, text="Tag:", 
+                            font=("Arial", self.font_size), bg=theme["bg"], fg=theme["fg"])
+        tag_label.pack(side=tk.LEFT, padx=5)
+        
+        self.filter_tag = tk.StringVar(value="Todas")
+        self.tag_filter = ttk.Combobox(filter_frame, textvariable=self.filter_tag, 
+                                      state="readonly", width=15)
+        self.tag_filter.pack(side=tk.LEFT, padx=5)
+        self.tag_filter.bind("<<ComboboxSelected>>", self.update_flashcard_list)
+        
+        state_label = tk.Label(filter_frame, text="Estado:", 
+                              font=("Arial", self.font_size), bg=theme["bg"], fg=theme["fg"])
+        state_label.pack(side=tk.LEFT, padx=(20, 5))
+        
+        self.filter_state = tk.StringVar(value="Todos")
+        state_filter = ttk.Combobox(filter_frame, textvariable=self.filter_state, 
+                                   values=["Todos", "Pendentes", "Ativos", "Suspensos"], 
+                                   state="readonly", width=12)
+        state_filter.pack(side=tk.LEFT, padx=5)
+        state_filter.bind("<<ComboboxSelected>>", self.update_flashcard_list)
+        
+        # Total encontrado, ou o erro da consulta
+        self.search_status = tk.Label(filter_frame, text="", 
+                                     font=("Arial", 10), bg=theme["bg"], fg=theme["fg"])
+        self.search_status.pack(side=tk.LEFT, padx=(20, 5))
+        
         # Frame para a lista
         list_frame = tk.Frame(self.main_frame)
         list_frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -491,12 +1434,20 @@ class FlashcardApp:
         scrollbar = tk.Scrollbar(list_frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Seleção múltipla (Shift/Ctrl + clique, Ctrl+A) para operações em lote
         self.flashcard_listbox = tk.Listbox(list_frame, font=("Arial", self.font_size), 
-                                          yscrollcommand=scrollbar.set,
+                                          yscrollcommand=scrollbar.set, selectmode=tk.EXTENDED,
                                           bg=theme["card_bg"], fg=theme["fg"])
+        self.flashcard_listbox.bind("<Control-a>", 
+                                    lambda e: self.flashcard_listbox.select_set(0, tk.END))
         self.flashcard_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.flashcard_listbox.yview)
         
+        # Miniaturas do cartão selecionado (só as dele são lidas)
+        self.list_preview = tk.Label(list_frame, bg=theme["bg"])
+        self.list_preview.pack(side=tk.RIGHT, padx=(10, 0))
+        self.flashcard_listbox.bind("<<ListboxSelect>>", self.update_list_preview)
+        
         # Preencher lista inicial
         self.update_flashcard_list()
         
@@ -524,6 +1475,21 @@ class FlashcardApp:
                               command=self.delete_flashcard_from_list)
         btn_delete.grid(row=0, column=3, padx=5)
         
+        btn_reset = tk.Button(btn_frame, text="♻️ Reiniciar", 
+                             font=("Arial", self.font_size), bg="#607d8b", fg="white",
+                             command=self.reset_flashcards_from_list)
+        btn_reset.grid(row=0, column=4, padx=5)
+        
+        btn_tags = tk.Button(btn_frame, text="🏷️ Tags", 
+                            font=("Arial", self.font_size), bg="#3f51b5", fg="white",
+                            command=self.tag_flashcards_from_list)
+        btn_tags.grid(row=0, column=5, padx=5)
+        
+        btn_suspend = tk.Button(btn_frame, text="⏸️ Suspender", 
+                               font=("Arial", self.font_size), bg="#795548", fg="white",
+                               command=self.suspend_flashcards_from_list)
+        btn_suspend.grid(row=0, column=6, padx=5)
+        
         btn_back = tk.Button(self.main_frame, text="⬅️ Voltar", 
                             font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
                             command=self.show_main_menu)
@@ -534,31 +1500,65 @@ class FlashcardApp:
         self.flashcard_listbox.delete(0, tk.END)
         self.filtered_indices = []
         
-        search_term = self.search_var.get().lower()
+        search_text = self.search_var.get()
         selected_deck = self.filter_deck.get()
+        selected_tag = self.filter_tag.get()
+        selected_state = self.filter_state.get()
         
-        for i, card in enumerate(self.flashcards):
-            # Filtrar por baralho
-            if selected_deck != "Todos":
-                if i not in self.decks.get(selected_deck, []):
-                    continue
-            
-            # Filtrar por busca
-            if search_term:
-                if (search_term not in card["front"].lower() and 
-                    search_term not in card["back"].lower()):
-                    continue
-            
-            # Encontrar o baralho do cartão
-            card_deck = "Geral"
-            for deck_name, deck_cards in self.decks.items():
-                if i in deck_cards:
-                    card_deck = deck_name
-                    break
-            
-            display_text = f"[{card_deck}] {card['front'][:50]}{'...' if len(card['front']) > 50 else ''}"
-            self.flashcard_listbox.insert(tk.END, display_text)
+        # Baralho, tag e estado: interseção dos bitmaps do índice
+        if selected_deck != "Todos":
+            self.ensure_deck_loaded(selected_deck)
+        else:
+            self.load_all_decks()
+        index = self.get_card_index()
+        tag_options = ["Todas"] + index.tags()
+        self.tag_filter["values"] = tag_options
+        if selected_tag not in tag_options:
+            selected_tag = "Todas"
+            self.filter_tag.set(selected_tag)
+        candidates = index.query(
+            None if selected_deck == "Todos" else selected_deck,
+            () if selected_tag == "Todas" else (selected_tag,),
+            due=True if selected_state == "Pendentes" else None,
+            suspended={"Pendentes": False, "Ativos": False, "Suspensos": True}.get(selected_state))
+        
+        # Busca (ver query.py): termos, campos e operadores, restrita aos filtros
+        try:
+            found = search(index, search_text, candidates)
+        except QueryError as e:
+            self.search_status.config(text=f"⚠️ {e}", fg="#f44336")
+            return
+        indices = bitmap_indices(found)
+        status = f"{len(indices)} cartão(ões)"
+        if len(indices) > LIST_LIMIT:
+            status += f", exibindo os primeiros {LIST_LIMIT}"
+            indices = indices[:LIST_LIMIT]
+        self.search_status.config(text=status, fg=self.themes[self.current_theme]["fg"])
+        
+        card_decks = index.owners()
+        items = []
+        for i in indices:
+            card = self.flashcards[i]
+            card_deck = card_decks[i] or "Geral"
+            mark = "⏸️ " if card.get("suspended") else ""
+            if "front_image" in card or "back_image" in card:
+                mark += "🖼️ "
+            items.append(f"{mark}[{card_deck}] {card['front'][:50]}{'...' if len(card['front']) > 50 else ''}")
             self.filtered_indices.append(i)
+        
+        # Uma única chamada ao Tk em vez de uma por cartão
+        if items:
+            self.flashcard_listbox.insert(tk.END, *items)
+    
+    def update_list_preview(self, event=None):
+        """Mostra a miniatura da primeira imagem do cartão selecionado"""
+        selection = self.flashcard_listbox.curselection()
+        photo = None
+        if selection:
+            names = card_images(self.flashcards[self.filtered_indices[selection[0]]])
+            if names:
+                photo = self.image_cache.thumbnail(names[0])
+        self.list_preview.config(image=photo or "")
     
     def view_card_details_from_list(self):
         """Exibe detalhes do cartão selecionado na lista"""
@@ -583,13 +1583,19 @@ class FlashcardApp:
         details = f"🗂️ Baralho: {card_deck}\n\n"
         details += f"❓ Frente: {card['front']}\n\n"
         details += f"✅ Verso: {card['back']}\n\n"
+        details += f"🏷️ Tags: {' '.join(card.get('tags') or ()) or 'Nenhuma'}\n"
+        if card_images(card):
+            details += f"🖼️ Imagens: {len(card_images(card))}\n"
+        if card.get("suspended"):
+            details += "⏸️ Suspenso (fora das revisões)\n"
         details += f"📅 Criado em: {card['created_at']}\n"
         details += f"🔄 Última revisão: {card['last_review'] or 'Nunca'}\n"
         details += f"⏰ Próxima revisão: {card['next_review']}\n"
         details += f"🔢 Repetições: {card['repetitions']}\n"
         details += f"📊 Fator facilidade: {card['ease_factor']:.2f}\n"
         details += f"🎯 Sequência correta: {card.get('correct_streak', 0)}\n"
-        details += f"📈 Total de revisões: {card.get('total_reviews', 0)}"
+        details += f"📈 Total de revisões: {card.get('total_reviews', 0)}\n"
+        details += f"📜 Histórico registrado: {len(self.history.rows_for_card(card['id']))} revisões"
         
         messagebox.showinfo(f"Detalhes do Flashcard #{idx+1}", details)
     
@@ -638,6 +1644,18 @@ class FlashcardApp:
         self.back_text.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
         self.back_text.insert(tk.END, card["back"])
         
+        # Tags
+        tags_label = tk.Label(entry_frame, text="Tags:", 
+                             font=("Arial", self.font_size), bg=theme["bg"], fg=theme["fg"])
+        tags_label.grid(row=2, column=0, padx=10, pady=10, sticky="nw")
+        
+        self.tags_var = tk.StringVar(value=" ".join(card.get("tags") or ()))
+        tags_entry = tk.Entry(entry_frame, textvariable=self.tags_var, 
+                             font=("Arial", self.font_size))
+        tags_entry.grid(row=2, column=1, padx=10, pady=10, sticky="ew")
+        
+        self.create_image_fields(entry_frame, 3, card)
+        
         entry_frame.grid_columnconfigure(1, weight=1)
         
         # Frame para botões
@@ -666,223 +1684,468 @@ class FlashcardApp:
             return
         
         # Atualizar dados mantendo estatísticas
+        self.undo_log.record("editar cartão", CardEdit(self.undo_entries([idx])))
         self.flashcards[idx]["front"] = front
         self.flashcards[idx]["back"] = back
+        tags = parse_tags(self.tags_var.get())
+        if tags:
+            self.flashcards[idx]["tags"] = tags
+        else:
+            self.flashcards[idx].pop("tags", None)
+        self.apply_image_choice(self.flashcards[idx])
+        touch_card(self.flashcards[idx])
+        SEARCH_KEYS.add_cards([self.flashcards[idx]])
+        self.reindex_cards([idx])
         
-        self.save_data()
+        self.save_data(self.find_card_deck(idx))
         messagebox.showinfo("Sucesso", "Flashcard atualizado com sucesso!")
         self.list_flashcards()
     
+    def selected_card_indices(self):
+        """Índices (em self.flashcards) dos cartões selecionados na lista"""
+        return [self.filtered_indices[i] for i in self.flashcard_listbox.curselection()]
+    
     def move_flashcard(self):
-        """Move um flashcard para outro baralho"""
-        try:
-            selected_idx = self.flashcard_listbox.curselection()[0]
-            card_idx = self.filtered_indices[selected_idx]
-            
-            # Encontrar baralho atual
-            current_deck = None
-            for deck_name, deck_cards in self.decks.items():
-                if card_idx in deck_cards:
-                    current_deck = deck_name
-                    break
-            
-            # Selecionar novo baralho
-            deck_options = [d for d in self.decks.keys() if d != current_deck]
-            if not deck_options:
-                messagebox.showinfo("Info", "Não há outros baralhos disponíveis.")
-                return
-            
-            new_deck = None
-            deck_window = tk.Toplevel(self.root)
-            deck_window.title("Mover Flashcard")
-            deck_window.geometry("300x200")
-            deck_window.grab_set()
-            
-            tk.Label(deck_window, text="Selecione o novo baralho:", 
-                    font=("Arial", 12)).pack(pady=10)
-            
-            deck_var = tk.StringVar()
-            for deck in deck_options:
-                tk.Radiobutton(deck_window, text=deck, variable=deck_var, 
-                              value=deck, font=("Arial", 11)).pack(anchor="w", padx=20)
-            
-            def move_card():
-                nonlocal new_deck
-                new_deck = deck_var.get()
-                if new_deck:
-                    deck_window.destroy()
-            
-            tk.Button(deck_window, text="Mover", command=move_card, 
-                     bg="#4caf50", fg="white").pack(pady=10)
-            tk.Button(deck_window, text="Cancelar", command=deck_window.destroy, 
-                     bg="#f44336", fg="white").pack(pady=5)
-            
-            deck_window.wait_window()
-            
+        """Move os flashcards selecionados para outro baralho"""
+        card_indices = self.selected_card_indices()
+        if not card_indices:
+            messagebox.showwarning("Aviso", "Selecione um ou mais flashcards para mover.")
+            return
+        
+        # Baralhos de origem (um único baralho não aparece como destino)
+        owner = bulk.card_decks(self.decks)
+        source_decks = {owner.get(i) for i in card_indices}
+        deck_options = [d for d in self.decks.keys() if {d} != source_decks]
+        if not deck_options:
+            messagebox.showinfo("Info", "Não há outros baralhos disponíveis.")
+            return
+        
+        new_deck = None
+        deck_window = tk.Toplevel(self.root)
+        deck_window.title("Mover Flashcards")
+        deck_window.geometry("300x200")
+        deck_window.grab_set()
+        
+        tk.Label(deck_window, text=f"Mover {len(card_indices)} cartão(ões) para:", 
+                font=("Arial", 12)).pack(pady=10)
+        
+        deck_var = tk.StringVar()
+        for deck in deck_options:
+            tk.Radiobutton(deck_window, text=deck, variable=deck_var, 
+                          value=deck, font=("Arial", 11)).pack(anchor="w", padx=20)
+        
+        def move_card():
+            nonlocal new_deck
+            new_deck = deck_var.get()
             if new_deck:
-                # Remover do baralho atual e adicionar ao novo
-                self.decks[current_deck].remove(card_idx)
-                self.decks[new_deck].append(card_idx)
-                self.save_data()
-                messagebox.showinfo("Sucesso", f"Flashcard movido para '{new_deck}'!")
-                self.update_flashcard_list()
-            
-        except IndexError:
-            messagebox.showwarning("Aviso", "Selecione um flashcard para mover.")
+                deck_window.destroy()
+        
+        tk.Button(deck_window, text="Mover", command=move_card, 
+                 bg="#4caf50", fg="white").pack(pady=10)
+        tk.Button(deck_window, text="Cancelar", command=deck_window.destroy, 
+                 bg="#f44336", fg="white").pack(pady=5)
+        
+        deck_window.wait_window()
+        
+        if new_deck:
+            self.ensure_deck_loaded(new_deck)
+            self.undo_log.record(f"mover {len(card_indices)} cartão(ões)", CardMoves(
+                self.undo_entries(card_indices), new_deck))
+            changed = bulk.move_cards(self.flashcards, self.decks, card_indices, new_deck)
+            self.card_index = None
+            self.save_data(*changed)
+            messagebox.showinfo("Sucesso", f"{len(card_indices)} flashcard(s) movido(s) para '{new_deck}'!")
+            self.update_flashcard_list()
     
     def delete_flashcard_from_list(self):
-        """Exclui um flashcard selecionado na lista"""
-        try:
-            selected_idx = self.flashcard_listbox.curselection()[0]
-            card_idx = self.filtered_indices[selected_idx]
-            
-            confirm = messagebox.askyesno("Confirmar Exclusão", 
-                                         "Tem certeza que deseja excluir este flashcard?")
-            
-            if confirm:
-                # Remover das listas de baralhos
-                for deck_cards in self.decks.values():
-                    if card_idx in deck_cards:
-                        deck_cards.remove(card_idx)
-                    # Ajustar índices dos cartões após o removido
-                    for i in range(len(deck_cards)):
-                        if deck_cards[i] > card_idx:
-                            deck_cards[i] -= 1
-                
-                # Remover o flashcard
-                del self.flashcards[card_idx]
-                
-                self.save_data()
-                messagebox.showinfo("Sucesso", "Flashcard excluído com sucesso!")
-                self.update_flashcard_list()
-        except IndexError:
-            messagebox.showwarning("Aviso", "Selecione um flashcard para excluir.")
+        """Exclui os flashcards selecionados na lista"""
+        card_indices = self.selected_card_indices()
+        if not card_indices:
+            messagebox.showwarning("Aviso", "Selecione um ou mais flashcards para excluir.")
+            return
+        
+        if len(card_indices) == 1:
+            question = "Tem certeza que deseja excluir este flashcard?"
+        else:
+            question = f"Tem certeza que deseja excluir {len(card_indices)} flashcards?"
+        if messagebox.askyesno("Confirmar Exclusão", question):
+            self.undo_log.record(f"excluir {len(card_indices)} cartão(ões)", CardRows(
+                self.undo_entries(card_indices), False))
+            changed = bulk.delete_cards(self.flashcards, self.decks, card_indices, self.sync_journal)
+            self.save_data(*changed)
+            messagebox.showinfo("Sucesso", f"{len(card_indices)} flashcard(s) excluído(s) com sucesso!")
+            self.update_flashcard_list()
+    
+    def reset_flashcards_from_list(self):
+        """Reinicia o agendamento dos flashcards selecionados"""
+        card_indices = self.selected_card_indices()
+        if not card_indices:
+            messagebox.showwarning("Aviso", "Selecione um ou mais flashcards para reiniciar.")
+            return
+        
+        if messagebox.askyesno("Reiniciar Agendamento", 
+                               f"Reiniciar o agendamento de {len(card_indices)} flashcard(s)? "
+                               "Eles voltarão a ser cartões novos, pendentes hoje."):
+            self.undo_log.record("reiniciar agendamento",
+                                 CardEdit(self.undo_entries(card_indices)))
+            changed = bulk.reset_scheduling(self.flashcards, self.decks, card_indices)
+            self.reindex_cards(card_indices)
+            self.save_data(*changed)
+            self.update_flashcard_list()
+    
+    def tag_flashcards_from_list(self):
+        """Acrescenta ou remove tags dos flashcards selecionados"""
+        card_indices = self.selected_card_indices()
+        if not card_indices:
+            messagebox.showwarning("Aviso", "Selecione um ou mais flashcards.")
+            return
+        
+        text = simpledialog.askstring("Tags", 
+                                      f"Tags para {len(card_indices)} cartão(ões), separadas por espaço.\n"
+                                      "Use -tag para remover uma tag:")
+        if not text:
+            return
+        words = text.split()
+        add = parse_tags(" ".join(w for w in words if not w.startswith("-")))
+        remove = parse_tags(" ".join(w[1:] for w in words if w.startswith("-")))
+        edit = CardEdit(self.undo_entries(card_indices))
+        changed = bulk.edit_tags(self.flashcards, self.decks, card_indices, add, remove)
+        if changed:
+            self.undo_log.record("editar tags", edit)
+        self.reindex_cards(card_indices)
+        if changed:
+            self.save_data(*changed)
+        self.update_flashcard_list()
+    
+    def suspend_flashcards_from_list(self):
+        """Suspende os flashcards selecionados (ou os reativa, se todos já
+        estiverem suspensos)"""
+        card_indices = self.selected_card_indices()
+        if not card_indices:
+            messagebox.showwarning("Aviso", "Selecione um ou mais flashcards.")
+            return
+        
+        suspend = not all(self.flashcards[i].get("suspended") for i in card_indices)
+        self.undo_log.record("suspender" if suspend else "reativar",
+                             CardEdit(self.undo_entries(card_indices)))
+        changed = bulk.set_suspended(self.flashcards, self.decks, card_indices, suspend)
+        self.reindex_cards(card_indices)
+        if changed:
+            self.save_data(*changed)
+        self.update_flashcard_list()
     
     def import_flashcards(self):
-        """Importa flashcards de um arquivo CSV"""
-        file_path = filedialog.askopenfilename(
+        """Importa flashcards de arquivos CSV/texto ou pacotes do Anki"""
+        file_paths = filedialog.askopenfilenames(
             title="Importar Flashcards",
-            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt"),
+                       ("Anki packages", "*.apkg"), ("All files", "*.*")]
         )
         
-        if not file_path:
+        if not file_paths:
             return
         
-        try:
-            imported_count = 0
-            deck_name = simpledialog.askstring("Baralho", 
-                                              "Nome do baralho para os flashcards importados:",
-                                              initialvalue="Importados")
-            
-            if not deck_name or not self.validate_text_input(deck_name):
-                deck_name = "Importados"
-            
-            # Criar baralho se não existir
-            if deck_name not in self.decks:
-                self.decks[deck_name] = []
-            
-            with open(file_path, 'r', encoding='utf-8') as file:
-                if file_path.endswith('.csv'):
-                    csv_reader = csv.reader(file)
-                    for row in csv_reader:
-                        if len(row) >= 2 and self.validate_text_input(row[0]) and self.validate_text_input(row[1]):
-                            new_card = {
-                                "front": row[0].strip(),
-                                "back": row[1].strip(),
-                                "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "last_review": None,
-                                "next_review": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "ease_factor": 2.5,
-                                "interval": 0,
-                                "repetitions": 0,
-                                "correct_streak": 0,
-                                "total_reviews": 0
-                            }
-                            self.flashcards.append(new_card)
-                            self.decks[deck_name].append(len(self.flashcards) - 1)
-                            imported_count += 1
-                else:
-                    # Formato texto: linha ímpar = frente, linha par = verso
-                    lines = file.readlines()
-                    for i in range(0, len(lines) - 1, 2):
-                        front = lines[i].strip()
-                        back = lines[i + 1].strip()
-                        
-                        if self.validate_text_input(front) and self.validate_text_input(back):
-                            new_card = {
-                                "front": front,
-                                "back": back,
-                                "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "last_review": None,
-                                "next_review": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "ease_factor": 2.5,
-                                "interval": 0,
-                                "repetitions": 0,
-                                "correct_streak": 0,
-                                "total_reviews": 0
-                            }
-                            self.flashcards.append(new_card)
-                            self.decks[deck_name].append(len(self.flashcards) - 1)
-                            imported_count += 1
+        packages = [path for path in file_paths if path.lower().endswith(".apkg")]
+        for path in packages:
+            self.import_apkg(path)
+        others = [path for path in file_paths if path not in packages]
+        if others:
+            self.import_paths(others)
+    
+    def import_apkg(self, path):
+        """Importa um pacote do Anki, lote a lote (ver apkg.py)"""
+        keep_decks = messagebox.askyesno(
+            "Anki", f"{os.path.basename(path)}\n\nManter os baralhos do Anki?\n"
+                    "(Não = importar tudo em um único baralho)")
+        target = None
+        if not keep_decks:
+            target = simpledialog.askstring("Baralho",
+                                            "Nome do baralho para os flashcards importados:",
+                                            initialvalue="Importados")
+            if not target or not self.validate_text_input(target):
+                target = "Importados"
+            target = target.strip()
+        
+        def finish(result):
+            by_deck, skipped = result
+            for deck_name in by_deck:
+                if deck_name not in self.decks:
+                    self.decks[deck_name] = []
+                self.ensure_deck_loaded(deck_name)
+            by_deck = self.skip_duplicates({deck_name: self.filter_imported(cards, deck_name)
+                                            for deck_name, cards in by_deck.items()})
+            for deck_name, cards in by_deck.items():
+                start = len(self.flashcards)
+                self.next_card_id = assign_card_ids(cards, self.next_card_id)
+                self.flashcards.extend(cards)
+                self.decks[deck_name].extend(range(start, len(self.flashcards)))
+                self.notify_created(cards, deck_name)
+            imported_count = sum(len(cards) for cards in by_deck.values())
+            if imported_count:
+                self.card_index = None
+                self.save_data(*by_deck)
+            summary = f"{imported_count} flashcards importados em {len(by_deck)} baralho(s)."
+            if skipped:
+                summary += f"\n{skipped} cartões sem frente ou verso em texto foram ignorados."
+            messagebox.showinfo("Importação", summary)
+        
+        self.jobs.submit(
+            "Importando do Anki", read_apkg_cards, path, target,
+            on_done=finish,
+            on_error=lambda e: messagebox.showerror("Erro", f"Erro ao importar o pacote do Anki: {e}"))
+    
+    def import_folder(self):
+        """Importa todos os arquivos CSV/texto de uma pasta"""
+        folder = filedialog.askdirectory(title="Importar Pasta de Flashcards")
+        if not folder:
+            return
+        
+        file_paths = collect_import_files(folder)
+        if not file_paths:
+            messagebox.showwarning("Aviso", "Nenhum arquivo .csv ou .txt encontrado na pasta.")
+            return
+        
+        self.import_paths(file_paths)
+    
+    def import_paths(self, file_paths):
+        """Processa os arquivos em paralelo e junta os cartões em um único salvamento"""
+        deck_name = simpledialog.askstring("Baralho", 
+                                          "Nome do baralho para os flashcards importados:",
+                                          initialvalue="Importados")
+        
+        if not deck_name or not self.validate_text_input(deck_name):
+            deck_name = "Importados"
+        deck_name = deck_name.strip()
+        
+        # A leitura roda em segundo plano (e em processos auxiliares); os
+        # cartões entram na coleção em finish_import, na thread do Tk
+        def run(context):
+            results = import_files(file_paths, progress=context.progress)
+            for result in results:
+                if not result["error"]:
+                    SEARCH_KEYS.add_cards(result["cards"])
+            return results
+        
+        self.jobs.submit(
+            "Importando arquivos", run,
+            on_done=lambda results: self.finish_import(deck_name, file_paths, results),
+            on_error=lambda e: messagebox.showerror("Erro", f"Erro ao importar flashcards: {e}"),
+            cancellable=False)
+    
+    def filter_imported(self, cards, deck_name):
+        """Passa os cartões lidos de um arquivo pelo filtro import_row dos
+        plugins, que pode alterá-los ou descartá-los"""
+        if not HOOKS.handlers["import_row"]:
+            return cards
+        cards = [HOOKS.filter("import_row", card, deck_name, valid=valid_import_row)
+                 for card in cards]
+        return [card for card in cards if card is not False]
+    
+    def notify_created(self, cards, deck_name):
+        """Avisa os plugins (card_created) dos cartões acrescentados"""
+        if HOOKS.handlers["card_created"]:
+            for card in cards:
+                HOOKS.call("card_created", card, deck_name)
+    
+    def finish_import(self, deck_name, file_paths, results):
+        """Junta à coleção os cartões lidos por import_paths"""
+        # Criar baralho se não existir
+        if deck_name not in self.decks:
+            self.decks[deck_name] = []
+        self.ensure_deck_loaded(deck_name)
+        
+        # Plugins podem alterar ou descartar os cartões lidos
+        for result in results:
+            if not result["error"]:
+                result["cards"] = self.filter_imported(result["cards"], deck_name)
+        
+        imported = self.skip_duplicates({deck_name: [card for result in results 
+                                                     if not result["error"] 
+                                                     for card in result["cards"]]})
+        kept = {id(card) for card in imported[deck_name]}
+        
+        imported_count = 0
+        report = []
+        for result in results:
+            file_name = os.path.basename(result["path"])
+            if result["error"]:
+                report.append(f"❌ {file_name}: {result['error']}")
+                continue
             
-            self.save_data()
-            messagebox.showinfo("Sucesso", f"{imported_count} flashcards importados com sucesso!")
+            duplicates = len(result["cards"])
+            result["cards"] = [card for card in result["cards"] if id(card) in kept]
+            duplicates -= len(result["cards"])
+            start = len(self.flashcards)
+            self.next_card_id = assign_card_ids(result["cards"], self.next_card_id)
+            self.flashcards.extend(result["cards"])
+            self.decks[deck_name].extend(range(start, len(self.flashcards)))
+            self.notify_created(result["cards"], deck_name)
+            imported_count += len(result["cards"])
             
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao importar flashcards: {e}")
+            line = f"✅ {file_name}: {len(result['cards'])} cartões"
+            if result["skipped"]:
+                line += f" ({result['skipped']} linhas ignoradas)"
+            if duplicates:
+                line += f" ({duplicates} duplicados ignorados)"
+            report.append(line)
+        
+        if imported_count:
+            self.save_data(deck_name)
+        
+        summary = f"{imported_count} flashcards importados de {len(file_paths)} arquivo(s)."
+        # Limitar o relatório para não gerar uma janela gigante
+        if len(report) > 20:
+            report = report[:20] + [f"... e mais {len(report) - 20} arquivo(s)"]
+        messagebox.showinfo("Importação", summary + "\n\n" + "\n".join(report))
+    
+    def duplicate_cards(self, deck_name, cards):
+        """Cartões cuja frente já existe no baralho (ou aparece antes na
+        própria lista), comparando as chaves normalizadas: "Ação" e "acao"
+        são duplicados"""
+        index = self.get_card_index()
+        in_deck = set(self.decks.get(deck_name, ()))
+        seen = set()
+        duplicates = []
+        for card in cards:
+            key = SEARCH_KEYS.key(card["front"])
+            if key in seen or any(i in in_deck for i in index.find_text("front", key)):
+                duplicates.append(card)
+            seen.add(key)
+        return duplicates
+    
+    def skip_duplicates(self, by_deck):
+        """Pergunta se os cartões importados que já existem nos baralhos de
+        destino devem ser ignorados; retorna {baralho: cartões a importar}"""
+        duplicates = {deck_name: self.duplicate_cards(deck_name, cards)
+                      for deck_name, cards in by_deck.items()}
+        count = sum(map(len, duplicates.values()))
+        if not count or not messagebox.askyesno(
+                "Duplicados", f"{count} cartão(ões) importado(s) já existem no baralho "
+                              "(mesma frente, sem diferenciar acentos e maiúsculas).\n\n"
+                              "Ignorar os duplicados?"):
+            return by_deck
+        result = {}
+        for deck_name, cards in by_deck.items():
+            skip = {id(card) for card in duplicates[deck_name]}
+            result[deck_name] = [card for card in cards if id(card) not in skip]
+        return result
     
     def export_flashcards(self):
-        """Exporta flashcards para um arquivo CSV"""
-        if not self.flashcards:
+        """Exporta flashcards em CSV, JSON Lines, formato colunar ou .apkg"""
+        if not any(self.deck_size(deck_name) for deck_name in self.decks):
             messagebox.showwarning("Aviso", "Não há flashcards para exportar.")
             return
         
+        options = self.ask_export_options()
+        if not options:
+            return
+        fmt = options["format"]
+        if fmt == "apkg":
+            extension, label = ".apkg", "Anki packages"
+        elif options["per_deck"]:
+            extension, label = ".zip", "Zip files"
+        else:
+            extension, label = FORMATS[fmt], f"{fmt.upper()} files"
+        
         file_path = filedialog.asksaveasfilename(
             title="Exportar Flashcards",
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            defaultextension=extension,
+            filetypes=[(label, "*" + extension), ("All files", "*.*")]
         )
         
         if not file_path:
             return
         
-        try:
-            # Perguntar se quer exportar todos ou apenas de um baralho
-            export_all = messagebox.askyesno("Exportar", 
-                                           "Exportar todos os flashcards?\n(Não = apenas do baralho atual)")
-            
-            cards_to_export = []
-            if export_all:
-                cards_to_export = [(i, card) for i, card in enumerate(self.flashcards)]
-            else:
-                deck_cards = self.get_deck_cards(self.current_deck)
-                cards_to_export = [(i, self.flashcards[i]) for i in deck_cards if i < len(self.flashcards)]
-            
-            with open(file_path, 'w', newline='', encoding='utf-8') as file:
-                csv_writer = csv.writer(file)
-                csv_writer.writerow(['Frente', 'Verso', 'Baralho', 'Criado', 'Repetições', 'Facilidade'])
-                
-                for idx, card in cards_to_export:
-                    # Encontrar baralho do cartão
-                    card_deck = "Geral"
-                    for deck_name, deck_cards in self.decks.items():
-                        if idx in deck_cards:
-                            card_deck = deck_name
-                            break
-                    
-                    csv_writer.writerow([
-                        card['front'],
-                        card['back'],
-                        card_deck,
-                        card['created_at'],
-                        card['repetitions'],
-                        card['ease_factor']
-                    ])
-            
-            messagebox.showinfo("Sucesso", f"{len(cards_to_export)} flashcards exportados com sucesso!")
-            
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao exportar flashcards: {e}")
+        deck_names = list(self.decks) if options["all_decks"] else [self.current_deck]
+        fields = FULL_FIELDS if options["full"] else BASIC_FIELDS
+        total = sum(self.deck_size(deck_name) for deck_name in deck_names)
+        if options["per_deck"] and fmt != "apkg":
+            # Baralhos não carregados são lidos pelos próprios processos auxiliares
+            deck_jobs = [(deck_name, (self.store.deck_path(deck_name) or [])
+                          if deck_name in self.unloaded_decks
+                          else [self.flashcards[i] for i in self.decks[deck_name]])
+                         for deck_name in deck_names]
+        else:
+            sources = self.export_sources(deck_names)
+        
+        def run(context):
+            if options["per_deck"] and fmt != "apkg":
+                def progress(done, decks):
+                    context.check()
+                    context.progress(done, decks, f"{done}/{decks} baralhos")
+                return export_per_deck(file_path, deck_jobs, fmt, fields, progress=progress)
+            tracked = track_cards(context, sources, total)
+            if fmt == "apkg":
+                return write_apkg(file_path, tracked)
+            return export_collection(file_path, tracked, fmt, fields)
+        
+        def cancelled():
+            if os.path.exists(file_path):
+                os.remove(file_path)   # arquivo incompleto
+        
+        self.jobs.submit(
+            "Exportando", run,
+            on_done=lambda count: messagebox.showinfo("Sucesso", f"{count} flashcards exportados com sucesso!"),
+            on_error=lambda e: messagebox.showerror("Erro", f"Erro ao exportar flashcards: {e}"),
+            on_cancel=cancelled)
+    
+    def export_sources(self, deck_names):
+        """Lista de (baralho, cartões) para exportação. Os cartões dos
+        baralhos carregados são listados agora, na thread do Tk; os dos ainda
+        não carregados são lidos um por vez durante a exportação, sem passar
+        pela coleção em memória."""
+        store = self.store
+        
+        def read(deck_name):
+            yield from store.load_deck(deck_name)
+        
+        return [(deck_name, read(deck_name) if deck_name in self.unloaded_decks
+                 else [self.flashcards[i] for i in self.decks[deck_name]])
+                for deck_name in deck_names]
+    
+    def ask_export_options(self):
+        """Janela com as opções de exportação; retorna um dicionário ou None"""
+        options = None
+        window = tk.Toplevel(self.root)
+        window.title("Exportar Flashcards")
+        window.geometry("340x380")
+        window.grab_set()
+        
+        tk.Label(window, text="Formato:", font=("Arial", 12, "bold")).pack(anchor="w", padx=20, pady=(10, 0))
+        format_var = tk.StringVar(value="csv")
+        for value, text in (("csv", "CSV"), ("jsonl", "JSON Lines"),
+                            ("colunar", "Colunar (zip com uma coluna por campo)"),
+                            ("apkg", "Anki (.apkg)")):
+            tk.Radiobutton(window, text=text, variable=format_var, value=value,
+                          font=("Arial", 11)).pack(anchor="w", padx=30)
+        
+        tk.Label(window, text="Baralhos:", font=("Arial", 12, "bold")).pack(anchor="w", padx=20, pady=(10, 0))
+        all_var = tk.BooleanVar(value=True)
+        tk.Radiobutton(window, text="Todos", variable=all_var, value=True,
+                      font=("Arial", 11)).pack(anchor="w", padx=30)
+        tk.Radiobutton(window, text=f"Apenas '{self.current_deck}'", variable=all_var, value=False,
+                      font=("Arial", 11)).pack(anchor="w", padx=30)
+        
+        full_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(window, text="Incluir agendamento completo, tags e suspensão",
+                      variable=full_var, font=("Arial", 11)).pack(anchor="w", padx=20, pady=(10, 0))
+        per_deck_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(window, text="Um arquivo por baralho (zip)",
+                      variable=per_deck_var, font=("Arial", 11)).pack(anchor="w", padx=20)
+        
+        def confirm():
+            nonlocal options
+            options = {"format": format_var.get(), "all_decks": all_var.get(),
+                       "full": full_var.get(), "per_deck": per_deck_var.get()}
+            window.destroy()
+        
+        tk.Button(window, text="Exportar", command=confirm, 
+                 bg="#4caf50", fg="white").pack(pady=10)
+        tk.Button(window, text="Cancelar", command=window.destroy, 
+                 bg="#f44336", fg="white").pack()
+        
+        window.wait_window()
+        return options
     
     def show_statistics(self):
         """Exibe estatísticas detalhadas"""
@@ -893,31 +2156,73 @@ class FlashcardApp:
                               font=("Arial", 18, "bold"), bg=theme["bg"], fg=theme["fg"])
         title_label.pack(pady=10)
         
-        # Calcular estatísticas
-        total_cards = len(self.flashcards)
-        if total_cards == 0:
+        btn_frame = tk.Frame(self.main_frame, bg=theme["bg"])
+        btn_frame.pack(side=tk.BOTTOM, pady=10)
+        
+        tk.Button(btn_frame, text="📅 Atividade", 
+                 font=("Arial", self.font_size), bg="#9c27b0", fg="white",
+                 command=self.show_activity).pack(side=tk.LEFT, padx=5)
+        
+        btn_back = tk.Button(btn_frame, text="⬅️ Voltar", 
+                            font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
+                            command=self.show_main_menu)
+        btn_back.pack(side=tk.LEFT, padx=5)
+        
+        # A tela aparece já com as contagens dos baralhos carregados e os
+        # tamanhos do manifesto; os baralhos não carregados e a atividade
+        # são calculados em segundo plano, sem que esses baralhos entrem na
+        # coleção
+        store = self.store
+        activity = self.activity
+        unloaded = list(self.unloaded_decks)
+        loaded_cards = list(self.flashcards)
+        stats = collection_stats(loaded_cards)
+        stats["unloaded"] = sum(self.unloaded_decks.values())
+        stats["activity"] = None
+        widgets = self.render_statistics(stats)
+        if widgets is None:
+            return
+        text_stats, chart_label = widgets
+        
+        def run(context):
+            # Cada baralho lido aqui é descartado depois de contado
+            def unloaded_cards():
+                for n, deck_name in enumerate(unloaded):
+                    context.check()
+                    context.progress(n, len(unloaded), deck_name)
+                    yield from store.load_deck(deck_name)
+            
+            counts = collection_stats(unloaded_cards())
+            totals = {field: stats[field] + value for field, value in counts.items()}
+            totals["unloaded"] = 0
+            if HOOKS.handlers["stats_compute"]:
+                totals["extra"] = {}
+                HOOKS.call("stats_compute", totals, itertools.chain(loaded_cards, unloaded_cards()))
+            # Atividade pelos resumos diários (montados do histórico na 1ª vez)
+            totals["activity"] = activity.summary()
+            return totals
+        
+        def done(totals):
+            # O usuário pode ter saído da tela enquanto a tarefa rodava
+            if text_stats.winfo_exists():
+                self.fill_statistics(text_stats, totals)
+                self.start_statistics_chart(chart_label, totals)
+        
+        def failed(e):
+            if text_stats.winfo_exists():
+                self.fill_statistics(text_stats, stats, f"⚠️ Erro ao calcular estatísticas: {e}")
+        
+        self.jobs.submit("Estatísticas", run, on_done=done, on_error=failed)
+    
+    def render_statistics(self, stats):
+        """Monta a tela de estatísticas com as contagens de collection_stats;
+        retorna (texto, rótulo do gráfico), ou None se a coleção está vazia"""
+        theme = self.themes[self.current_theme]
+        if stats["total"] + stats["unloaded"] == 0:
             no_data = tk.Label(self.main_frame, text="Não há dados para exibir.", 
                               font=("Arial", 14), bg=theme["bg"], fg=theme["fg"])
             no_data.pack(pady=20)
-            
-            btn_back = tk.Button(self.main_frame, text="⬅️ Voltar", 
-                                font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
-                                command=self.show_main_menu)
-            btn_back.pack(pady=10)
-            return
-        
-        # Estatísticas gerais
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        pending_today = sum(1 for card in self.flashcards 
-                           if not card["next_review"] or card["next_review"] <= current_date)
-        
-        reviewed_cards = sum(1 for card in self.flashcards if card["last_review"])
-        never_reviewed = total_cards - reviewed_cards
-        
-        # Estatísticas por nível de facilidade
-        easy_cards = sum(1 for card in self.flashcards if card["ease_factor"] >= 2.8)
-        medium_cards = sum(1 for card in self.flashcards if 2.2 <= card["ease_factor"] < 2.8)
-        hard_cards = sum(1 for card in self.flashcards if card["ease_factor"] < 2.2)
+            return None
         
         # Frame de estatísticas
         stats_frame = tk.Frame(self.main_frame, bg=theme["bg"])
@@ -928,10 +2233,41 @@ class FlashcardApp:
                             font=("Arial", self.font_size), wrap=tk.WORD,
                             bg=theme["card_bg"], fg=theme["fg"])
         text_stats.pack(side=tk.LEFT, padx=10, fill="both", expand=True)
+        self.fill_statistics(text_stats, stats)
         
-        stats_text = f"""📚 ESTATÍSTICAS GERAIS
+        # Gráficos: renderizados em segundo plano e reaproveitados enquanto a
+        # coleção não muda
+        if not charts_available():
+            chart_text = "📈 Gráficos indisponíveis\n(instale matplotlib)"
+        else:
+            chart_text = "📈 Gerando gráficos..."
+        chart_label = tk.Label(stats_frame, text=chart_text, 
+                              font=("Arial", 12), bg=theme["bg"], fg=theme["fg"])
+        chart_label.pack(side=tk.RIGHT, padx=10)
+        if charts_available() and self.chart_image is not None \
+                and self.chart_renderer.cached_key == self.collection_version:
+            chart_label.config(image=self.chart_image, text="")
+        return text_stats, chart_label
+    
+    def fill_statistics(self, text_stats, stats, note=None):
+        """Escreve as estatísticas no texto da tela. Enquanto há baralhos não
+        carregados por contar (stats["unloaded"]) as contagens são só dos
+        carregados, e a atividade aparece quando stats["activity"] chega."""
+        total_cards = stats["total"]
+        pending_today = stats["pending"]
+        reviewed_cards = stats["reviewed"]
+        activity = stats["activity"]
+        easy_cards, medium_cards, hard_cards = stats["easy"], stats["medium"], stats["hard"]
+        never_reviewed = total_cards - reviewed_cards
         
-Total de flashcards: {total_cards}
+        stats_text = "📚 ESTATÍSTICAS GERAIS\n"
+        if note:
+            stats_text += f"\n{note}\n"
+        elif stats["unloaded"]:
+            stats_text += (f"\n⏳ Contando {stats['unloaded']} cartões de baralhos não "
+                           "carregados; os números abaixo são dos carregados.\n")
+        stats_text += f"""
+Total de flashcards: {total_cards + stats["unloaded"]}
 Pendentes para hoje: {pending_today}
 Já revisados: {reviewed_cards}
 Nunca revisados: {never_reviewed}
@@ -943,66 +2279,185 @@ Difíceis (<2.2): {hard_cards}
 
 🗂️ POR BARALHO"""
         
-        for deck_name, deck_cards in self.decks.items():
-            valid_cards = [i for i in deck_cards if i < len(self.flashcards)]
-            stats_text += f"\n{deck_name}: {len(valid_cards)} cartões"
-        
-        # Estatísticas de atividade recente
-        recent_reviews = []
-        for card in self.flashcards:
-            if card["last_review"]:
-                try:
-                    review_date = datetime.datetime.strptime(card["last_review"], "%Y-%m-%d %H:%M:%S")
-                    days_ago = (datetime.datetime.now() - review_date).days
-                    if days_ago <= 7:
-                        recent_reviews.append(days_ago)
-                except:
-                    pass
-        
-        stats_text += f"\n\n📅 ATIVIDADE RECENTE (7 dias)\nRevisões: {len(recent_reviews)} cartões"
+        for deck_name in self.decks:
+            stats_text += f"\n{deck_name}: {self.deck_size(deck_name)} cartões"
         
+        stats_text += "\n\n📅 ATIVIDADE"
+        if activity is None:
+            stats_text += "\nCalculando..."
+        else:
+            for span in (7, 30):
+                period = activity[span]
+                stats_text += (f"\nÚltimos {span} dias: {period['reviews']} revisões "
+                               f"em {period['days']} dia(s), {period['new']} novos")
+                if period["retention"] is not None:
+                    stats_text += f" — retenção {period['retention']:.0%}"
+            stats_text += (f"\nTempo de estudo (30 dias): {format_duration(activity[30]['time_ms'])}"
+                           f"\nSequência atual: {activity['current_streak']} dia(s) "
+                           f"(recorde: {activity['longest_streak']})")
+        if stats.get("extra"):
+            stats_text += "\n\n🔌 PLUGINS"
+            for label, value in stats["extra"].items():
+                stats_text += f"\n{label}: {value}"
+        
+        text_stats.config(state=tk.NORMAL)
+        text_stats.delete("1.0", tk.END)
         text_stats.insert(tk.END, stats_text)
         text_stats.config(state=tk.DISABLED)
-        
-        # Gráfico simples usando matplotlib
+    
+    def start_statistics_chart(self, chart_label, stats):
+        """Pede o gráfico das contagens completas, se ainda não está em cache"""
+        key = self.collection_version
+        if not charts_available() or (self.chart_image is not None
+                                      and self.chart_renderer.cached_key == key):
+            return
+        deck_names = list(self.decks.keys())[:5]  # Top 5 baralhos
+        deck_counts = [self.deck_size(name) for name in deck_names]
+        future = self.chart_renderer.submit(
+            key, (stats["easy"], stats["medium"], stats["hard"]), deck_names, deck_counts)
+        self.root.after(50, self.poll_chart, chart_label, key, future)
+    
+    def poll_chart(self, chart_label, key, future, renderer=None, image_attr="chart_image"):
+        """Exibe o gráfico quando a renderização em segundo plano termina
+        (renderer/image_attr: o renderizador e o atributo que guarda a
+        imagem; por padrão os da tela de estatísticas)"""
+        renderer = renderer or self.chart_renderer
+        if not future.done():
+            self.root.after(50, self.poll_chart, chart_label, key, future, renderer, image_attr)
+            return
         try:
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
-            
-            # Gráfico de dificuldade
-            ax1.pie([easy_cards, medium_cards, hard_cards], 
-                   labels=['Fáceis', 'Médios', 'Difíceis'],
-                   colors=['#4caf50', '#ff9800', '#f44336'],
-                   autopct='%1.1f%%')
-            ax1.set_title('Distribuição por Dificuldade')
-            
-            # Gráfico de revisões por baralho
-            deck_names = list(self.decks.keys())[:5]  # Top 5 baralhos
-            deck_counts = [len([i for i in self.decks[name] if i < len(self.flashcards)]) 
-                          for name in deck_names]
-            
-            ax2.bar(deck_names, deck_counts, color='#2196f3')
-            ax2.set_title('Cartões por Baralho (Top 5)')
-            ax2.tick_params(axis='x', rotation=45)
-            
-            plt.tight_layout()
-            
-            # Adicionar gráfico ao tkinter
-            canvas = FigureCanvasTkAgg(fig, stats_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(side=tk.RIGHT, padx=10)
-            
-        except ImportError:
-            # Se matplotlib não estiver disponível
-            chart_label = tk.Label(stats_frame, 
-                                  text="📈 Gráficos indisponíveis\n(instale matplotlib)", 
-                                  font=("Arial", 12), bg=theme["bg"], fg=theme["fg"])
-            chart_label.pack(side=tk.RIGHT, padx=10)
+            png = renderer.collect(key, future)
+        except Exception as e:
+            if chart_label.winfo_exists():
+                chart_label.config(text=f"📈 Erro ao gerar gráficos:\n{e}")
+            return
+        # Uma única PhotoImage por vez: a anterior é liberada pelo Tk
+        image = tk.PhotoImage(data=base64.b64encode(png))
+        setattr(self, image_attr, image)
+        if chart_label.winfo_exists():
+            chart_label.config(image=image, text="")
+    
+    def show_activity(self):
+        """Calendário do último ano, sequência de dias e retenção, montados
+        a partir dos resumos diários (activity.py)"""
+        self.clear_frame()
+        theme = self.themes[self.current_theme]
+        
+        title_label = tk.Label(self.main_frame, text="📅 Atividade", 
+                              font=("Arial", 18, "bold"), bg=theme["bg"], fg=theme["fg"])
+        title_label.pack(pady=10)
+        
+        status_label = tk.Label(self.main_frame, text="Calculando...", 
+                               font=("Arial", 14), bg=theme["bg"], fg=theme["fg"])
+        status_label.pack(pady=20)
+        
+        activity = self.activity
+        today = datetime.date.today()
+        # O calendário começa numa segunda-feira
+        first = today - datetime.timedelta(days=today.weekday() + 7 * (HEATMAP_WEEKS - 1))
+        
+        def run(context):
+            # Um resumo inexistente é montado do histórico (só na 1ª vez)
+            return (activity.summary(today), activity.days(first, today),
+                    activity.trends(today - datetime.timedelta(days=TREND_DAYS - 1), today))
+        
+        def done(result):
+            if status_label.winfo_exists():
+                status_label.destroy()
+                self.render_activity(first, today, *result)
+        
+        def failed(e):
+            if status_label.winfo_exists():
+                status_label.config(text=f"Erro ao ler a atividade: {e}")
+        
+        self.jobs.submit("Atividade", run, on_done=done, on_error=failed)
         
-        # Botão voltar
         btn_back = tk.Button(self.main_frame, text="⬅️ Voltar", 
                             font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
-                            command=self.show_main_menu)
-        btn_back.pack(pady=10)
+                            command=self.show_statistics)
+        btn_back.pack(side=tk.BOTTOM, pady=10)
+    
+    def render_activity(self, first, today, summary, days, trends):
+        """Monta a tela de atividade: resumo, calendário e gráficos"""
+        theme = self.themes[self.current_theme]
+        year = summary[365]
+        retention = year["retention"]
+        text = (f"🔥 Sequência atual: {summary['current_streak']} dia(s)   "
+                f"🏆 Recorde: {summary['longest_streak']} dia(s)   "
+                f"📆 Dias estudados: {summary['study_days']}\n"
+                f"Último ano: {year['reviews']} revisões, {year['new']} cartões novos, "
+                f"{format_duration(year['time_ms'])} de estudo"
+                + (f", retenção {retention:.0%}" if retention is not None else ""))
+        tk.Label(self.main_frame, text=text, font=("Arial", self.font_size),
+                bg=theme["bg"], fg=theme["fg"], justify=tk.LEFT).pack(pady=5)
+        
+        self.draw_heatmap(first, today, days)
+        
+        if not charts_available():
+            tk.Label(self.main_frame, text="📈 Gráficos indisponíveis\n(instale matplotlib)", 
+                    font=("Arial", 12), bg=theme["bg"], fg=theme["fg"]).pack(pady=10)
+            return
+        chart_label = tk.Label(self.main_frame, text="📈 Gerando gráficos...", 
+                              font=("Arial", 12), bg=theme["bg"], fg=theme["fg"])
+        chart_label.pack(pady=10)
+        key = (today, self.activity.version)
+        if self.activity_image is not None and self.activity_renderer.cached_key == key:
+            chart_label.config(image=self.activity_image, text="")
+        else:
+            future = self.activity_renderer.submit(key, *trends)
+            self.root.after(50, self.poll_chart, chart_label, key, future,
+                            self.activity_renderer, "activity_image")
+    
+    def draw_heatmap(self, first, today, days):
+        """Calendário de revisões (uma coluna por semana, uma linha por dia
+        da semana) num Canvas; passar o mouse mostra o dia"""
+        theme = self.themes[self.current_theme]
+        cell, gap, left, top = 13, 2, 30, 18
+        step = cell + gap
+        colors = ["#ebedf0", "#c6e48b", "#7bc96f", "#239a3b", "#196127"]
+        peak = max((day["reviews"] for day in days.values()), default=0)
+        
+        canvas = tk.Canvas(self.main_frame, width=left + HEATMAP_WEEKS * step,
+                          height=top + 7 * step, bg=theme["bg"], highlightthickness=0)
+        canvas.pack(pady=5)
+        for row, name in ((0, "Seg"), (2, "Qua"), (4, "Sex")):
+            canvas.create_text(left - 4, top + row * step + cell / 2, text=name,
+                              anchor="e", font=("Arial", 8), fill=theme["fg"])
+        month_names = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
+                       "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+        previous_month = None
+        for n in range((today - first).days + 1):
+            date = first + datetime.timedelta(days=n)
+            week, weekday = divmod(n, 7)
+            x, y = left + week * step, top + weekday * step
+            if weekday == 0 and date.month != previous_month:
+                canvas.create_text(x, top - 4, text=month_names[date.month - 1],
+                                  anchor="sw", font=("Arial", 8), fill=theme["fg"])
+                previous_month = date.month
+            reviews = days[date]["reviews"] if date in days else 0
+            level = -(-4 * reviews // peak) if reviews else 0
+            canvas.create_rectangle(x, y, x + cell, y + cell, fill=colors[level], outline="")
+        
+        info_label = tk.Label(self.main_frame, text=" ", font=("Arial", 10),
+                             bg=theme["bg"], fg=theme["fg"])
+        info_label.pack()
+        
+        def show_day(event):
+            week, weekday = (event.x - left) // step, (event.y - top) // step
+            date = first + datetime.timedelta(days=week * 7 + weekday)
+            if not (0 <= week < HEATMAP_WEEKS and 0 <= weekday < 7 and first <= date <= today):
+                info_label.config(text=" ")
+                return
+            day = days.get(date)
+            if day is None:
+                info_label.config(text=f"{date:%d/%m/%Y}: nenhuma revisão")
+                return
+            info_label.config(text=(
+                f"{date:%d/%m/%Y}: {day['reviews']} revisões ({day['again']} Esqueci, "
+                f"{day['hard']} Difícil, {day['good']} Bom, {day['easy']} Fácil), "
+                f"{day['new']} novos, {format_duration(day['time_ms'])}"))
+        
+        canvas.bind("<Motion>", show_day)
     
     def show_settings(self):
         """Exibe configurações do aplicativo"""
@@ -1066,6 +2521,15 @@ Difíceis (<2.2): {hard_cards}
                                            command=self.toggle_bidirectional)
         bidirectional_check.pack(anchor="w", padx=20, pady=5)
         
+        self.load_balance_var = tk.BooleanVar(value=self.load_balance)
+        load_balance_check = tk.Checkbutton(review_frame, 
+                                           text="Distribuir as revisões entre os dias (balanceamento de carga)",
+                                           variable=self.load_balance_var,
+                                           font=("Arial", self.font_size),
+                                           bg=theme["bg"], fg=theme["fg"],
+                                           command=self.toggle_load_balance)
+        load_balance_check.pack(anchor="w", padx=20, pady=5)
+        
         # Backup e restauração
         backup_frame = tk.Frame(config_frame, bg=theme["bg"])
         backup_frame.pack(pady=20, fill="x")
@@ -1085,6 +2549,21 @@ Difíceis (<2.2): {hard_cards}
                                command=self.restore_backup)
         btn_restore.pack(side=tk.LEFT, padx=5, pady=5)
         
+        btn_fit = tk.Button(review_frame, text="🧮 Ajustar agendador pelo histórico", 
+                           font=("Arial", self.font_size), bg="#2196f3", fg="white",
+                           command=self.fit_scheduler)
+        btn_fit.pack(anchor="w", padx=20, pady=5)
+        
+        btn_vacuum = tk.Button(backup_frame, text="🧹 Verificar e Compactar", 
+                              font=("Arial", self.font_size), bg="#795548", fg="white",
+                              command=self.vacuum_collection)
+        btn_vacuum.pack(side=tk.LEFT, padx=5, pady=5)
+        
+        btn_memory = tk.Button(backup_frame, text="🧠 Relatório de Memória", 
+                              font=("Arial", self.font_size), bg="#607d8b", fg="white",
+                              command=self.show_memory_report)
+        btn_memory.pack(side=tk.LEFT, padx=5, pady=5)
+        
         # Botão voltar
         btn_back = tk.Button(self.main_frame, text="⬅️ Voltar", 
                             font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
@@ -1108,53 +2587,267 @@ Difíceis (<2.2): {hard_cards}
         self.bidirectional_mode = self.bidirectional_var.get()
         self.save_data()
     
+    def toggle_load_balance(self):
+        """Liga/desliga o balanceamento de carga do agendamento"""
+        self.load_balance = self.load_balance_var.get()
+        self.save_data()
+    
+    def fit_scheduler(self):
+        """Ajusta os parâmetros do SM-2 de cada baralho a partir do histórico.
+        
+        A leitura dos baralhos não carregados e do histórico e o ajuste rodam
+        em segundo plano; os parâmetros são aplicados quando a tarefa termina.
+        """
+        if not len(self.history):
+            messagebox.showinfo("Info", "Ainda não há revisões registradas no histórico.")
+            return
+        
+        store = self.store
+        history_directory = self.history.directory
+        unloaded = list(self.unloaded_decks)
+        # Cópias das listas (não dos cartões): a coleção pode mudar enquanto isso
+        flashcards = list(self.flashcards)
+        loaded_decks = {deck_name: list(deck_cards) for deck_name, deck_cards in self.decks.items()
+                        if deck_name not in self.unloaded_decks}
+        
+        def run(context):
+            deck_of_card = {}
+            for deck_name, deck_cards in loaded_decks.items():
+                for i in deck_cards:
+                    deck_of_card[flashcards[i]["id"]] = deck_name
+            decks = {}
+            for n, deck_name in enumerate(unloaded):
+                context.check()
+                context.progress(n, len(unloaded), deck_name)
+                decks[deck_name] = store.load_deck(deck_name)
+                for card in decks[deck_name]:
+                    if "id" in card:
+                        deck_of_card[card["id"]] = deck_name
+            context.check()
+            context.progress(len(unloaded), len(unloaded), "Ajustando parâmetros")
+            # Instância própria do histórico: a revisão pode anexar nesse meio tempo
+            history = ReviewHistory(history_directory)
+            history.reload()
+            return decks, fit_decks(group_reviews_by_deck(history, deck_of_card))
+        
+        def done(result):
+            decks, results = result
+            for deck_name, cards in decks.items():
+                if deck_name in self.unloaded_decks:
+                    self.adopt_deck(deck_name, cards)
+            report = []
+            for deck_name, result in sorted(results.items()):
+                if result["after"] is None:
+                    report.append(f"{deck_name}: {result['reviews']} revisões (insuficiente, mantido padrão)")
+                    continue
+                if deck_name not in self.decks:   # excluído enquanto a tarefa rodava
+                    continue
+                self.scheduler_params[deck_name] = result["params"]
+                report.append(f"{deck_name}: {result['reviews']} revisões, "
+                              f"verossimilhança {result['before']:.3f} → {result['after']:.3f}")
+            
+            self.save_data()
+            messagebox.showinfo("Agendador Ajustado", "\n".join(report))
+        
+        self.jobs.submit(
+            "Ajustando agendador", run, on_done=done,
+            on_error=lambda e: messagebox.showerror("Erro", f"Erro ao ajustar o agendador: {e}"))
+    
+    def sync_now(self):
+        """Sincroniza a coleção com o servidor de sincronização"""
+        state = read_sync_state(self.store.directory) or {}
+        server_url = state.get("server")
+        if not server_url:
+            server_url = simpledialog.askstring("Sincronizar", "Endereço do servidor de sincronização:",
+                                                initialvalue="http://127.0.0.1:8766")
+            if not server_url:
+                return
+        
+        # A sincronização roda em segundo plano, com um DeckStore próprio,
+        # depois que o que está pendente for gravado; o resultado volta pelo
+        # merge incremental
+        directory = self.store.directory
+        server_url = server_url.strip()
+        
+        def run(context):
+            return sync_collection(DeckStore(directory), server_url)
+        
+        def done(summary):
+            self.check_external_changes()
+            messagebox.showinfo("Sincronizado", 
+                                f"Enviadas {summary['sent']} alterações, recebidas {summary['received']}.\n"
+                                f"Transferidos {(summary['bytes_sent'] + summary['bytes_received']) / 1024:.1f} KB "
+                                f"em {summary['seconds']:.2f} s.")
+            self.show_main_menu()
+        
+        def submit():
+            self.jobs.submit(
+                "Sincronizando", run, serial=True, cancellable=False, on_done=done,
+                on_error=lambda e: messagebox.showerror("Erro", f"Erro ao sincronizar: {e}"))
+        
+        self.save_data()
+        self.after_save(submit)
+    
+    def show_memory_report(self):
+        """Tela de diagnóstico: para onde vai a memória e quanto cresceu
+        desde o ponto marcado (ver memreport.py)"""
+        self.clear_frame()
+        theme = self.themes[self.current_theme]
+        
+        title_label = tk.Label(self.main_frame, text="🧠 Relatório de Memória", 
+                              font=("Arial", 18, "bold"), bg=theme["bg"], fg=theme["fg"])
+        title_label.pack(pady=10)
+        
+        report_text = tk.Text(self.main_frame, height=22, width=80, 
+                             font=("Courier", max(self.font_size - 2, 8)), wrap=tk.NONE,
+                             bg=theme["card_bg"], fg=theme["fg"])
+        report_text.pack(pady=5, fill="both", expand=True)
+        
+        def refresh(set_mark=False):
+            if set_mark:
+                # O crescimento por linha de código precisa do tracemalloc
+                self.memory_profiler.start_tracing()
+            report_text.config(state=tk.NORMAL)
+            report_text.delete("1.0", tk.END)
+            report_text.insert(tk.END, "Medindo...")
+            report_text.config(state=tk.DISABLED)
+            self.measure_memory(report_text, set_mark)
+        
+        buttons_frame = tk.Frame(self.main_frame, bg=theme["bg"])
+        buttons_frame.pack(pady=10)
+        
+        btn_refresh = tk.Button(buttons_frame, text="🔄 Atualizar", 
+                               font=("Arial", self.font_size), bg="#2196f3", fg="white",
+                               command=refresh)
+        btn_refresh.pack(side=tk.LEFT, padx=5)
+        
+        btn_mark = tk.Button(buttons_frame, text="📍 Marcar ponto", 
+                            font=("Arial", self.font_size), bg="#ff9800", fg="white",
+                            command=lambda: refresh(set_mark=True))
+        btn_mark.pack(side=tk.LEFT, padx=5)
+        
+        btn_back = tk.Button(buttons_frame, text="⬅️ Voltar", 
+                            font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
+                            command=self.show_settings)
+        btn_back.pack(side=tk.LEFT, padx=5)
+        
+        refresh()
+    
+    def measure_memory(self, report_text, set_mark=False):
+        """Mede a memória em segundo plano e escreve o relatório em report_text.
+        
+        O estado do Tk é lido aqui, na thread do Tk; o percurso da coleção e
+        o instantâneo do tracemalloc rodam na tarefa.
+        """
+        profiler = self.memory_profiler
+        tk_state = tk_report(self.root)
+        flashcards, decks = self.flashcards, self.decks
+        extras = [self.card_index, self.filtered_decks, self.deck_base,
+                  self.sync_journal, self.history]
+        chart_png = self.chart_renderer.cached_png
+        
+        def run(context):
+            return measure(flashcards, decks, extras, tk_state, chart_png), profiler.snapshot()
+        
+        def done(result):
+            report, snapshot = result
+            text = profiler.format(report, snapshot)
+            if set_mark:
+                profiler.set_mark(report, snapshot)
+                text += "\n\n📍 Ponto marcado: os próximos relatórios mostram o crescimento desde aqui."
+            if report_text.winfo_exists():
+                report_text.config(state=tk.NORMAL)
+                report_text.delete("1.0", tk.END)
+                report_text.insert(tk.END, text)
+                report_text.config(state=tk.DISABLED)
+        
+        self.jobs.submit("Medindo memória", run, on_done=done, cancellable=False)
+    
     def create_backup(self):
         """Cria um backup dos dados"""
         file_path = filedialog.asksaveasfilename(
             title="Salvar Backup",
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            defaultextension=".json.gz",
+            filetypes=BACKUP_FILETYPES
         )
         
-        if file_path:
-            try:
-                import shutil
-                shutil.copy2("flashcards_data.json", file_path)
-                messagebox.showinfo("Sucesso", "Backup criado com sucesso!")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Erro ao criar backup: {e}")
+        if not file_path:
+            return
+        
+        # O backup é um arquivo único com a coleção inteira, comprimido
+        # conforme a extensão escolhida. Ele é montado a partir do disco, na
+        # fila das gravações, logo depois de gravadas as alterações pendentes:
+        # nada precisa ser carregado na memória da interface.
+        self.wait_for_save()
+        self.save_data()
+        self.jobs.submit(
+            "Criando backup", write_backup, self.store.directory, file_path, serial=True,
+            on_done=lambda _: messagebox.showinfo("Sucesso", "Backup criado com sucesso!"),
+            on_error=lambda e: messagebox.showerror("Erro", f"Erro ao criar backup: {e}"))
+    
+    def vacuum_collection(self):
+        """Verifica e compacta a pasta de dados em segundo plano.
+        
+        Roda na fila das gravações, depois das alterações pendentes, com um
+        DeckStore próprio; ao terminar, o resultado é incorporado como uma
+        alteração externa.
+        """
+        directory = self.store.directory
+        
+        def run(context):
+            return vacuum(DeckStore(directory), progress=context.progress)
+        
+        def done(report):
+            self.check_external_changes()
+            messagebox.showinfo("Verificação", report.format())
+        
+        def submit():
+            self.jobs.submit(
+                "Verificando coleção", run, serial=True, cancellable=False, on_done=done,
+                on_error=lambda e: messagebox.showerror("Erro", f"Erro ao verificar a coleção: {e}"))
+        
+        self.save_data()
+        self.after_save(submit)
     
     def restore_backup(self):
         """Restaura dados de um backup"""
         file_path = filedialog.askopenfilename(
             title="Selecionar Backup",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=BACKUP_FILETYPES
         )
         
         if file_path:
             confirm = messagebox.askyesno("Confirmar Restauração", 
                                          "Isso substituirá todos os dados atuais. Continuar?")
             if confirm:
-                try:
-                    import shutil
-                    shutil.copy2(file_path, "flashcards_data.json")
-                    self.load_data()
+                def done(data):
+                    try:
+                        self.wait_for_save()
+                        self.load_snapshot(data)
+                        self.save_data(overwrite=True)
+                    except Exception as e:
+                        messagebox.showerror("Erro", f"Erro ao restaurar backup: {e}")
+                        return
                     messagebox.showinfo("Sucesso", "Backup restaurado com sucesso!")
                     self.show_main_menu()
-                except Exception as e:
-                    messagebox.showerror("Erro", f"Erro ao restaurar backup: {e}")
+                
+                self.jobs.submit(
+                    "Lendo backup", lambda context: read_snapshot(file_path),
+                    on_done=done, cancellable=False,
+                    on_error=lambda e: messagebox.showerror("Erro", f"Erro ao restaurar backup: {e}"))
     
     def start_review(self):
         """Inicia a sessão de revisão com opção bidirecional"""
         self.clear_frame()
         theme = self.themes[self.current_theme]
+        self.begin_session(self.current_deck)
         
-        # Obter cartões do baralho atual
-        deck_cards = self.get_deck_cards(self.current_deck)
+        # Cartões do baralho atual (e da tag escolhida), exceto os suspensos
+        deck_cards = bitmap_indices(self.review_bitmap(due=False))
         
         if not deck_cards:
             no_cards = tk.Label(self.main_frame, 
-                               text="Nenhum flashcard neste baralho.", 
+                               text="Nenhum flashcard ativo neste baralho.", 
                                font=("Arial", 14), bg=theme["bg"], fg=theme["fg"])
             no_cards.pack(pady=20)
             
@@ -1164,15 +2857,8 @@ Difíceis (<2.2): {hard_cards}
             btn_back.pack(pady=10)
             return
         
-        # Filtrar flashcards prontos para revisão
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cards_to_review = []
-        
-        for card_idx in deck_cards:
-            if card_idx < len(self.flashcards):
-                card = self.flashcards[card_idx]
-                if not card["next_review"] or card["next_review"] <= current_date:
-                    cards_to_review.append(card_idx)
+        # Flashcards prontos para revisão
+        cards_to_review = [self.flashcards[i] for i in bitmap_indices(self.review_bitmap(due=True))]
         
         if not cards_to_review:
             no_review = tk.Label(self.main_frame, 
@@ -1183,7 +2869,7 @@ Difíceis (<2.2): {hard_cards}
             # Permitir revisão forçada
             force_btn = tk.Button(self.main_frame, text="🔄 Revisar Todos Mesmo Assim", 
                                  font=("Arial", self.font_size), bg="#ff9800", fg="white",
-                                 command=lambda: self.show_card(deck_cards.copy()))
+                                 command=lambda: self.show_card([self.flashcards[i] for i in deck_cards]))
             force_btn.pack(pady=10)
             
             btn_back = tk.Button(self.main_frame, text="⬅️ Voltar", 
@@ -1193,18 +2879,171 @@ Difíceis (<2.2): {hard_cards}
         else:
             self.show_card(cards_to_review.copy())
     
+    def start_all_review(self):
+        """Revisa os pendentes de todos os baralhos em uma única sessão,
+        respeitando o limite diário de cada baralho"""
+        self.load_all_decks()
+        index = self.get_card_index()
+        owners = index.owners()
+        
+        def card_deck(card_id):
+            position = index.position_of_id(card_id)
+            return owners[position] if position is not None else None
+        
+        try:
+            done_today = reviews_today(self.history, card_deck)
+        except (OSError, ValueError):
+            done_today = {}
+        queue = MergedDueQueue(index, list(self.decks), self.daily_limits, done_today)
+        if not len(queue):
+            messagebox.showinfo("Info", "Nenhum cartão pendente (ou os limites diários já foram atingidos).")
+            return
+        self.begin_session("Todos os baralhos")
+        self.show_card(queue)
+    
+    def begin_session(self, name, minutes=None):
+        """Prepara uma sessão de revisão (opcionalmente limitada a alguns minutos)"""
+        self.session_name = name
+        self.session_deadline = time.monotonic() + minutes * 60 if minutes else None
+        self.session_reviewed = 0
+    
+    def show_filtered_decks(self):
+        """Baralhos filtrados: buscas salvas para estudo personalizado"""
+        self.clear_frame()
+        theme = self.themes[self.current_theme]
+        
+        title_label = tk.Label(self.main_frame, text="🎯 Estudo Personalizado", 
+                              font=("Arial", 18, "bold"), bg=theme["bg"], fg=theme["fg"])
+        title_label.pack(pady=10)
+        
+        help_label = tk.Label(self.main_frame, 
+                             text="Cada baralho filtrado reúne, de todos os baralhos, os cartões de uma busca salva.", 
+                             font=("Arial", 10), bg=theme["bg"], fg=theme["fg"])
+        help_label.pack()
+        
+        # Os baralhos filtrados consultam a coleção inteira
+        self.load_all_decks()
+        index = self.get_card_index()
+        
+        list_frame = tk.Frame(self.main_frame)
+        list_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        self.filtered_listbox = tk.Listbox(list_frame, font=("Arial", self.font_size),
+                                          bg=theme["card_bg"], fg=theme["fg"])
+        self.filtered_listbox.pack(fill="both", expand=True)
+        for name, filtered_deck in self.filtered_decks.items():
+            filtered_deck.refresh(index)
+            self.filtered_listbox.insert(tk.END, f"{name} ({len(filtered_deck)} cartões) — {filtered_deck.query}")
+        
+        btn_frame = tk.Frame(self.main_frame, bg=theme["bg"])
+        btn_frame.pack(pady=10)
+        
+        btn_study = tk.Button(btn_frame, text="🔄 Estudar", 
+                             font=("Arial", self.font_size), bg="#2196f3", fg="white",
+                             command=self.start_filtered_review)
+        btn_study.grid(row=0, column=0, padx=5)
+        
+        btn_timed = tk.Button(btn_frame, text="⏱️ Estudar por Tempo", 
+                             font=("Arial", self.font_size), bg="#673ab7", fg="white",
+                             command=lambda: self.start_filtered_review(timed=True))
+        btn_timed.grid(row=0, column=1, padx=5)
+        
+        btn_new = tk.Button(btn_frame, text="➕ Novo", 
+                           font=("Arial", self.font_size), bg="#4caf50", fg="white",
+                           command=self.create_filtered_deck)
+        btn_new.grid(row=0, column=2, padx=5)
+        
+        btn_delete = tk.Button(btn_frame, text="🗑️ Excluir", 
+                              font=("Arial", self.font_size), bg="#f44336", fg="white",
+                              command=self.delete_filtered_deck)
+        btn_delete.grid(row=0, column=3, padx=5)
+        
+        btn_back = tk.Button(self.main_frame, text="⬅️ Voltar", 
+                            font=("Arial", self.font_size), bg="#9e9e9e", fg="white",
+                            command=self.show_main_menu)
+        btn_back.pack(pady=10)
+    
+    def selected_filtered_deck(self):
+        """Baralho filtrado selecionado na lista, ou None"""
+        selection = self.filtered_listbox.curselection()
+        if not selection:
+            messagebox.showwarning("Aviso", "Selecione um baralho filtrado.")
+            return None
+        return list(self.filtered_decks.values())[selection[0]]
+    
+    def create_filtered_deck(self):
+        """Salva uma busca como baralho filtrado"""
+        name = simpledialog.askstring("Novo Baralho Filtrado", "Nome:")
+        if not name or not self.validate_text_input(name):
+            return
+        name = name.strip()
+        if name in self.filtered_decks:
+            messagebox.showwarning("Aviso", "Já existe um baralho filtrado com este nome!")
+            return
+        query = simpledialog.askstring("Novo Baralho Filtrado", 
+                                       "Busca (ex.: due:overdue ease<2.2, reviewed:today streak:0, tag:verbos is:due):")
+        if not query or not query.strip():
+            return
+        try:
+            self.filtered_decks[name] = FilteredDeck(name, query.strip())
+        except QueryError as e:
+            messagebox.showerror("Erro", f"Busca inválida: {e}")
+            return
+        self.save_data()
+        self.show_filtered_decks()
+    
+    def delete_filtered_deck(self):
+        """Exclui um baralho filtrado (os cartões não são afetados)"""
+        filtered_deck = self.selected_filtered_deck()
+        if filtered_deck is None:
+            return
+        if messagebox.askyesno("Confirmar Exclusão", 
+                               f"Excluir o baralho filtrado '{filtered_deck.name}'? Os cartões não são alterados."):
+            del self.filtered_decks[filtered_deck.name]
+            self.save_data()
+            self.show_filtered_decks()
+    
+    def start_filtered_review(self, timed=False):
+        """Revisa os cartões de um baralho filtrado, opcionalmente por alguns minutos"""
+        filtered_deck = self.selected_filtered_deck()
+        if filtered_deck is None:
+            return
+        minutes = None
+        if timed:
+            minutes = simpledialog.askinteger("Estudo por Tempo", "Minutos de estudo:", 
+                                              initialvalue=10, minvalue=1, maxvalue=240)
+            if not minutes:
+                return
+        cards = filtered_deck.cards(self.get_card_index())
+        if not cards:
+            messagebox.showinfo("Info", f"Nenhum cartão em '{filtered_deck.name}' agora.")
+            return
+        self.begin_session(f"🎯 {filtered_deck.name}", minutes)
+        self.show_card(cards)
+    
     def show_card(self, cards_to_review):
         """Exibe um cartão para revisão com suporte bidirecional"""
+        # As avaliações só valem com a resposta à mostra (desfazer pode voltar
+        # da resposta para a pergunta)
+        for key in ('1', '2', '3', '4'):
+            self.root.unbind(key)
         self.clear_frame()
         theme = self.themes[self.current_theme]
         
-        if not cards_to_review:
-            complete_label = tk.Label(self.main_frame, 
-                                     text="🎉 Revisão completa!", 
+        # Sessão por tempo: encerra quando o prazo acaba
+        timed_out = (self.session_deadline is not None and 
+                     time.monotonic() >= self.session_deadline)
+        if not cards_to_review or timed_out:
+            title = "⏱️ Tempo esgotado!" if timed_out else "🎉 Revisão completa!"
+            complete_label = tk.Label(self.main_frame, text=title, 
                                      font=("Arial", 18, "bold"), bg=theme["bg"], fg=theme["fg"])
             complete_label.pack(pady=20)
             
-            summary_text = f"Baralho '{self.current_deck}' revisado com sucesso!"
+            if timed_out:
+                summary_text = (f"{self.session_reviewed} cartão(ões) revisado(s) em "
+                                f"'{self.session_name}'; {len(cards_to_review)} ficaram para depois.")
+            else:
+                summary_text = f"'{self.session_name}' revisado com sucesso!"
             summary_label = tk.Label(self.main_frame, text=summary_text,
                                     font=("Arial", 12), bg=theme["bg"], fg=theme["fg"])
             summary_label.pack(pady=10)
@@ -1215,11 +3054,22 @@ Difíceis (<2.2): {hard_cards}
             btn_back.pack(pady=10)
             return
         
-        # Selecionar um cartão aleatório
-        card_idx = random.choice(cards_to_review)
-        cards_to_review.remove(card_idx)
-        self.current_card = self.flashcards[card_idx]
-        self.current_card_idx = card_idx
+        self.review_queue = cards_to_review
+        if isinstance(cards_to_review, MergedDueQueue):
+            # Todos os baralhos: o mais atrasado primeiro
+            self.current_card, _ = cards_to_review.pop()
+            if self.current_card is None:
+                self.show_card([])
+                return
+        else:
+            # Selecionar um cartão aleatório (a fila guarda os próprios cartões,
+            # já que os índices mudam quando alterações externas são incorporadas).
+            # O sorteio do próximo é feito agora, para suas imagens serem lidas
+            # antes: ele fica no fim da lista e é o próximo a sair.
+            if cards_to_review[-1] is not self.upcoming_card:
+                self.move_random_to_end(cards_to_review)
+            self.current_card = cards_to_review.pop()
+            self.move_random_to_end(cards_to_review)
         
         # Determinar direção (bidirecional ou não)
         if self.bidirectional_mode and random.choice([True, False]):
@@ -1233,15 +3083,33 @@ Difíceis (<2.2): {hard_cards}
             answer = self.current_card["back"]
             direction_indicator = "➡️ Frente → Verso"
         
+        question, answer = HOOKS.filter("render_card", (question, answer), self.current_card,
+                                        valid=valid_rendered)
         self.current_question = question
         self.current_answer = answer
         self.showing_answer = False
+        self.card_shown_at = time.monotonic()
+        
+        # Imagens: a resposta deste cartão e a pergunta do próximo são lidas
+        # em segundo plano enquanto o usuário pensa
+        question_field, answer_field = (IMAGE_FIELDS if self.showing_front 
+                                        else IMAGE_FIELDS[::-1])
+        self.question_image = self.current_card.get(question_field)
+        self.answer_image = self.current_card.get(answer_field)
+        if isinstance(cards_to_review, MergedDueQueue):
+            self.upcoming_card = cards_to_review.peek()
+        else:
+            self.upcoming_card = cards_to_review[-1] if cards_to_review else None
+        prefetch = [self.answer_image] if self.answer_image else []
+        if self.upcoming_card is not None:
+            prefetch += card_images(self.upcoming_card)
+        self.image_cache.prefetch(prefetch)
         
         # Informações da sessão
         info_frame = tk.Frame(self.main_frame, bg=theme["bg"])
         info_frame.pack(fill="x", padx=10, pady=5)
         
-        info_left = tk.Label(info_frame, text=f"📚 {self.current_deck}",
+        info_left = tk.Label(info_frame, text=f"📚 {self.session_name}",
                             font=("Arial", 10), bg=theme["bg"], fg=theme["fg"])
         info_left.pack(side=tk.LEFT)
         
@@ -1249,7 +3117,11 @@ Difíceis (<2.2): {hard_cards}
                               font=("Arial", 10, "bold"), bg=theme["bg"], fg="#2196f3")
         info_center.pack(side=tk.LEFT, expand=True)
         
-        info_right = tk.Label(info_frame, text=f"Restantes: {len(cards_to_review) + 1}",
+        remaining = f"Restantes: {len(cards_to_review) + 1}"
+        if self.session_deadline is not None:
+            minutes, seconds = divmod(max(0, int(self.session_deadline - time.monotonic())), 60)
+            remaining += f" | ⏱️ {minutes}:{seconds:02d}"
+        info_right = tk.Label(info_frame, text=remaining,
                              font=("Arial", 10), bg=theme["bg"], fg=theme["fg"])
         info_right.pack(side=tk.RIGHT)
         
@@ -1272,6 +3144,7 @@ Difíceis (<2.2): {hard_cards}
         content_text.pack(padx=20, pady=10, fill="both", expand=True)
         content_text.insert(tk.END, question)
         content_text.config(state=tk.DISABLED)
+        self.show_card_image(card_frame, self.question_image)
         
         # Frame para botões
         button_frame = tk.Frame(self.main_frame, bg=theme["bg"])
@@ -1288,10 +3161,30 @@ Difíceis (<2.2): {hard_cards}
         self.root.bind('<Return>', lambda e: self.show_answer(cards_to_review))
         self.root.focus_set()
     
+    def move_random_to_end(self, cards):
+        """Troca um cartão sorteado com o último da lista"""
+        if len(cards) > 1:
+            j = random.randrange(len(cards))
+            cards[j], cards[-1] = cards[-1], cards[j]
+        self.upcoming_card = cards[-1] if cards else None
+    
+    def show_card_image(self, parent, name):
+        """Exibe uma imagem do cartão (decodificada agora ou já em cache)"""
+        if not name:
+            return
+        theme = self.themes[self.current_theme]
+        photo = self.image_cache.get(name)
+        if photo is None:
+            tk.Label(parent, text="🖼️ Imagem indisponível", font=("Arial", 10), 
+                    bg=theme["card_bg"], fg="#f44336").pack(pady=5)
+            return
+        tk.Label(parent, image=photo, bg=theme["card_bg"]).pack(pady=5)
+    
     def show_answer(self, cards_to_review):
         """Mostra a resposta e botões de avaliação"""
         self.showing_answer = True
         self.clear_frame()
+        self.review_queue = cards_to_review
         theme = self.themes[self.current_theme]
         
         # Informações da sessão
@@ -1300,7 +3193,7 @@ Difíceis (<2.2): {hard_cards}
         
         direction_indicator = "🔄 Verso → Frente" if not self.showing_front else "➡️ Frente → Verso"
         
-        info_left = tk.Label(info_frame, text=f"📚 {self.current_deck}",
+        info_left = tk.Label(info_frame, text=f"📚 {self.session_name}",
                             font=("Arial", 10), bg=theme["bg"], fg=theme["fg"])
         info_left.pack(side=tk.LEFT)
         
@@ -1308,7 +3201,11 @@ Difíceis (<2.2): {hard_cards}
                               font=("Arial", 10, "bold"), bg=theme["bg"], fg="#2196f3")
         info_center.pack(side=tk.LEFT, expand=True)
         
-        info_right = tk.Label(info_frame, text=f"Restantes: {len(cards_to_review) + 1}",
+        remaining = f"Restantes: {len(cards_to_review) + 1}"
+        if self.session_deadline is not None:
+            minutes, seconds = divmod(max(0, int(self.session_deadline - time.monotonic())), 60)
+            remaining += f" | ⏱️ {minutes}:{seconds:02d}"
+        info_right = tk.Label(info_frame, text=remaining,
                              font=("Arial", 10), bg=theme["bg"], fg=theme["fg"])
         info_right.pack(side=tk.RIGHT)
         
@@ -1347,6 +3244,7 @@ Difíceis (<2.2): {hard_cards}
         answer_text.pack(padx=15, pady=5, fill="x")
         answer_text.insert(tk.END, self.current_answer)
         answer_text.config(state=tk.DISABLED)
+        self.show_card_image(card_frame, self.answer_image)
         
         # Frame para avaliação
         rating_frame = tk.Frame(self.main_frame, bg=theme["bg"])
@@ -1413,50 +3311,59 @@ Difíceis (<2.2): {hard_cards}
         self.root.unbind('4')
         
         card = self.current_card
-        
-        # Atualizar dados de revisão
-        card["last_review"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        card["total_reviews"] = card.get("total_reviews", 0) + 1
-        
-        # Algoritmo SM-2 aprimorado
-        if quality >= 3:  # Resposta correta
-            if card["repetitions"] == 0:
-                card["interval"] = 1
-            elif card["repetitions"] == 1:
-                card["interval"] = 6
-            else:
-                card["interval"] = round(card["interval"] * card["ease_factor"])
-            
-            card["repetitions"] += 1
-            card["correct_streak"] = card.get("correct_streak", 0) + 1
-        else:  # Resposta incorreta
-            card["repetitions"] = 0
-            card["interval"] = 1
-            card["correct_streak"] = 0
-        
-        # Atualizar fator de facilidade
-        card["ease_factor"] = max(1.3, card["ease_factor"] + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
-        
-        # Ajustar intervalo baseado na qualidade
-        if quality == 0:  # Esqueci
-            card["interval"] = 1
-        elif quality == 1:  # Difícil
-            card["interval"] = max(1, round(card["interval"] * 1.2))
-        elif quality == 3:  # Fácil
-            card["interval"] = round(card["interval"] * 1.3)
-        
-        # Calcular próxima revisão
-        next_review_date = datetime.datetime.now() + datetime.timedelta(days=card["interval"])
-        card["next_review"] = next_review_date.strftime("%Y-%m-%d %H:%M:%S")
+        prev_interval = card["interval"]
+        is_new = card["last_review"] is None
+        # Numa sessão filtrada os cartões vêm de vários baralhos
+        deck_name = self.card_deck_name(card)
+        position = self.card_index.position(card)
+        
+        # Algoritmo SM-2 com os parâmetros do baralho (ajustados ou padrão)
+        answer = ReviewAnswer(card, position, deck_name)
+        # Balanceamento: o dia menos carregado perto do intervalo ideal,
+        # pelas contagens por dia do índice e do manifesto
+        day_load = self.day_load if self.load_balance else None
+        # Ganchos de plugins: sem plugins, só o teste da tupla (ver plugins.py)
+        if HOOKS.handlers["before_schedule"]:
+            quality = HOOKS.filter("before_schedule", quality, card, deck_name,
+                                   valid=valid_quality)
+        schedule_review(card, quality, self.scheduler_params.get(deck_name), day_load=day_load)
+        if HOOKS.handlers["after_schedule"]:
+            HOOKS.call("after_schedule", card, quality, deck_name)
+        touch_card(card)
+        if position is not None:
+            self.reindex_cards([position])
+        self.session_reviewed += 1
+        
+        # Registrar no histórico de revisões
+        answer_ms = (time.monotonic() - self.card_shown_at) * 1000
+        values = dict(card_id=card["id"], quality=quality, prev_interval=prev_interval,
+                      new_interval=card["interval"], ease=card["ease_factor"],
+                      answer_ms=answer_ms, timestamp=int(time.time()))
+        try:
+            # O resumo diário antes: se ele ainda não existe, é montado a
+            # partir do histórico sem esta resposta
+            rollup = (quality, answer_ms, is_new, values["timestamp"])
+            self.activity.record(*rollup)
+            answer.counted(*rollup)
+            answer.recorded(self.history.append(**values), **values)
+        except OSError as e:
+            messagebox.showerror("Erro", f"Erro ao gravar histórico de revisões: {e}")
+        self.undo_log.record("responder cartão", answer)
         
         # Salvar e continuar
-        self.save_data()
+        self.save_data(deck_name)
         self.show_card(cards_to_review)
     
     def on_closing(self):
         """Confirmação ao fechar o aplicativo"""
         if messagebox.askokcancel("Sair", "Deseja realmente sair do aplicativo?"):
             self.save_data()  # Garantir que os dados sejam salvos
+            self.wait_for_save()
+            self.jobs.shutdown()
+            self.history.close()
+            self.chart_renderer.shutdown()
+            self.activity_renderer.shutdown()
+            self.image_cache.shutdown()
             self.root.destroy()
 
 def main():
@@ -0,0 +1,278 @@
+"""Resumo diário das revisões (rollups).
+
+Cada dia com revisões ocupa um registro de tamanho fixo em
+review_history/daily.bin: o dia, o total de revisões, quantas foram
+Esqueci/Difícil/Bom/Fácil, quantos cartões foram revisados pela primeira
+vez e o tempo gasto. process_answer atualiza o registro do dia (sobrescreve
+o último registro ou anexa um novo), então um ano de estudo ocupa ~13 KB e
+as telas de atividade (calendário, sequência de dias, retenção) são
+montadas em O(dias), qualquer que seja o tamanho da coleção ou do histórico.
+
+Se o arquivo ainda não existe e há histórico de revisões (history.py), o
+resumo é montado a partir dele uma única vez. O histórico continua sendo a
+fonte dos detalhes por cartão; o resumo só evita percorrê-lo nas telas.
+
+Vários processos podem registrar revisões: as escritas são feitas sob o
+mesmo lock do histórico e o arquivo é relido quando outro processo o altera.
+"""
+import datetime
+import os
+import struct
+import time
+from bisect import bisect_left
+
+from storage import file_lock
+
+DAILY_NAME = "daily.bin"
+# dia (ordinal), revisões, esqueci, difícil, bom, fácil, novos, tempo (ms)
+RECORD = struct.Struct("<iIIIIIIQ")
+FIELDS = ("day", "reviews", "again", "hard", "good", "easy", "new", "time_ms")
+# Colunas de cada resposta, por qualidade (0=Esqueci ... 3=Fácil)
+QUALITY_FIELDS = ("again", "hard", "good", "easy")
+
+
+def format_duration(ms):
+    """Tempo de estudo legível (ex.: 1 h 05 min, 12 min, 40 s)"""
+    seconds = int(ms // 1000)
+    if seconds < 60:
+        return f"{seconds} s"
+    minutes = seconds // 60
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h {minutes % 60:02d} min"
+
+
+class DailyActivity:
+    """Registros diários de revisões, guardados na pasta do histórico"""
+
+    def __init__(self, history):
+        self.history = history
+        self.directory = history.directory
+        self.path = os.path.join(self.directory, DAILY_NAME)
+        self._rows = None       # listas [dia, revisões, ...] em ordem de dia
+        self._days = []         # dias de _rows, para busca binária
+        self._stat = None
+
+    @property
+    def version(self):
+        """Muda a cada gravação (deste ou de outro processo, após load)"""
+        return self._stat
+
+    def _lock(self):
+        return file_lock(os.path.join(self.directory, ".lock"))
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _stale(self):
+        return self._rows is None or self._file_stat() != self._stat
+
+    def _needs_rebuild(self):
+        return not os.path.exists(self.path) and len(self.history) > 0
+
+    def _read(self):
+        rows = []
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                data = file.read()
+            usable = len(data) - len(data) % RECORD.size   # registro incompleto: ignorado
+            rows = [list(values) for values in RECORD.iter_unpack(data[:usable])]
+        self._set_rows(rows)
+        self._stat = self._file_stat()
+
+    def _set_rows(self, rows):
+        self._rows = rows
+        self._days = [row[0] for row in rows]
+
+    def _load_locked(self):
+        if self._stale():
+            if self._needs_rebuild():
+                self._rebuild_locked()
+            else:
+                self._read()
+
+    def load(self):
+        """Registros em memória, relidos se outro processo gravou; sem o
+        arquivo, o resumo é montado a partir do histórico"""
+        if self._stale():
+            if self._needs_rebuild():
+                os.makedirs(self.directory, exist_ok=True)
+                with self._lock():
+                    self._load_locked()
+            else:
+                self._read()
+        return self._rows
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def record(self, quality, answer_ms=0, new=False, timestamp=None, undo=False):
+        """Soma uma resposta ao dia em que foi dada (ou a subtrai, com
+        undo=True, quando a resposta é desfeita).
+
+        Deve ser chamado antes de anexar a resposta ao histórico: se o
+        resumo ainda não existe, ele é montado do histórico sem ela.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        day = datetime.date.fromtimestamp(timestamp).toordinal()
+        sign = -1 if undo else 1
+        deltas = {"reviews": 1, QUALITY_FIELDS[quality]: 1, "new": int(bool(new)),
+                  "time_ms": max(0, int(answer_ms))}
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock():
+            self._load_locked()
+            i = bisect_left(self._days, day)
+            if i == len(self._days) or self._days[i] != day:
+                if undo:
+                    return
+                self._rows.insert(i, [day] + [0] * (len(FIELDS) - 1))
+                self._days.insert(i, day)
+            row = self._rows[i]
+            for field, delta in deltas.items():
+                column = FIELDS.index(field)
+                row[column] = max(0, row[column] + sign * delta)
+            self._write_row(i)
+
+    def _write_row(self, i):
+        """Grava o registro i no lugar (ou anexado, se é um dia novo no fim);
+        um dia inserido antes do último regrava o arquivo, que é pequeno"""
+        count = self._stat[1] // RECORD.size if self._stat else 0
+        if len(self._rows) == count or (i == count and len(self._rows) == count + 1):
+            with open(self.path, "r+b" if count else "wb") as file:
+                file.seek(i * RECORD.size)
+                file.write(RECORD.pack(*self._rows[i]))
+            self._stat = self._file_stat()
+        else:
+            self._write_all()
+
+    def _write_all(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(b"".join(RECORD.pack(*row) for row in self._rows))
+        os.replace(tmp_path, self.path)
+        self._stat = self._file_stat()
+
+    def _rebuild_locked(self):
+        """Monta o resumo a partir do histórico de revisões.
+
+        As datas do histórico estão em ordem crescente: cada dia é uma fatia
+        encontrada por busca binária, e as respostas da fatia são contadas
+        em C (array.count), sem percorrer revisão por revisão em Python.
+        Um cartão é contado como novo no dia da sua primeira revisão.
+        """
+        columns = self.history.load()
+        timestamps = columns["timestamp"]
+        rows = []
+        seen = set()
+        lo = 0
+        while lo < len(timestamps):
+            day = datetime.date.fromtimestamp(timestamps[lo])
+            midnight = datetime.datetime.combine(day + datetime.timedelta(days=1),
+                                                 datetime.time()).timestamp()
+            hi = bisect_left(timestamps, midnight, lo)
+            qualities = columns["quality"][lo:hi]
+            card_ids = set(columns["card_id"][lo:hi])
+            new = len(card_ids - seen)
+            seen |= card_ids
+            rows.append([day.toordinal(), hi - lo] +
+                        [qualities.count(q) for q in range(len(QUALITY_FIELDS))] +
+                        [new, sum(columns["answer_ms"][lo:hi])])
+            lo = hi
+        self._set_rows(rows)
+        self._write_all()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def days(self, first, last):
+        """{data: registro (dicionário)} dos dias com revisões em [first, last]"""
+        self.load()
+        lo = bisect_left(self._days, first.toordinal())
+        hi = bisect_left(self._days, last.toordinal() + 1)
+        return {datetime.date.fromordinal(row[0]): dict(zip(FIELDS, row))
+                for row in self._rows[lo:hi]}
+
+    def series(self, first, last, field="reviews"):
+        """Valores de um campo para cada dia de first a last (0 sem revisões)"""
+        days = self.days(first, last)
+        total = (last - first).days + 1
+        return [days[day][field] if day in days else 0
+                for day in (first + datetime.timedelta(days=n) for n in range(total))]
+
+    def summary(self, today=None):
+        """Sequência de dias (atual e maior), dias estudados e totais dos
+        últimos 7, 30 e 365 dias, com a retenção (respostas diferentes de
+        Esqueci) de cada período"""
+        today = today or datetime.date.today()
+        rows = [row for row in self.load() if row[1] > 0]
+        studied = {row[0] for row in rows}
+
+        # A sequência atual continua viva se hoje ainda não houve revisões
+        end = today.toordinal()
+        if end not in studied:
+            end -= 1
+        current = 0
+        while end - current in studied:
+            current += 1
+        longest = run = 0
+        previous = None
+        for row in rows:
+            run = run + 1 if previous == row[0] - 1 else 1
+            longest = max(longest, run)
+            previous = row[0]
+
+        result = {"current_streak": current, "longest_streak": longest,
+                  "study_days": len(studied)}
+        for span in (7, 30, 365):
+            first = today.toordinal() - span + 1
+            period = [row for row in rows if first <= row[0] <= today.toordinal()]
+            reviews = sum(row[1] for row in period)
+            again = sum(row[2] for row in period)
+            result[span] = {
+                "reviews": reviews,
+                "days": len(period),
+                "new": sum(row[6] for row in period),
+                "time_ms": sum(row[7] for row in period),
+                "retention": (reviews - again) / reviews if reviews else None,
+            }
+        return result
+
+    def trends(self, first, last, window=7):
+        """Séries diárias de first a last para os gráficos: datas, revisões
+        por resposta ({campo: [valores]}), retenção móvel nos últimos window
+        dias (None sem revisões) e a sequência de dias em curso"""
+        days = self.days(first - datetime.timedelta(days=window - 1), last)
+        total = (last - first).days + 1
+        dates = [first + datetime.timedelta(days=n) for n in range(total)]
+        answers = {field: [days[day][field] if day in days else 0 for day in dates]
+                   for field in QUALITY_FIELDS}
+
+        retention = []
+        reviews = again = 0
+        for n in range(-window + 1, total):
+            day = first + datetime.timedelta(days=n)
+            if day in days:
+                reviews += days[day]["reviews"]
+                again += days[day]["again"]
+            gone = day - datetime.timedelta(days=window)
+            if gone in days:
+                reviews -= days[gone]["reviews"]
+                again -= days[gone]["again"]
+            if n >= 0:
+                retention.append((reviews - again) / reviews if reviews else None)
+
+        # Sequência na véspera de first, contada para trás; depois, dia a dia
+        studied = {row[0] for row in self._rows if row[1] > 0}
+        streak = 0
+        while first.toordinal() - 1 - streak in studied:
+            streak += 1
+        streaks = []
+        for day in dates:
+            streak = streak + 1 if day.toordinal() in studied else 0
+            streaks.append(streak)
+        return dates, answers, retention, streaks
@@ -0,0 +1,534 @@
+"""Importação e exportação de pacotes do Anki (.apkg).
+
+Um .apkg é um zip com a coleção do Anki (um banco SQLite, esquema 11) e os
+arquivos de mídia. Nada do pacote é descompactado na memória: a coleção é
+copiada do zip para um arquivo temporário em blocos (o sqlite3 precisa de
+um arquivo em disco), os arquivos de mídia nem são lidos, e as linhas são
+percorridas com um cursor em lotes de BATCH_SIZE cartões. Na exportação os
+cartões são gravados em lotes com executemany e o banco temporário é
+copiado para o zip também em blocos.
+
+Correspondência dos campos (cartão do Anki -> cartão do PyCard):
+    factor (por mil) -> ease_factor; ivl (dias) -> interval;
+    reps -> total_reviews; reps - lapses -> repetitions;
+    due (dias desde a criação da coleção, ou data/hora em segundos para
+    cartões em aprendizado) -> next_review; fila -1 -> suspended;
+    tags da nota -> tags.
+Frente e verso vêm dos campos usados no modelo de cada cartão (para notas
+cloze, o texto com a lacuna do cartão escondida); o HTML dos campos vira
+texto simples.
+
+Também pode ser executado como script:
+    python apkg.py importar "Vocabulário.apkg" --deck Inglês
+    python apkg.py exportar colecao.apkg
+"""
+import argparse
+import datetime
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from cards import DATE_FORMAT, assign_card_ids, parse_tags, validate_text_input
+from storage import DeckStore
+
+BATCH_SIZE = 1000
+COPY_BUFFER = 1 << 20
+# Da mais nova para a mais antiga; "collection.anki21b" (compactada com
+# zstd, Anki 2.1.50+) não pode ser lida só com a biblioteca padrão
+COLLECTION_NAMES = ("collection.anki21", "collection.anki2")
+FIELD_SEPARATOR = "\x1f"
+
+
+class ApkgError(Exception):
+    """Pacote inválido ou em formato não suportado"""
+
+
+# ----------------------------------------------------------------------
+# Conversão de texto
+# ----------------------------------------------------------------------
+_BREAK_RE = re.compile(r"<br\s*/?>|</div>|</p>|</li>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]*>")
+_SOUND_RE = re.compile(r"\[sound:[^\]]*\]")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+_FIELD_REF_RE = re.compile(r"{{([^{}]+)}}")
+_CLOZE_RE = re.compile(r"{{c(\d+)::(.*?)(?:::(.*?))?}}", re.DOTALL)
+
+
+def html_to_text(value):
+    """Texto simples de um campo do Anki (HTML)"""
+    if "<" not in value and "&" not in value and "[" not in value:
+        return value.strip()   # caso comum: texto sem marcação
+    value = _BREAK_RE.sub("\n", value)
+    value = _SOUND_RE.sub("", _TAG_RE.sub("", value))
+    value = html.unescape(value).replace("\xa0", " ")
+    return _BLANK_LINES_RE.sub("\n", value).strip()
+
+
+def text_to_html(value):
+    return html.escape(value).replace("\n", "<br>")
+
+
+def _template_fields(template, names):
+    """Campos referenciados em um modelo de cartão, na ordem em que aparecem.
+
+    Ignora seções condicionais ({{#Campo}}, {{/Campo}}, {{^Campo}}) e
+    FrontSide; modificadores como "text:" ou "cloze:" são descartados.
+    """
+    found = []
+    for ref in _FIELD_REF_RE.findall(template):
+        ref = ref.strip()
+        if ref[:1] in "#/^!":
+            continue
+        name = ref.rsplit(":", 1)[-1].strip()
+        if name in names and name not in found:
+            found.append(name)
+    return [names[name] for name in found]
+
+
+def _cloze_side(value, number, reveal):
+    """Texto de uma nota cloze com a lacuna number escondida (ou revelada)"""
+    def replace(match):
+        if reveal or int(match.group(1)) != number:
+            return match.group(2)
+        return f"[{match.group(3) or '...'}]"
+    return _CLOZE_RE.sub(replace, value)
+
+
+class _NoteModel:
+    """Como montar frente e verso das notas de um tipo (modelo) do Anki"""
+
+    def __init__(self, model=None):
+        self.cloze = bool(model and model.get("type") == 1)
+        self.templates = {}   # ord -> (campos da frente, campos do verso)
+        if not model:
+            return
+        names = {field["name"]: field["ord"] for field in model.get("flds", [])}
+        for template in model.get("tmpls", []):
+            front = _template_fields(template.get("qfmt", ""), names)
+            back = [i for i in _template_fields(template.get("afmt", ""), names)
+                    if i not in front]
+            self.templates[template.get("ord", 0)] = (front, back)
+
+    def render(self, fields, card_ord):
+        """(frente, verso) em texto simples"""
+        if self.cloze:
+            front_fields, back_fields = self.templates.get(0, ([0], [1]))
+            source = FIELD_SEPARATOR.join(fields[i] for i in front_fields if i < len(fields))
+            front = _cloze_side(source, card_ord + 1, reveal=False)
+            back = _cloze_side(source, card_ord + 1, reveal=True)
+            extra = [fields[i] for i in back_fields if i < len(fields)]
+            front = html_to_text(front.replace(FIELD_SEPARATOR, "\n"))
+            back = html_to_text("\n".join([back.replace(FIELD_SEPARATOR, "\n")] + extra))
+            return front, back
+        front_fields, back_fields = self.templates.get(card_ord, ([], []))
+        if not front_fields:
+            # Modelo desconhecido: 1º campo na frente, 2º no verso (invertidos
+            # nos cartões de ordem ímpar, como no modelo "com cartão invertido")
+            front_fields, back_fields = ([1], [0]) if card_ord % 2 else ([0], [1])
+        front = "\n".join(html_to_text(fields[i]) for i in front_fields if i < len(fields))
+        back = "\n".join(html_to_text(fields[i]) for i in back_fields if i < len(fields))
+        return front.strip(), back.strip()
+
+
+# ----------------------------------------------------------------------
+# Importação
+# ----------------------------------------------------------------------
+_CARDS_SQL = """
+    SELECT c.id, c.nid, c.did, c.ord, c.type, c.queue, c.due, c.ivl, c.factor,
+           c.reps, c.lapses, c.odue, c.odid, n.mid, n.tags, n.flds,
+           (SELECT MAX(r.id) FROM revlog r WHERE r.cid = c.id)
+    FROM cards c JOIN notes n ON n.id = c.nid
+    ORDER BY c.id
+"""
+
+
+def _timestamp_str(seconds):
+    return datetime.datetime.fromtimestamp(seconds).strftime(DATE_FORMAT)
+
+
+class ApkgReader:
+    """Lê os cartões de um .apkg em lotes.
+
+    Use como gerenciador de contexto; batches() produz listas de
+    (nome do baralho no Anki, cartão do PyCard) e skipped conta os cartões
+    sem frente ou verso aproveitável (por exemplo, só com imagem).
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.skipped = 0
+        self._tmp_path = None
+        self._db = None
+        try:
+            with zipfile.ZipFile(path) as package:
+                names = set(package.namelist())
+                # Pacotes no formato novo trazem também um collection.anki2
+                # com um único cartão pedindo para atualizar o Anki
+                if "collection.anki21b" in names:
+                    raise ApkgError("Pacote no formato novo do Anki. Exporte-o marcando "
+                                    "\"Suporte a versões antigas do Anki\".")
+                member = next((name for name in COLLECTION_NAMES if name in names), None)
+                if member is None:
+                    raise ApkgError("O arquivo não contém uma coleção do Anki.")
+                fd, self._tmp_path = tempfile.mkstemp(suffix=".anki2")
+                with os.fdopen(fd, "wb") as target, package.open(member) as source:
+                    shutil.copyfileobj(source, target, COPY_BUFFER)
+        except zipfile.BadZipFile as e:
+            self.close()
+            raise ApkgError(f"Arquivo .apkg inválido: {e}") from e
+        except BaseException:
+            self.close()
+            raise
+        try:
+            self._db = sqlite3.connect(self._tmp_path)
+            self._read_collection()
+        except sqlite3.DatabaseError as e:
+            self.close()
+            raise ApkgError(f"Coleção do Anki inválida: {e}") from e
+
+    def _read_collection(self):
+        crt, models, decks = self._db.execute("SELECT crt, models, decks FROM col").fetchone()
+        self.created = datetime.datetime.fromtimestamp(crt)
+        models = json.loads(models) if models else {}
+        self.models = {int(mid): _NoteModel(model) for mid, model in models.items()}
+        decks = json.loads(decks) if decks else {}
+        self.deck_names = {int(did): deck["name"] for did, deck in decks.items()}
+        if not self.deck_names:
+            # Esquema 18: baralhos em tabela própria, níveis separados por \x1f
+            for did, name in self._db.execute("SELECT id, name FROM decks"):
+                self.deck_names[did] = name.replace(FIELD_SEPARATOR, "::")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._tmp_path is not None:
+            os.remove(self._tmp_path)
+            self._tmp_path = None
+
+    def count(self):
+        """Total de cartões no pacote"""
+        return self._db.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    def _due_datetime(self, due):
+        # Cartões em aprendizado vencem em uma data/hora (segundos); os
+        # demais, em um dia contado a partir da criação da coleção
+        if due > 1_000_000_000:
+            return datetime.datetime.fromtimestamp(due)
+        return self.created + datetime.timedelta(days=due)
+
+    def _convert(self, row, default_model, imported_at):
+        """(id do baralho, cartão) de uma linha de _CARDS_SQL, ou None se a
+        frente ou o verso ficam vazios"""
+        (_cid, nid, did, card_ord, card_type, queue, due, ivl, factor,
+         reps, lapses, odue, odid, mid, tags, flds, last_review_ms) = row
+        if odid:   # em um baralho filtrado: vale o baralho e o vencimento originais
+            did, due = odid, odue or due
+        front, back = self.models.get(mid, default_model).render(flds.split(FIELD_SEPARATOR), card_ord)
+        if not (validate_text_input(front) and validate_text_input(back)):
+            return None
+
+        created_at = _timestamp_str(nid / 1000)
+        interval = max(ivl, 0)   # negativo: segundos de um passo de aprendizado
+        card = {
+            "front": front,
+            "back": back,
+            "created_at": created_at,
+            "last_review": None,
+            "next_review": created_at,
+            "ease_factor": factor / 1000 if factor else 2.5,
+            "interval": interval,
+            "repetitions": 0,
+            "correct_streak": 0,
+            "total_reviews": reps,
+            "mod": time.time(),
+        }
+        if card_type != 0:   # já estudado
+            next_review = self._due_datetime(due)
+            card["next_review"] = next_review.strftime(DATE_FORMAT)
+            if last_review_ms:
+                card["last_review"] = _timestamp_str(last_review_ms / 1000)
+            else:   # sem histórico no pacote: estimado pelo intervalo
+                card["last_review"] = min(next_review - datetime.timedelta(days=interval),
+                                          imported_at).strftime(DATE_FORMAT)
+            if card_type == 2:   # em revisão (não em aprendizado)
+                card["repetitions"] = card["correct_streak"] = max(reps - lapses, 1)
+        tags = parse_tags(tags)
+        if tags:
+            card["tags"] = tags
+        if queue == -1:
+            card["suspended"] = True
+        return did, card
+
+    def batches(self):
+        """Gera listas de (nome do baralho, cartão), BATCH_SIZE por vez"""
+        default_model = _NoteModel()
+        imported_at = datetime.datetime.now()
+        cursor = self._db.execute(_CARDS_SQL)
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                return
+            batch = []
+            for row in rows:
+                converted = self._convert(row, default_model, imported_at)
+                if converted is None:
+                    self.skipped += 1
+                    continue
+                did, card = converted
+                batch.append((self.deck_names.get(did, "Default"), card))
+            yield batch
+
+
+# ----------------------------------------------------------------------
+# Exportação
+# ----------------------------------------------------------------------
+_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null,
+    tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (
+    usn integer not null, oid integer not null, type integer not null
+);
+"""
+
+# Criados depois da inserção, que assim não precisa manter os índices
+_INDEXES = """
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+MODEL_ID = 1342697561419   # fixo: reimportar no Anki não duplica o modelo
+DECK_CONF = {
+    "id": 1, "name": "Default", "replayq": True, "timer": 0, "maxTaken": 60,
+    "usn": 0, "autoplay": True, "mod": 0, "dyn": False,
+    "new": {"bury": True, "delays": [1, 10], "initialFactor": 2500,
+            "ints": [1, 4, 7], "order": 1, "perDay": 20, "separate": True},
+    "rev": {"bury": True, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500,
+            "minSpace": 1, "perDay": 200},
+    "lapse": {"delays": [10], "leechAction": 0, "leechFails": 8, "minInt": 1, "mult": 0},
+}
+
+
+def _model(deck_id, now):
+    fields = [{"name": name, "ord": i, "sticky": False, "rtl": False,
+               "font": "Arial", "size": 20, "media": []}
+              for i, name in enumerate(("Frente", "Verso"))]
+    return {
+        "id": MODEL_ID, "name": "PyCard", "type": 0, "mod": now, "usn": -1,
+        "sortf": 0, "did": deck_id, "flds": fields, "tags": [], "vers": [],
+        "tmpls": [{"name": "Cartão 1", "ord": 0, "qfmt": "{{Frente}}",
+                   "afmt": "{{FrontSide}}<hr id=answer>{{Verso}}",
+                   "did": None, "bqfmt": "", "bafmt": ""}],
+        "css": ".card { font-family: arial; font-size: 20px; text-align: center; }",
+        "latexPre": "", "latexPost": "", "req": [[0, "all", [0]]],
+    }
+
+
+def _deck(deck_id, name, now):
+    return {
+        "id": deck_id, "name": name, "mod": now, "usn": -1, "desc": "",
+        "dyn": 0, "conf": 1, "collapsed": False, "extendNew": 10, "extendRev": 50,
+        "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0],
+    }
+
+
+def _checksum(text):
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class _ApkgWriter:
+    """Grava os cartões de um baralho por vez em uma coleção temporária"""
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(_SCHEMA)
+        self.now = int(time.time())
+        self.day_start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        self.decks = {}
+        self.last_id = 0
+        self.count = 0
+
+    def _unique_id(self, value):
+        # Crescentes: cartões criados no mesmo milissegundo (uma importação)
+        # recebem os ids seguintes
+        self.last_id = max(value, self.last_id + 1)
+        return self.last_id
+
+    def _rows(self, card, deck_id, position):
+        created = datetime.datetime.strptime(card["created_at"], DATE_FORMAT)
+        note_id = self._unique_id(int(created.timestamp() * 1000))
+        front, back = text_to_html(card["front"]), text_to_html(card["back"])
+        guid = hashlib.sha1(f"{card['created_at']}|{card.get('id')}|{card['front']}"
+                            .encode("utf-8")).hexdigest()[:10]
+        tags = card.get("tags")
+        tags = f" {' '.join(tags)} " if tags else ""
+        note = (note_id, guid, MODEL_ID, self.now, -1, tags, front + FIELD_SEPARATOR + back,
+                card["front"], _checksum(card["front"]), 0, "")
+
+        reviewed = bool(card.get("last_review")) and card.get("total_reviews", 0) > 0
+        if reviewed:
+            next_review = datetime.datetime.strptime(card["next_review"], DATE_FORMAT)
+            card_type, due = 2, (next_review.date() - self.day_start.date()).days
+        else:
+            card_type, due = 0, position
+        queue = -1 if card.get("suspended") else card_type
+        lapses = max(card.get("total_reviews", 0) - card["repetitions"], 0)
+        card_row = (note_id, note_id, deck_id, 0, self.now, -1, card_type, queue, due,
+                    max(int(card["interval"]), 1) if reviewed else 0,
+                    round(card["ease_factor"] * 1000) if reviewed else 0,
+                    card.get("total_reviews", 0), lapses if reviewed else 0,
+                    0, 0, 0, 0, "")
+        return note, card_row
+
+    def add_deck(self, deck_name, cards, batch_size=BATCH_SIZE):
+        deck_id = self._unique_id(int(time.time() * 1000))
+        self.decks[deck_id] = deck_name
+        notes, card_rows = [], []
+        for card in cards:
+            note, card_row = self._rows(card, deck_id, self.count)
+            notes.append(note)
+            card_rows.append(card_row)
+            self.count += 1
+            if len(notes) >= batch_size:
+                self._flush(notes, card_rows)
+        self._flush(notes, card_rows)
+
+    def _flush(self, notes, card_rows):
+        self.db.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", notes)
+        self.db.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                            card_rows)
+        notes.clear()
+        card_rows.clear()
+
+    def finish(self):
+        default_deck = next(iter(self.decks), 1)
+        decks = {"1": _deck(1, "Default", self.now)}
+        decks.update({str(did): _deck(did, name, self.now) for did, name in self.decks.items()})
+        conf = {"curDeck": default_deck, "curModel": str(MODEL_ID), "nextPos": self.count + 1,
+                "activeDecks": [1], "sortType": "noteFld", "sortBackwards": False,
+                "schedVer": 2, "newSpread": 0, "dueCounts": True, "estTimes": True,
+                "collapseTime": 1200, "timeLim": 0, "addToCur": True}
+        self.db.execute("INSERT INTO col VALUES (1,?,?,?,11,0,0,0,?,?,?,?,?)", (
+            int(self.day_start.timestamp()), self.now * 1000, self.now * 1000,
+            json.dumps(conf), json.dumps({str(MODEL_ID): _model(default_deck, self.now)}),
+            json.dumps(decks), json.dumps({"1": DECK_CONF}), "{}"))
+        self.db.executescript(_INDEXES)
+        self.db.commit()
+        self.db.close()
+
+
+def write_apkg(path, decks, batch_size=BATCH_SIZE):
+    """Grava um .apkg com os baralhos informados.
+
+    decks: iterável de (nome do baralho, iterável de cartões); cada baralho
+    pode ser lido sob demanda, pois só um lote de linhas fica na memória.
+    Retorna o número de cartões exportados.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "collection.anki2")
+        writer = _ApkgWriter(db_path)
+        try:
+            for deck_name, cards in decks:
+                writer.add_deck(deck_name, cards, batch_size)
+            writer.finish()
+        except BaseException:
+            writer.db.close()
+            raise
+        # Grava ao lado do destino e substitui, para não deixar um pacote pela metade
+        fd, tmp_zip = tempfile.mkstemp(suffix=".apkg", dir=directory)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_zip, "w", zipfile.ZIP_DEFLATED) as package:
+                package.write(db_path, "collection.anki2")
+                package.writestr("media", "{}")
+            os.replace(tmp_zip, path)
+        except BaseException:
+            os.remove(tmp_zip)
+            raise
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa ou exporta pacotes do Anki (.apkg)")
+    parser.add_argument("--data", default="flashcards_data", help="pasta de dados")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_cmd = commands.add_parser("importar", help="importa um .apkg para a coleção")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--deck", help="baralho de destino (padrão: os baralhos do Anki)")
+    export_cmd = commands.add_parser("exportar", help="exporta a coleção para um .apkg")
+    export_cmd.add_argument("path")
+    export_cmd.add_argument("--deck", action="append", help="baralho a exportar (repetível)")
+    args = parser.parse_args()
+
+    store = DeckStore(args.data)
+    if args.command == "importar":
+        by_deck = {}
+        with ApkgReader(args.path) as reader:
+            for batch in reader.batches():
+                for deck_name, card in batch:
+                    by_deck.setdefault(args.deck or deck_name, []).append(card)
+            skipped = reader.skipped
+        for deck_name, imported in by_deck.items():
+            def add_cards(cards, next_id, imported=imported):
+                next_id = assign_card_ids(cards, next_id)
+                next_id = assign_card_ids(imported, next_id)
+                return cards + imported, next_id
+            store.modify_deck(deck_name, add_cards)
+            print(f"{len(imported)} cartões adicionados ao baralho '{deck_name}'.")
+        if skipped:
+            print(f"{skipped} cartões sem frente ou verso em texto foram ignorados.")
+    else:
+        with store.lock():
+            deck_names = list(store.read_manifest()["decks"])
+        if args.deck:
+            deck_names = [name for name in deck_names if name in args.deck]
+        # Um baralho por vez na memória
+        count = write_apkg(args.path, ((name, store.load_deck(name)) for name in deck_names))
+        print(f"{count} cartões exportados para {args.path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Operações em lote sobre cartões: mover, excluir, reiniciar o agendamento,
+editar tags e suspender.
+
+As funções trabalham sobre a mesma estrutura usada pelo aplicativo — uma
+lista de cartões e um dicionário baralho -> índices nessa lista — e fazem
+uma única passada linear, qualquer que seja o número de cartões. Cada uma
+retorna o conjunto de baralhos alterados, para que o chamador grave tudo de
+uma vez.
+
+Sem a interface, edit_collection carrega a coleção sob o lock da pasta de
+dados, aplica as operações e grava apenas os baralhos alterados:
+
+    from bulk import edit_collection, move_cards, select_cards
+    from storage import DeckStore
+
+    def mover_dificeis(flashcards, decks, journal):
+        hard = select_cards(flashcards, decks, lambda card: card["ease_factor"] < 2.0)
+        return move_cards(flashcards, decks, hard, "Difíceis")
+
+    edit_collection(DeckStore("flashcards_data"), mover_dificeis)
+"""
+from cards import new_card, touch_card
+from sync import record_changes
+
+# Campos do SM-2 que "reiniciar agendamento" devolve ao estado de cartão novo
+SCHEDULING_FIELDS = ("last_review", "next_review", "ease_factor", "interval",
+                     "repetitions", "correct_streak")
+
+
+def card_decks(decks):
+    """Mapeia índice do cartão -> nome do baralho"""
+    owner = {}
+    for deck_name, deck_cards in decks.items():
+        for i in deck_cards:
+            owner[i] = deck_name
+    return owner
+
+
+def select_cards(flashcards, decks, predicate=None, deck_name=None):
+    """Índices dos cartões (de um baralho ou de todos) que satisfazem predicate"""
+    indices = decks.get(deck_name, []) if deck_name is not None else range(len(flashcards))
+    if predicate is None:
+        return list(indices)
+    return [i for i in indices if predicate(flashcards[i])]
+
+
+def remove_cards(flashcards, decks, indices):
+    """Remove os cartões e reajusta os índices de todos os baralhos em uma
+    única passada; retorna os baralhos alterados"""
+    removed = set(indices)
+    if not removed:
+        return set()
+    new_index = [-1] * len(flashcards)
+    kept = []
+    for i, card in enumerate(flashcards):
+        if i not in removed:
+            new_index[i] = len(kept)
+            kept.append(card)
+    flashcards[:] = kept
+
+    changed = set()
+    for deck_name, deck_cards in decks.items():
+        remaining = [new_index[i] for i in deck_cards if new_index[i] >= 0]
+        if len(remaining) != len(deck_cards):
+            changed.add(deck_name)
+        decks[deck_name] = remaining
+    return changed
+
+
+def delete_cards(flashcards, decks, indices, journal=None):
+    """Exclui os cartões; as exclusões são anotadas em journal (diário de
+    sincronização), se informado"""
+    if journal is not None:
+        journal.extend({"op": "delete_card", "id": flashcards[i]["id"]}
+                       for i in sorted(set(indices)))
+    return remove_cards(flashcards, decks, indices)
+
+
+def move_cards(flashcards, decks, indices, target_deck):
+    """Move os cartões para target_deck (criado se não existir), mantendo a
+    ordem em que aparecem na coleção"""
+    selected = set(indices)
+    if not selected:
+        return set()
+    decks.setdefault(target_deck, [])
+
+    changed = set()
+    moved = []
+    for deck_name, deck_cards in decks.items():
+        if deck_name == target_deck:
+            continue
+        remaining = []
+        for i in deck_cards:
+            if i in selected:
+                moved.append(i)
+            else:
+                remaining.append(i)
+        if len(remaining) != len(deck_cards):
+            decks[deck_name] = remaining
+            changed.add(deck_name)
+
+    for i in moved:
+        touch_card(flashcards[i])
+    if moved:
+        decks[target_deck].extend(sorted(moved))
+        changed.add(target_deck)
+    return changed
+
+
+def reset_scheduling(flashcards, decks, indices):
+    """Devolve os cartões ao estado de cartão novo (pendentes agora); o
+    conteúdo e o total de revisões são mantidos"""
+    selected = set(indices)
+    fresh = new_card("", "")
+    for i in selected:
+        card = flashcards[i]
+        for field in SCHEDULING_FIELDS:
+            card[field] = fresh[field]
+        touch_card(card)
+    owner = card_decks(decks)
+    return {owner[i] for i in selected if i in owner}
+
+
+def edit_tags(flashcards, decks, indices, add=(), remove=()):
+    """Acrescenta e remove tags dos cartões; só os cartões cujas tags
+    mudaram são marcados como alterados"""
+    add, remove = set(add), set(remove)
+    touched = set()
+    for i in set(indices):
+        card = flashcards[i]
+        old_tags = set(card.get("tags") or ())
+        tags = (old_tags | add) - remove
+        if tags != old_tags:
+            card["tags"] = sorted(tags)
+            touch_card(card)
+            touched.add(i)
+    owner = card_decks(decks)
+    return {owner[i] for i in touched if i in owner}
+
+
+def set_suspended(flashcards, decks, indices, suspended=True):
+    """Suspende (ou reativa) os cartões: suspensos ficam fora das revisões"""
+    touched = set()
+    for i in set(indices):
+        card = flashcards[i]
+        if bool(card.get("suspended")) != suspended:
+            if suspended:
+                card["suspended"] = True
+            else:
+                card.pop("suspended", None)
+            touch_card(card)
+            touched.add(i)
+    owner = card_decks(decks)
+    return {owner[i] for i in touched if i in owner}
+
+
+def edit_collection(store, func):
+    """Aplica operações em lote a uma coleção em disco, sem a interface.
+
+    Sob o lock da pasta de dados carrega todos os baralhos e chama
+    func(flashcards, decks, journal), que retorna os baralhos alterados;
+    grava esses baralhos e o manifesto uma única vez. Retorna os baralhos
+    alterados.
+    """
+    with store.lock():
+        manifest = store.read_manifest()
+        flashcards = []
+        decks = {}
+        for deck_name in manifest["decks"]:
+            cards = store.load_deck(deck_name)
+            decks[deck_name] = list(range(len(flashcards), len(flashcards) + len(cards)))
+            flashcards.extend(cards)
+
+        journal = []
+        changed = set(func(flashcards, decks, journal) or ())
+        for deck_name in decks:
+            if deck_name not in manifest["decks"]:
+                changed.add(deck_name)
+                journal.append({"op": "add_deck", "name": deck_name})
+        deck_counts = {deck_name: len(deck_cards) for deck_name, deck_cards in decks.items()}
+        store.save(manifest["settings"], deck_counts,
+                   {deck_name: [flashcards[i] for i in decks[deck_name]]
+                    for deck_name in changed if deck_name in decks})
+        record_changes(store.directory, journal)
+    return changed
@@ -0,0 +1,146 @@
+"""Funções compartilhadas para criação e validação de flashcards.
+
+Este módulo não depende do Tkinter, para poder ser usado por processos
+auxiliares (importação paralela) e por scripts sem interface gráfica.
+"""
+import datetime
+import re
+import time
+import unicodedata
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_VALID_TEXT_RE = re.compile(r'[a-zA-Z0-9À-ÿ]')
+
+# Campos de texto com chave de busca normalizada
+TEXT_FIELDS = ("front", "back")
+
+
+def now_str():
+    """Retorna a data/hora atual no formato usado nos dados"""
+    return datetime.datetime.now().strftime(DATE_FORMAT)
+
+
+def validate_text_input(text):
+    """Valida entrada de texto para evitar apenas espaços ou caracteres inválidos"""
+    text = text.strip()
+    if not text:
+        return False
+    # Verificar se não é apenas espaços ou caracteres especiais
+    if not _VALID_TEXT_RE.search(text):
+        return False
+    return True
+
+
+def parse_tags(text):
+    """Converte "Verbos  gramática verbos" em ["gramática", "verbos"].
+
+    Tags são separadas por espaços ou vírgulas e não diferenciam maiúsculas
+    de minúsculas.
+    """
+    return sorted({tag.lower() for tag in re.split(r"[\s,]+", text) if tag})
+
+
+def new_card(front, back, created_at=None):
+    """Cria o dicionário de um novo flashcard com o estado inicial do SM-2"""
+    if created_at is None:
+        created_at = now_str()
+    return {
+        "front": front,
+        "back": back,
+        "created_at": created_at,
+        "last_review": None,
+        "next_review": created_at,
+        "ease_factor": 2.5,
+        "interval": 0,
+        "repetitions": 0,
+        "correct_streak": 0,
+        "total_reviews": 0,
+        "mod": time.time()
+    }
+
+
+def touch_card(card):
+    """Marca o cartão como alterado agora.
+
+    O carimbo "mod" permite que o merge entre processos saiba qual lado
+    alterou o cartão (ver storage.merge_deck_cards). Um cartão já
+    sincronizado fica pendente de envio ("usn" = -1, ver sync.py).
+    """
+    card["mod"] = time.time()
+    if "usn" in card:
+        card["usn"] = -1
+
+
+def assign_card_ids(cards, next_id=1):
+    """Garante que todo cartão tenha um id estável; retorna o próximo id livre.
+
+    Os índices na lista de flashcards mudam quando cartões são excluídos;
+    o id não, e é ele que referencia o cartão no histórico de revisões.
+    """
+    next_id = max([next_id] + [card["id"] + 1 for card in cards if "id" in card])
+    for card in cards:
+        if "id" not in card:
+            card["id"] = next_id
+            next_id += 1
+    return next_id
+
+
+def search_key(text):
+    """Forma normalizada de um texto para busca e detecção de duplicados:
+    casefold, decomposição NFKD e remoção das marcas combinantes ("Ação" e
+    "acao" dão a mesma chave). "\0" vira espaço (é o separador do índice)."""
+    if text.isascii():
+        return text.lower().replace("\0", " ")
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join([c for c in text if not unicodedata.combining(c)]).replace("\0", " ")
+
+
+class SearchKeys:
+    """Chaves de busca dos textos dos cartões, calculadas uma vez por texto.
+
+    Cada campo tem um dicionário texto -> chave. Enquanto o cartão não é
+    editado a chave é uma consulta ao dicionário (a str guarda o próprio
+    hash); um texto novo (cartão criado, editado ou importado) é
+    normalizado uma única vez. As chaves são preenchidas ao criar, editar e
+    importar, e o índice de busca só as consulta.
+    """
+
+    def __init__(self):
+        self._keys = {field: {} for field in TEXT_FIELDS}
+
+    def key(self, text, field="front"):
+        keys = self._keys[field]
+        key = keys.get(text)
+        if key is None:
+            key = keys[text] = search_key(text)
+        return key
+
+    def add_cards(self, cards):
+        """Calcula as chaves dos cartões novos ou editados"""
+        for field, keys in self._keys.items():
+            for card in cards:
+                text = card[field]
+                if text not in keys:
+                    keys[text] = search_key(text)
+
+    def keys_for(self, field, texts):
+        """Chaves de uma lista de textos (todos os cartões, por posição).
+
+        Chaves de textos que não aparecem mais (cartões editados ou
+        excluídos) são descartadas quando passam a ser a maioria.
+        """
+        keys = self._keys[field]
+        get = keys.get
+        result = [get(text) for text in texts]
+        if None in result:
+            for i, key in enumerate(result):
+                if key is None:
+                    result[i] = self.key(texts[i], field)
+        if len(keys) > 2 * len(texts) + 1024:
+            self._keys[field] = dict(zip(texts, result))
+        return result
+
+
+# Compartilhado pelo aplicativo, pelo índice e pelos filtros de busca
+SEARCH_KEYS = SearchKeys()
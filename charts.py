@@ -0,0 +1,129 @@
+"""Gráficos das telas de estatísticas e de atividade, renderizados fora da thread do Tk.
+
+Usa a API orientada a objetos do matplotlib (Figure + FigureCanvasAgg) em vez
+do pyplot: nada fica registrado em um gerenciador global de figuras, então a
+figura é liberada assim que a imagem é gerada, e a renderização pode rodar
+em uma thread auxiliar. O resultado é um PNG que a interface exibe com
+tk.PhotoImage.
+
+O matplotlib é opcional.
+"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+except ImportError:  # sem matplotlib a tela mostra só o texto
+    Figure = None
+
+CHART_SIZE = (10, 4)   # polegadas
+CHART_DPI = 100
+
+
+def charts_available():
+    return Figure is not None
+
+
+def render_stats_chart(difficulty, deck_names, deck_counts):
+    """Desenha a pizza de dificuldade e as barras por baralho; retorna PNG.
+
+    difficulty: (fáceis, médios, difíceis).
+    """
+    fig = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Gráfico de dificuldade
+    if sum(difficulty):
+        ax1.pie(difficulty, labels=['Fáceis', 'Médios', 'Difíceis'],
+                colors=['#4caf50', '#ff9800', '#f44336'], autopct='%1.1f%%')
+    ax1.set_title('Distribuição por Dificuldade')
+
+    # Gráfico de cartões por baralho
+    ax2.bar(deck_names, deck_counts, color='#2196f3')
+    ax2.set_title('Cartões por Baralho (Top 5)')
+    ax2.tick_params(axis='x', rotation=45)
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def render_activity_chart(dates, answers, retention, streaks):
+    """Desenha as revisões diárias por resposta com a retenção móvel e a
+    sequência de dias estudados; retorna PNG. Os dados vêm dos resumos
+    diários (activity.DailyActivity.trends), um valor por dia."""
+    fig = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [2, 1]})
+
+    # Revisões empilhadas por resposta
+    bottom = [0] * len(dates)
+    for field, label, color in (("again", "Esqueci", "#f44336"), ("hard", "Difícil", "#ff9800"),
+                                ("good", "Bom", "#2196f3"), ("easy", "Fácil", "#4caf50")):
+        ax1.bar(dates, answers[field], bottom=bottom, color=color, label=label, width=1.0)
+        bottom = [b + v for b, v in zip(bottom, answers[field])]
+    ax1.set_ylabel('Revisões')
+    ax1.legend(loc='upper left', fontsize='small', ncol=4)
+
+    # Retenção móvel (dias sem revisões na janela ficam em branco)
+    ax3 = ax1.twinx()
+    ax3.plot(dates, [float('nan') if r is None else r * 100 for r in retention],
+             color='#212121', linewidth=1.5)
+    ax3.set_ylim(0, 100)
+    ax3.set_ylabel('Retenção (%)')
+    ax1.set_title('Revisões por Dia e Retenção (média de 7 dias)')
+
+    ax2.fill_between(dates, streaks, step='mid', color='#9c27b0', alpha=0.6)
+    ax2.set_ylabel('Dias')
+    ax2.set_title('Sequência de Dias Estudados')
+    fig.autofmt_xdate()
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    """Renderiza em uma thread auxiliar e guarda a última imagem.
+
+    O cache é indexado por uma chave fornecida pelo chamador (a versão da
+    coleção): enquanto os dados não mudam, a mesma imagem é reutilizada.
+    """
+
+    def __init__(self, render=render_stats_chart):
+        self.render = render
+        self._executor = None
+        self._pending = None      # (chave, future)
+        self.cached_key = None
+        self.cached_png = None
+
+    def get(self, key):
+        """PNG já renderizado para a chave, ou None"""
+        return self.cached_png if key == self.cached_key else None
+
+    def submit(self, key, *args):
+        """Agenda a renderização (uma por chave); retorna o future"""
+        if self._pending is not None and self._pending[0] == key:
+            return self._pending[1]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        future = self._executor.submit(self.render, *args)
+        self._pending = (key, future)
+        return future
+
+    def collect(self, key, future):
+        """Guarda no cache o resultado de um future concluído e o retorna"""
+        png = future.result()
+        if self._pending is not None and self._pending[1] is future:
+            self._pending = None
+        self.cached_key = key
+        self.cached_png = png
+        return png
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
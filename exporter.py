@@ -0,0 +1,295 @@
+"""Exportação da coleção em CSV, JSON Lines ou formato colunar.
+
+Os cartões são percorridos baralho a baralho por um gerador, que já sabe
+o baralho de cada cartão, e gravados em lotes de BATCH_SIZE linhas: a
+memória usada não depende do tamanho da coleção, e baralhos ainda não
+carregados são lidos do disco um por vez.
+
+Formatos:
+    csv      uma linha por cartão, com cabeçalho
+    jsonl    um objeto JSON por linha
+    colunar  zip com um arquivo por campo: números em binário (módulo
+             array, como no histórico de revisões) e textos em UTF-8
+             concatenados, com os deslocamentos de fim de cada valor em
+             um arquivo "<campo>.off"; meta.json descreve as colunas
+
+No modo "um arquivo por baralho" cada baralho é gravado por um processo
+auxiliar em um arquivo temporário e os arquivos são reunidos em um zip.
+"""
+import array
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from operator import itemgetter
+
+from storage import load_deck_file
+
+BATCH_SIZE = 10000
+FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "colunar": ".zip"}
+
+# Colunas da exportação simples (as mesmas de sempre) e da completa
+BASIC_FIELDS = ("front", "back", "deck", "created_at", "repetitions", "ease_factor")
+FULL_FIELDS = ("front", "back", "created_at", "last_review", "next_review",
+               "ease_factor", "interval", "repetitions", "correct_streak",
+               "total_reviews", "deck", "id", "tags", "suspended")
+_EXTRA_FIELDS = ("deck", "id", "tags", "suspended")
+
+FIELD_LABELS = {
+    "front": "Frente", "back": "Verso", "deck": "Baralho", "created_at": "Criado",
+    "repetitions": "Repetições", "ease_factor": "Facilidade", "id": "Id",
+    "last_review": "Última revisão", "next_review": "Próxima revisão",
+    "interval": "Intervalo", "correct_streak": "Acertos seguidos",
+    "total_reviews": "Total de revisões", "tags": "Tags", "suspended": "Suspenso",
+}
+# Colunas numéricas no formato colunar (typecode do array); as demais são texto
+COLUMN_TYPES = {
+    "ease_factor": "d", "interval": "i", "repetitions": "i", "correct_streak": "i",
+    "total_reviews": "i", "id": "q", "suspended": "b",
+}
+
+
+def _split_fields(fields):
+    """(campos do cartão, campos derivados, reordenação): as tuplas são
+    montadas com os campos do cartão primeiro (lidos com um itemgetter) e
+    os derivados depois; reordenação (um itemgetter, ou None se a ordem já
+    é a pedida) as devolve à ordem de fields"""
+    card_fields = [field for field in fields if field not in _EXTRA_FIELDS]
+    extras = [field for field in fields if field in _EXTRA_FIELDS]
+    built = card_fields + extras
+    if built == list(fields):
+        return card_fields, extras, None
+    return card_fields, extras, itemgetter(*[built.index(field) for field in fields])
+
+
+def _card_getter(card_fields):
+    """Função cartão -> tupla dos campos (itemgetter roda em C)"""
+    if not card_fields:
+        return lambda card: ()
+    if len(card_fields) == 1:
+        field = card_fields[0]
+        return lambda card: (card[field],)
+    return itemgetter(*card_fields)
+
+
+def iter_rows(deck_sources, fields=BASIC_FIELDS):
+    """Gera uma tupla por cartão com os campos pedidos, na ordem de fields.
+
+    deck_sources: iterável de (nome do baralho, cartões); cada lista de
+    cartões pode ser lida sob demanda. Tags saem como texto separado por
+    espaços e suspenso como booleano.
+    """
+    card_fields, extras, reorder = _split_fields(fields)
+    rows = _built_rows(deck_sources, card_fields, extras)
+    return rows if reorder is None else map(reorder, rows)
+
+
+def _built_rows(deck_sources, card_fields, extras):
+    """Tuplas (campos do cartão..., campos derivados...) de cada cartão"""
+    getter = _card_getter(card_fields)
+    for deck_name, cards in deck_sources:
+        if not extras:
+            yield from map(getter, cards)
+        elif extras == ["deck"]:
+            deck = (deck_name,)
+            for card in cards:
+                yield getter(card) + deck
+        else:
+            for card in cards:
+                values = {"deck": deck_name, "id": card.get("id"),
+                          "tags": " ".join(card.get("tags") or ()),
+                          "suspended": bool(card.get("suspended"))}
+                yield getter(card) + tuple(values[field] for field in extras)
+
+
+def _batches(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_csv(path, rows, fields=BASIC_FIELDS):
+    """Grava as linhas em CSV; retorna quantas foram gravadas"""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow([FIELD_LABELS.get(field, field) for field in fields])
+        for batch in _batches(rows):
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def write_jsonl(path, rows, fields=BASIC_FIELDS):
+    """Grava as linhas em JSON Lines; retorna quantas foram gravadas"""
+    count = 0
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    with open(path, "w", encoding="utf-8") as file:
+        for batch in _batches(rows):
+            file.writelines([encode(dict(zip(fields, row))) + "\n" for row in batch])
+            count += len(batch)
+    return count
+
+
+def write_columns(path, rows, fields=BASIC_FIELDS):
+    """Grava as linhas no formato colunar (um zip); retorna quantas foram
+    gravadas.
+
+    Cada coluna é anexada a um arquivo temporário a cada lote e os arquivos
+    são copiados para o zip no fim, sem passar pela memória.
+    """
+    count = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {}
+        offsets = {}
+        ends = {field: 0 for field in fields}
+        for field in fields:
+            files[field] = open(os.path.join(tmp, field), "wb")
+            if field not in COLUMN_TYPES:
+                offsets[field] = open(os.path.join(tmp, field + ".off"), "wb")
+        try:
+            for batch in _batches(rows):
+                for n, field in enumerate(fields):
+                    values = [row[n] for row in batch]
+                    code = COLUMN_TYPES.get(field)
+                    if code is not None:
+                        array.array(code, [value or 0 for value in values]).tofile(files[field])
+                        continue
+                    encoded = [(value or "").encode("utf-8") for value in values]
+                    positions = array.array("q", itertools.accumulate(
+                        map(len, encoded), initial=ends[field]))
+                    ends[field] = positions[-1]
+                    positions[1:].tofile(offsets[field])
+                    files[field].write(b"".join(encoded))
+                count += len(batch)
+        finally:
+            for file in itertools.chain(files.values(), offsets.values()):
+                file.close()
+
+        meta = {
+            "format": "pycard-colunar",
+            "version": 1,
+            "rows": count,
+            "byteorder": sys.byteorder,
+            "columns": [[field, COLUMN_TYPES.get(field, "text")] for field in fields],
+        }
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+            package.writestr("meta.json", json.dumps(meta, ensure_ascii=False, indent=4))
+            for field in fields:
+                if field in COLUMN_TYPES:
+                    package.write(os.path.join(tmp, field), field + ".col")
+                else:
+                    package.write(os.path.join(tmp, field), field + ".txt")
+                    package.write(os.path.join(tmp, field + ".off"), field + ".off")
+    return count
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "colunar": write_columns}
+
+
+def export_collection(path, deck_sources, fmt="csv", fields=BASIC_FIELDS):
+    """Exporta os baralhos para um único arquivo; retorna o total de cartões"""
+    return WRITERS[fmt](path, iter_rows(deck_sources, fields), fields)
+
+
+def _deck_member_name(deck_name, used):
+    """Nome de arquivo seguro (e único no zip) para um baralho"""
+    base = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", deck_name).strip(" .") or "baralho"
+    name = base
+    n = 2
+    while name.lower() in used:
+        name = f"{base} ({n})"
+        n += 1
+    used.add(name.lower())
+    return name
+
+
+def _export_deck_worker(args):
+    """Grava um baralho em um processo auxiliar; source é a lista de
+    cartões ou o caminho do arquivo do baralho, lido aqui mesmo"""
+    deck_name, source, fmt, fields, target = args
+    cards = load_deck_file(source) if isinstance(source, str) else source
+    return WRITERS[fmt](target, iter_rows([(deck_name, cards)], fields), fields)
+
+
+def export_per_deck(path, deck_jobs, fmt="csv", fields=BASIC_FIELDS, max_workers=None,
+                    progress=None):
+    """Exporta um arquivo por baralho, reunidos em um zip.
+
+    deck_jobs: lista de (nome do baralho, cartões ou caminho do arquivo do
+    baralho). Os baralhos são gravados em paralelo e cada arquivo entra no
+    zip assim que fica pronto; progress(prontos, baralhos), se dado, é
+    chamado a cada baralho. Retorna o total de cartões.
+    """
+    used = set()
+    extension = FORMATS[fmt]
+    total = 0
+    with tempfile.TemporaryDirectory() as tmp, \
+            zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        jobs = []
+        for n, (deck_name, source) in enumerate(deck_jobs):
+            member = _deck_member_name(deck_name, used) + extension
+            jobs.append((member, (deck_name, source, fmt, fields,
+                                  os.path.join(tmp, f"{n}{extension}"))))
+
+        added = []
+
+        def add(member, job, count):
+            nonlocal total
+            target = job[-1]
+            # O formato colunar já é um zip: guardado sem recomprimir
+            compress = zipfile.ZIP_STORED if fmt == "colunar" else zipfile.ZIP_DEFLATED
+            package.write(target, member, compress_type=compress)
+            os.remove(target)
+            total += count
+            added.append(member)
+            if progress is not None:
+                progress(len(added), len(jobs))
+
+        if max_workers is None:
+            max_workers = min(len(jobs), os.cpu_count() or 1)
+        # Um único baralho (ou núcleo) não compensa o custo de iniciar processos
+        if len(jobs) <= 1 or max_workers <= 1:
+            for member, job in jobs:
+                add(member, job, _export_deck_worker(job))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_export_deck_worker, job): (member, job)
+                           for member, job in jobs}
+                for future in as_completed(futures):
+                    member, job = futures[future]
+                    add(member, job, future.result())
+    return total
+
+
+def read_columns(path):
+    """Lê um arquivo colunar: {campo: lista de valores} (para conferência e
+    para quem quer carregar as colunas sem NumPy)"""
+    with zipfile.ZipFile(path) as package:
+        meta = json.loads(package.read("meta.json"))
+        swap = meta.get("byteorder", sys.byteorder) != sys.byteorder
+        columns = {}
+        for field, code in meta["columns"]:
+            if code != "text":
+                values = array.array(code)
+                values.frombytes(package.read(field + ".col"))
+                if swap:
+                    values.byteswap()
+                columns[field] = values.tolist()
+                continue
+            ends = array.array("q")
+            ends.frombytes(package.read(field + ".off"))
+            if swap:
+                ends.byteswap()
+            blob = package.read(field + ".txt")
+            starts = itertools.chain((0,), ends)
+            columns[field] = [blob[start:end].decode("utf-8") for start, end in zip(starts, ends)]
+    return columns
@@ -0,0 +1,78 @@
+"""Baralhos filtrados: consultas salvas (ver query.py) materializadas.
+
+Cada baralho filtrado guarda a lista de ids dos cartões que satisfazem a
+sua consulta, em qualquer baralho. A lista é calculada por inteiro só
+quando a disposição da coleção muda (um novo índice) ou, para consultas
+que dependem do tempo (due:, is:due, reviewed:today), quando a data muda ou
+cartões vencem; fora isso cada cartão alterado (resposta na revisão,
+edição, tags) é reavaliado sozinho com update_card, e começar uma sessão
+apenas lê a lista.
+
+As consultas ficam nas configurações da coleção ("filtered_decks").
+"""
+import datetime
+
+from index import bitmap_indices
+from query import parse_query
+
+# Exemplos oferecidos enquanto não há nenhum baralho filtrado salvo
+PRESETS = {
+    "Atrasados difíceis": "due:overdue ease<2.2 -is:suspended",
+    "Errados hoje": "reviewed:today streak:0 -is:suspended",
+}
+
+
+class FilteredDeck:
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
+        self.node = parse_query(query)   # QueryError se a consulta for inválida
+        self.ids = {}                    # id -> None: conjunto na ordem da coleção
+        self._built_for = None
+
+    def _key(self, index):
+        if self.node is not None and self.node.time_dependent:
+            return (index.generation, datetime.date.today(), index.due_version)
+        return (index.generation,)
+
+    def refresh(self, index):
+        """Recalcula a lista se o índice (ou, para consultas que dependem do
+        tempo, a data ou os cartões vencidos) mudou desde o último cálculo"""
+        if self.node is not None and self.node.time_dependent:
+            index.due()   # avança os vencidos, que fazem parte da chave
+        key = self._key(index)
+        if key == self._built_for:
+            return
+        if self.node is None:
+            bitmap = index.all
+        else:
+            bitmap = self.node.bitmap(index) & index.all
+        flashcards = index.flashcards
+        self.ids = dict.fromkeys(flashcards[i]["id"] for i in bitmap_indices(bitmap))
+        self._built_for = key
+
+    def update_card(self, index, card, deck_name):
+        """Inclui ou retira um cartão alterado (se a lista estiver em dia)"""
+        if self._built_for is None or self._built_for[0] != index.generation:
+            return   # será recalculada por inteiro no próximo uso
+        if self.node is None or self.node.matches(card, deck_name):
+            self.ids[card["id"]] = None
+        else:
+            self.ids.pop(card["id"], None)
+
+    def discard(self, card):
+        """Retira um cartão excluído da lista"""
+        self.ids.pop(card["id"], None)
+
+    def cards(self, index):
+        """Os cartões da lista, atualizada se preciso"""
+        self.refresh(index)
+        cards = []
+        for card_id in self.ids:
+            card = index.card_by_id(card_id)
+            if card is not None:
+                cards.append(card)
+        return cards
+
+    def __len__(self):
+        return len(self.ids)
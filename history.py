@@ -0,0 +1,265 @@
+"""Histórico de revisões em formato colunar binário.
+
+Cada coluna é um arquivo binário com valores de tamanho fixo (módulo array)
+e as revisões são apenas anexadas ao final. Isso mantém o histórico fora do
+JSON principal, ocupa poucos bytes por revisão (~29) e permite:
+
+- consultas por intervalo de tempo via busca binária na coluna de datas,
+  que é mantida em ordem crescente;
+- consultas por cartão via um índice cartão -> linhas construído sob demanda.
+
+Vários processos podem anexar ao mesmo histórico: cada escrita é feita sob
+um lock de arquivo e recalcula o número de linhas pelo tamanho das colunas.
+"""
+import json
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from storage import file_lock
+
+HISTORY_VERSION = 1
+
+# (nome da coluna, typecode do array)
+COLUMNS = (
+    ("card_id", "i"),
+    ("timestamp", "q"),        # segundos desde a época (UTC)
+    ("quality", "b"),          # 0=Esqueci, 1=Difícil, 2=Bom, 3=Fácil
+    ("prev_interval", "i"),    # dias
+    ("new_interval", "i"),     # dias
+    ("ease", "f"),             # fator de facilidade após a revisão
+    ("answer_ms", "I"),        # tempo até a resposta, em milissegundos
+)
+
+
+class ReviewHistory:
+    """Log somente-anexação das revisões feitas em process_answer"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._columns = None
+        self._card_index = None
+        self._files = {}
+        self._count = None
+        self._last_ts = None
+
+    # ------------------------------------------------------------------
+    # Arquivos
+    # ------------------------------------------------------------------
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".col")
+
+    def _ensure_directory(self):
+        """Cria a pasta e o arquivo de metadados na primeira escrita"""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        meta_path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_path):
+            meta = {
+                "version": HISTORY_VERSION,
+                "byteorder": sys.byteorder,
+                "columns": [[name, code] for name, code in COLUMNS],
+            }
+            with open(meta_path, "w", encoding="utf-8") as file:
+                json.dump(meta, file, indent=4)
+
+    def _needs_byteswap(self):
+        meta_path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        return meta.get("byteorder", sys.byteorder) != sys.byteorder
+
+    def _row_count_on_disk(self):
+        """Número de linhas completas; colunas mais longas (escrita
+        interrompida) são truncadas para manter todas alinhadas"""
+        if not os.path.isdir(self.directory):
+            return 0
+        sizes = {}
+        for name, code in COLUMNS:
+            path = self._path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            sizes[name] = size // array(code).itemsize
+        count = min(sizes.values())
+        for name, code in COLUMNS:
+            if sizes[name] != count:
+                with open(self._path(name), "r+b") as file:
+                    file.truncate(count * array(code).itemsize)
+        return count
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self._row_count_on_disk()
+        return self._count
+
+    def load(self):
+        """Carrega todas as colunas em memória (feito sob demanda)"""
+        if self._columns is not None:
+            return self._columns
+        count = len(self)
+        swap = self._needs_byteswap()
+        columns = {}
+        for name, code in COLUMNS:
+            column = array(code)
+            if count:
+                with open(self._path(name), "rb") as file:
+                    column.fromfile(file, count)
+                if swap:
+                    column.byteswap()
+            columns[name] = column
+        self._columns = columns
+        return columns
+
+    def reload(self):
+        """Relê todas as colunas do disco sob o lock. Para ler o histórico
+        em outra thread, com uma instância própria, enquanto a do
+        aplicativo anexa revisões."""
+        with file_lock(os.path.join(self.directory, ".lock")):
+            self._count = None
+            self._columns = None
+            self._card_index = None
+            self._last_ts = None
+            return self.load()
+
+    def close(self):
+        """Fecha os arquivos abertos para anexação"""
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def _last_timestamp(self):
+        if self._last_ts is None:
+            count = len(self)
+            self._last_ts = 0
+            if count:
+                itemsize = array("q").itemsize
+                with open(self._path("timestamp"), "rb") as file:
+                    file.seek((count - 1) * itemsize)
+                    last = array("q")
+                    last.fromfile(file, 1)
+                    if self._needs_byteswap():
+                        last.byteswap()
+                self._last_ts = last[0]
+        return self._last_ts
+
+    def append(self, card_id, quality, prev_interval, new_interval, ease,
+               answer_ms=0, timestamp=None):
+        """Anexa uma revisão ao histórico.
+
+        A data nunca retrocede: se o relógio voltar, a revisão recebe a
+        mesma data da anterior, preservando a ordem usada nas buscas.
+        """
+        self._ensure_directory()
+        with file_lock(os.path.join(self.directory, ".lock")):
+            return self._append_locked(card_id, quality, prev_interval, new_interval,
+                                       ease, answer_ms, timestamp)
+
+    def _append_locked(self, card_id, quality, prev_interval, new_interval, ease,
+                       answer_ms, timestamp):
+        # Outro processo pode ter anexado linhas desde a última escrita
+        count = self._row_count_on_disk()
+        if count != self._count:
+            self._count = count
+            self._columns = None
+            self._card_index = None
+            self._last_ts = None
+
+        if timestamp is None:
+            timestamp = int(time.time())
+        timestamp = max(int(timestamp), self._last_timestamp())
+        values = {
+            "card_id": card_id,
+            "timestamp": timestamp,
+            "quality": quality,
+            "prev_interval": prev_interval,
+            "new_interval": new_interval,
+            "ease": ease,
+            "answer_ms": max(0, int(answer_ms)),
+        }
+
+        if not self._files:
+            self._files = {name: open(self._path(name), "ab") for name, _ in COLUMNS}
+
+        row = len(self)
+        for name, code in COLUMNS:
+            array(code, [values[name]]).tofile(self._files[name])
+        for file in self._files.values():
+            file.flush()
+
+        self._count = row + 1
+        self._last_ts = timestamp
+        if self._columns is not None:
+            for name, _ in COLUMNS:
+                self._columns[name].append(values[name])
+        if self._card_index is not None:
+            self._card_index.setdefault(card_id, array("I")).append(row)
+        return row
+
+    def retract(self, row):
+        """Remove a revisão da linha row, se ela ainda é a última (desfazer
+        uma resposta). Retorna False se outra revisão foi anexada depois,
+        neste ou em outro processo: o histórico nunca é reescrito no meio."""
+        if not os.path.isdir(self.directory):
+            return False
+        with file_lock(os.path.join(self.directory, ".lock")):
+            if self._row_count_on_disk() != row + 1:
+                return False
+            self.close()
+            for name, code in COLUMNS:
+                with open(self._path(name), "r+b") as file:
+                    file.truncate(row * array(code).itemsize)
+            self._count = row
+            self._columns = None
+            self._card_index = None
+            self._last_ts = None
+        return True
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def column(self, name):
+        """Retorna a coluna inteira como array"""
+        return self.load()[name]
+
+    def time_range(self, start=None, end=None):
+        """Retorna (primeira, última+1) linhas com start <= data < end"""
+        timestamps = self.column("timestamp")
+        lo = 0 if start is None else bisect_left(timestamps, start)
+        hi = len(timestamps) if end is None else bisect_left(timestamps, end)
+        return lo, max(lo, hi)
+
+    def scan_time(self, start=None, end=None):
+        """Retorna as colunas (fatias de array) das revisões no período"""
+        lo, hi = self.time_range(start, end)
+        return {name: column[lo:hi] for name, column in self.load().items()}
+
+    def rows_for_card(self, card_id, start=None, end=None):
+        """Linhas das revisões de um cartão, opcionalmente limitadas no tempo"""
+        if self._card_index is None:
+            index = {}
+            for row, cid in enumerate(self.column("card_id")):
+                rows = index.get(cid)
+                if rows is None:
+                    rows = index[cid] = array("I")
+                rows.append(row)
+            self._card_index = index
+        rows = self._card_index.get(card_id, array("I"))
+        if start is None and end is None:
+            return rows
+        lo, hi = self.time_range(start, end)
+        return rows[bisect_left(rows, lo):bisect_right(rows, hi - 1)]
+
+    def fetch(self, rows):
+        """Monta registros (dicionários) para um conjunto pequeno de linhas"""
+        columns = self.load()
+        return [{name: columns[name][row] for name, _ in COLUMNS} for row in rows]
+
+    def card_history(self, card_id):
+        """Todas as revisões de um cartão, em ordem cronológica"""
+        return self.fetch(self.rows_for_card(card_id))
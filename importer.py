@@ -0,0 +1,130 @@
+"""Importação de flashcards a partir de vários arquivos CSV/texto.
+
+A leitura, a validação e a construção dos cartões de cada arquivo rodam em
+um ProcessPoolExecutor; o chamador só junta os resultados na coleção e
+salva uma única vez.
+
+Também pode ser executado como script (por exemplo, uma importação noturna
+agendada) enquanto o aplicativo está aberto; a gravação é feita sob o lock
+da pasta de dados e o aplicativo incorpora os cartões novos:
+    python importer.py --deck Geral arquivos/ novos.csv
+"""
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from cards import assign_card_ids, new_card, now_str, validate_text_input
+from storage import DeckStore
+
+IMPORT_EXTENSIONS = (".csv", ".txt")
+
+
+def parse_file(file_path, created_at=None):
+    """Lê um arquivo CSV ou texto e retorna (cartões, linhas ignoradas)"""
+    if created_at is None:
+        created_at = now_str()
+    cards = []
+    skipped = 0
+    with open(file_path, 'r', encoding='utf-8') as file:
+        if file_path.lower().endswith('.csv'):
+            for row in csv.reader(file):
+                if len(row) >= 2 and validate_text_input(row[0]) and validate_text_input(row[1]):
+                    cards.append(new_card(row[0].strip(), row[1].strip(), created_at))
+                else:
+                    skipped += 1
+        else:
+            # Formato texto: linha ímpar = frente, linha par = verso
+            lines = file.readlines()
+            for i in range(0, len(lines) - 1, 2):
+                front = lines[i].strip()
+                back = lines[i + 1].strip()
+                if validate_text_input(front) and validate_text_input(back):
+                    cards.append(new_card(front, back, created_at))
+                else:
+                    skipped += 1
+    return cards, skipped
+
+
+def _parse_worker(args):
+    """Executa parse_file em um processo auxiliar, capturando erros por arquivo"""
+    file_path, created_at = args
+    result = {"path": file_path, "cards": [], "skipped": 0, "error": None}
+    try:
+        result["cards"], result["skipped"] = parse_file(file_path, created_at)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def collect_import_files(folder):
+    """Lista recursivamente os arquivos importáveis de uma pasta"""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMPORT_EXTENSIONS):
+                found.append(os.path.join(dirpath, name))
+    return found
+
+
+def import_files(file_paths, max_workers=None, progress=None):
+    """Processa vários arquivos em paralelo.
+
+    Retorna uma lista de resultados (um por arquivo, na mesma ordem) com as
+    chaves "path", "cards", "skipped" e "error". progress(feitos, total), se
+    informado, é chamado a cada arquivo concluído.
+    """
+    created_at = now_str()
+    jobs = [(path, created_at) for path in file_paths]
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+    results = []
+    # Um único arquivo (ou núcleo) não compensa o custo de iniciar processos
+    if len(jobs) <= 1 or max_workers <= 1:
+        for job in jobs:
+            results.append(_parse_worker(job))
+            if progress is not None:
+                progress(len(results), len(jobs))
+        return results
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(_parse_worker, jobs):
+            results.append(result)
+            if progress is not None:
+                progress(len(results), len(jobs))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa flashcards sem abrir a interface")
+    parser.add_argument("paths", nargs="+", help="arquivos .csv/.txt ou pastas")
+    parser.add_argument("--deck", default="Geral", help="baralho de destino")
+    parser.add_argument("--data", default="flashcards_data", help="pasta de dados")
+    args = parser.parse_args()
+
+    file_paths = []
+    for path in args.paths:
+        file_paths.extend(collect_import_files(path) if os.path.isdir(path) else [path])
+
+    imported = []
+    for result in import_files(file_paths):
+        if result["error"]:
+            print(f"{result['path']}: erro - {result['error']}")
+        else:
+            print(f"{result['path']}: {len(result['cards'])} cartões, "
+                  f"{result['skipped']} linhas ignoradas")
+            imported.extend(result["cards"])
+    if not imported:
+        return
+
+    def add_cards(cards, next_id):
+        next_id = assign_card_ids(cards, next_id)
+        next_id = assign_card_ids(imported, next_id)
+        return cards + imported, next_id
+
+    DeckStore(args.data).modify_deck(args.deck, add_cards)
+    print(f"{len(imported)} cartões adicionados ao baralho '{args.deck}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,551 @@
+"""Índices em bitmap para filtros combinados (baralho, tag, pendente, suspenso).
+
+Cada conjunto de cartões é um bitmap em que o bit i representa o cartão na
+posição i da lista de flashcards. Os bitmaps são mantidos como bytearray
+(alteráveis bit a bit) e convertidos sob demanda para int do Python, cujas
+operações &, | e ~ rodam em C sobre a palavra inteira: cruzar "baralho X E
+tag Y E pendente E NÃO suspenso" em um milhão de cartões leva microssegundos,
+sem percorrer os cartões.
+
+Para buscas que não cabem em um bitmap (ver query.py) o índice guarda, sob
+demanda, colunas com um campo de todos os cartões: arrays NumPy para os
+campos numéricos e, para frente/verso, um único texto normalizado (sem
+acentos e sem diferença de maiúsculas, ver cards.search_key) com os cartões
+separados por "\0", em que str.find procura em C. As chaves normalizadas vêm
+de cards.SEARCH_KEYS, calculadas uma vez por texto, e não a cada busca.
+
+O índice vale para uma disposição da lista: quando cartões são removidos
+do meio da lista ou carregados o chamador cria um novo índice; alterações
+de um cartão (tags, suspensão, agendamento, texto) são aplicadas com
+update_card, e cartões anexados ou retirados do fim da lista, posições
+trocadas, cartões que mudam de baralho e baralhos criados ou excluídos têm
+atualizações próprias (append_card, remove_tail, swap_cards, move_card,
+add_deck, remove_deck), usadas ao desfazer e refazer.
+"""
+import bisect
+import heapq
+import itertools
+from collections import Counter
+
+from cards import SEARCH_KEYS, now_str
+
+try:
+    import numpy as np
+except ImportError:  # sem NumPy a conversão para índices usa str.find
+    np = None
+
+
+def _set_bit(buffer, i):
+    buffer[i >> 3] |= 1 << (i & 7)
+
+
+def _clear_bit(buffer, i):
+    buffer[i >> 3] &= 0xFF ^ (1 << (i & 7))
+
+
+def _positions_buffer(positions, size):
+    """bytearray com os bits das posições ligados"""
+    nbytes = (size + 7) // 8
+    if np is not None and positions:
+        bits = np.zeros(nbytes * 8, np.uint8)
+        bits[np.asarray(positions, dtype=np.int64)] = 1
+        return bytearray(np.packbits(bits, bitorder="little").tobytes())
+    buffer = bytearray(nbytes)
+    for i in positions:
+        _set_bit(buffer, i)
+    return buffer
+
+
+def positions_bitmap(positions, size):
+    """Bitmap (int) com as posições informadas"""
+    return int.from_bytes(_positions_buffer(positions, size), "little")
+
+
+def mask_bitmap(mask):
+    """Bitmap (int) de um array booleano do NumPy"""
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def bitmap_count(bitmap):
+    """Número de cartões no bitmap"""
+    return bin(bitmap).count("1")
+
+
+def bitmap_indices(bitmap):
+    """Posições dos bits ligados, em ordem crescente"""
+    if bitmap <= 0:
+        return []
+    if np is not None:
+        raw = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"), np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little")).tolist()
+    bits = bin(bitmap)[:1:-1]   # bit 0 primeiro
+    indices = []
+    pos = bits.find("1")
+    while pos != -1:
+        indices.append(pos)
+        pos = bits.find("1", pos + 1)
+    return indices
+
+
+def card_tags(card):
+    return card.get("tags") or ()
+
+
+# Campos com coluna numérica e campos de data (texto "AAAA-MM-DD hh:mm:ss")
+NUMERIC_FIELDS = ("ease_factor", "interval", "repetitions", "correct_streak",
+                  "total_reviews", "id")
+DATE_FIELDS = ("created_at", "last_review", "next_review")
+_TEXT_SEPARATOR = "\0"
+_generations = itertools.count(1)
+
+
+class DayLoads:
+    """Cartões não suspensos agendados por dia (ver CardIndex.day_load).
+
+    Fica fora do índice para sobreviver a ele: um índice novo com as mesmas
+    chaves de vencimento e os mesmos suspensos do que montou a contagem (só
+    a divisão em baralhos mudou: cartões movidos, baralho renomeado ou
+    excluído) continua com ela, em vez de contar os cartões de novo.
+    """
+
+    def __init__(self):
+        self.due_keys = None    # chaves de vencimento do índice dono da contagem
+        self.suspended = None   # bitmap de suspensos desse índice
+        self.days = None        # posição -> dia contado (ou None)
+        self.counts = None      # dia -> cartões
+
+
+class CardIndex:
+    """Bitmaps por baralho, por tag, de suspensos e de pendentes"""
+
+    def __init__(self, flashcards, decks, day_loads=None):
+        self.flashcards = flashcards
+        self.size = len(flashcards)
+        self.generation = next(_generations)   # identifica esta disposição da lista
+        self.due_version = 0     # incrementado quando cartões vencem com o tempo
+        self._ints = {}          # chave -> int (cache, invalidado ao alterar)
+        self._positions = None   # id(cartão) -> posição, criado sob demanda
+        self._ids = None         # id do cartão ("id") -> posição, criado sob demanda
+        self._owners = None      # posição -> baralho, criado sob demanda
+        self._decks = decks
+        self._columns = {}       # campo -> coluna, criadas sob demanda
+        self._texts = {}         # campo -> textos normalizados
+        self._text_lookup = {}   # campo -> texto normalizado -> posições
+        self._joined = {}        # campo -> (textos unidos, início de cada cartão)
+        self._due_time = now_str()
+        # Contagem por dia (montada sob demanda), de um índice anterior se informada
+        self._loads = day_loads if day_loads is not None else DayLoads()
+
+        # Posições de cada conjunto, coletadas com compreensões de lista
+        members = {("deck", deck_name): deck_cards for deck_name, deck_cards in decks.items()}
+        self._card_tags = {}     # posição -> tags indexadas (só cartões com tags)
+        for i, card in enumerate(flashcards):
+            tags = card.get("tags")
+            if tags:
+                self._card_tags[i] = tuple(tags)
+                for tag in tags:
+                    members.setdefault(("tag", tag), []).append(i)
+        members[("suspended",)] = [i for i, card in enumerate(flashcards) if card.get("suspended")]
+        self._due_keys = [card["next_review"] or "" for card in flashcards]
+        due_time = self._due_time
+        members[("due",)] = [i for i, key in enumerate(self._due_keys) if key <= due_time]
+        # heap (próxima revisão, posição) dos cartões ainda não vencidos
+        self._pending = [(key, i) for i, key in enumerate(self._due_keys) if key > due_time]
+        heapq.heapify(self._pending)
+
+        self._buffers = {key: _positions_buffer(positions, self.size)
+                         for key, positions in members.items()}
+        self.all = (1 << self.size) - 1
+
+    def _get(self, key):
+        value = self._ints.get(key)
+        if value is None:
+            buffer = self._buffers.get(key)
+            value = int.from_bytes(buffer, "little") if buffer is not None else 0
+            self._ints[key] = value
+        return value
+
+    def _change(self, key, i, on):
+        if key not in self._buffers:
+            if not on:
+                return
+            self._buffers[key] = bytearray((self.size + 7) // 8)
+        if on:
+            _set_bit(self._buffers[key], i)
+        else:
+            _clear_bit(self._buffers[key], i)
+        self._ints.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # Conjuntos
+    # ------------------------------------------------------------------
+    def deck(self, deck_name):
+        return self._get(("deck", deck_name))
+
+    def tag(self, tag):
+        return self._get(("tag", tag))
+
+    def suspended(self):
+        return self._get(("suspended",))
+
+    def due(self, now=None):
+        """Cartões com revisão vencida até agora (ou até now)"""
+        now = now or now_str()
+        if now > self._due_time:
+            self._due_time = now
+            while self._pending and self._pending[0][0] <= now:
+                key, i = heapq.heappop(self._pending)
+                if i < self.size and self._due_keys[i] == key:   # senão a entrada está obsoleta
+                    self._change(("due",), i, True)
+                    self.due_version += 1
+        return self._get(("due",))
+
+    def column(self, field):
+        """Valores de um campo para todos os cartões, por posição.
+
+        Campos numéricos viram um array NumPy de floats e datas um array de
+        textos (None vira ""); sem NumPy, listas.
+        """
+        if field == "next_review" and np is None:
+            return self._due_keys
+        values = self._columns.get(field)
+        if values is None:
+            if field in NUMERIC_FIELDS:
+                values = [card.get(field) or 0 for card in self.flashcards]
+                if np is not None:
+                    values = np.array(values, dtype=np.float64)
+            else:
+                if field == "next_review":
+                    values = self._due_keys
+                else:
+                    values = [card.get(field) or "" for card in self.flashcards]
+                if np is not None:
+                    values = np.array(values, dtype="U19")
+            self._columns[field] = values
+        return values
+
+    def text(self, field):
+        """O campo de todos os cartões, normalizado, por posição"""
+        parts = self._texts.get(field)
+        if parts is None:
+            parts = SEARCH_KEYS.keys_for(field, [card[field] for card in self.flashcards])
+            self._texts[field] = parts
+        return parts
+
+    def find_text(self, field, key):
+        """Posições dos cartões cujo campo normalizado é igual a key (para
+        detectar duplicados)"""
+        lookup = self._text_lookup.get(field)
+        if lookup is None:
+            lookup = {}
+            for i, part in enumerate(self.text(field)):
+                lookup.setdefault(part, []).append(i)
+            self._text_lookup[field] = lookup
+        return lookup.get(key, [])
+
+    def joined_text(self, field):
+        """(texto, inícios): text(field) unido por "\0"; inícios[i] é onde
+        começa o cartão i"""
+        joined = self._joined.get(field)
+        if joined is None:
+            parts = self.text(field)
+            starts = []
+            offset = 0
+            for part in parts:
+                starts.append(offset)
+                offset += len(part) + 1
+            joined = (_TEXT_SEPARATOR.join(parts), starts)
+            self._joined[field] = joined
+        return joined
+
+    def search_text(self, field, term):
+        """Bitmap dos cartões cujo campo contém term (já normalizado).
+
+        str.find percorre o texto unido em C e pula para o cartão seguinte a
+        cada ocorrência; se o termo se mostra frequente, o restante é testado
+        cartão a cartão, o que sai mais barato que uma busca por ocorrência.
+        """
+        text, starts = self.joined_text(field)
+        positions = []
+        limit = max(64, self.size // 16)
+        pos = text.find(term)
+        while pos != -1:
+            i = bisect.bisect_right(starts, pos) - 1
+            positions.append(i)
+            if len(positions) > limit:
+                parts = self.text(field)
+                positions.extend([j for j, part in enumerate(parts[i + 1:], i + 1) if term in part])
+                break
+            # Próximo cartão: uma ocorrência por cartão basta
+            pos = text.find(term, starts[i + 1]) if i + 1 < len(starts) else -1
+        return positions_bitmap(positions, self.size)
+
+    def owners(self):
+        """Lista posição -> nome do baralho (None se o cartão não está em nenhum)"""
+        if self._owners is None:
+            self._owners = [None] * self.size
+            for deck_name, deck_cards in self._decks.items():
+                for i in deck_cards:
+                    self._owners[i] = deck_name
+        return self._owners
+
+    def decks(self):
+        """Baralhos indexados"""
+        return [key[1] for key in self._buffers if key[0] == "deck"]
+
+    def due_key(self, i):
+        """Próxima revisão indexada do cartão na posição i ("" se nunca agendado)"""
+        return self._due_keys[i]
+
+    def tags(self):
+        """Tags em uso, em ordem alfabética"""
+        return sorted(key[1] for key, buffer in self._buffers.items()
+                      if key[0] == "tag" and any(buffer))
+
+    def query(self, deck_name=None, tags=(), due=None, suspended=False):
+        """Bitmap da interseção dos filtros informados.
+
+        tags: todas precisam estar presentes; due/suspended: True exige,
+        False exclui, None ignora.
+        """
+        result = self.all if deck_name is None else self.deck(deck_name)
+        for tag in tags:
+            result &= self.tag(tag)
+        if due is not None:
+            result = result & self.due() if due else result & ~self.due()
+        if suspended is not None:
+            result = result & self.suspended() if suspended else result & ~self.suspended()
+        return result & self.all
+
+    def day_load(self, day):
+        """Cartões não suspensos com próxima revisão no dia "AAAA-MM-DD".
+
+        A contagem por dia é montada na primeira consulta (uma passada pelas
+        chaves de vencimento), ou herdada do índice anterior se os
+        vencimentos e os suspensos não mudaram (ver DayLoads), e depois
+        mantida por update_card, então cada consulta do balanceamento (ver
+        scheduler.balanced_interval) é O(1).
+        """
+        loads = self._loads
+        if loads.due_keys is not self._due_keys:
+            suspended = self._buffers[("suspended",)]
+            # As listas comparadas guardam os mesmos textos: a comparação
+            # é feita em C, sem recortar as datas
+            if (loads.counts is None or loads.suspended != suspended
+                    or loads.due_keys != self._due_keys):
+                loads.days = [key[:10] if key and not suspended[i >> 3] >> (i & 7) & 1 else None
+                              for i, key in enumerate(self._due_keys)]
+                loads.counts = Counter(loads.days)
+            loads.due_keys = self._due_keys
+            loads.suspended = suspended
+        return loads.counts[day]
+
+    def _counting_days(self):
+        """Se a contagem por dia pertence a este índice (e deve ser mantida)"""
+        return self._loads.due_keys is self._due_keys
+
+    # ------------------------------------------------------------------
+    # Atualização incremental
+    # ------------------------------------------------------------------
+    def position(self, card):
+        """Posição de um cartão (o próprio dicionário) na lista indexada"""
+        if self._positions is None:
+            self._positions = {id(c): i for i, c in enumerate(self.flashcards)}
+        return self._positions.get(id(card))
+
+    def position_of_id(self, card_id):
+        """Posição do cartão com o id informado, ou None"""
+        if self._ids is None:
+            self._ids = {card["id"]: i for i, card in enumerate(self.flashcards)}
+        return self._ids.get(card_id)
+
+    def card_by_id(self, card_id):
+        """Cartão com o id informado, ou None"""
+        i = self.position_of_id(card_id)
+        return self.flashcards[i] if i is not None else None
+
+    def _resize(self, size):
+        """Ajusta os bitmaps a size cartões (os bits além do fim já estão
+        desligados)"""
+        nbytes = (size + 7) // 8
+        if nbytes != (self.size + 7) // 8:
+            for buffer in self._buffers.values():
+                if nbytes > len(buffer):
+                    buffer.extend(bytes(nbytes - len(buffer)))
+                else:
+                    del buffer[nbytes:]
+        self.size = size
+        self.all = (1 << size) - 1
+
+    def append_card(self, deck_name):
+        """Indexa o cartão anexado ao fim da lista (posição size), que está
+        em deck_name"""
+        i = self.size
+        card = self.flashcards[i]
+        self._resize(i + 1)
+        self._change(("deck", deck_name), i, True)
+        tags = tuple(card_tags(card))
+        if tags:
+            self._card_tags[i] = tags
+            for tag in tags:
+                self._change(("tag", tag), i, True)
+        suspended = bool(card.get("suspended"))
+        self._change(("suspended",), i, suspended)
+
+        key = card["next_review"] or ""
+        self._due_keys.append(key)
+        if key <= self._due_time:
+            self._change(("due",), i, True)
+        else:
+            heapq.heappush(self._pending, (key, i))
+        if self._counting_days():
+            day = key[:10] if key and not suspended else None
+            self._loads.days.append(day)
+            self._loads.counts[day] += 1
+
+        if self._positions is not None:
+            self._positions[id(card)] = i
+        if self._ids is not None:
+            self._ids[card["id"]] = i
+        if self._owners is not None:
+            self._owners.append(deck_name)
+        for field, values in self._columns.items():
+            value = card.get(field) or (0 if field in NUMERIC_FIELDS else "")
+            if np is not None:
+                self._columns[field] = np.append(values, np.array([value], values.dtype))
+            else:
+                values.append(value)
+        for field, parts in self._texts.items():
+            parts.append(SEARCH_KEYS.key(card[field], field))
+        self._joined.clear()
+        self._text_lookup.clear()
+
+    def remove_tail(self, count):
+        """Retira do índice os últimos count cartões (ainda na lista)"""
+        start = self.size - count
+        decks = [key for key in self._buffers if key[0] == "deck"]
+        for i in range(start, self.size):
+            card = self.flashcards[i]
+            for key in decks:
+                if self._buffers[key][i >> 3] >> (i & 7) & 1:
+                    self._change(key, i, False)
+            for tag in self._card_tags.pop(i, ()):
+                self._change(("tag", tag), i, False)
+            self._change(("suspended",), i, False)
+            self._change(("due",), i, False)   # entradas em _pending ficam obsoletas
+            if self._positions is not None:
+                self._positions.pop(id(card), None)
+            if self._ids is not None:
+                self._ids.pop(card["id"], None)
+        if self._counting_days():
+            for day in self._loads.days[start:]:
+                self._loads.counts[day] -= 1
+            del self._loads.days[start:]
+        del self._due_keys[start:]
+        if self._owners is not None:
+            del self._owners[start:]
+        for field, values in self._columns.items():
+            if np is not None:
+                self._columns[field] = values[:start]
+            else:
+                del values[start:]
+        for parts in self._texts.values():
+            del parts[start:]
+        self._joined.clear()
+        self._text_lookup.clear()
+        self._resize(start)
+
+    def swap_cards(self, i, j):
+        """Troca as posições i e j no índice (o chamador troca os cartões
+        na lista e nas listas dos baralhos); com remove_tail, retira um
+        cartão do meio da lista sem mudar a posição dos demais"""
+        for key, buffer in self._buffers.items():
+            bit_i = buffer[i >> 3] >> (i & 7) & 1
+            bit_j = buffer[j >> 3] >> (j & 7) & 1
+            if bit_i != bit_j:
+                self._change(key, i, bit_j)
+                self._change(key, j, bit_i)
+        tags_i = self._card_tags.pop(i, None)
+        tags_j = self._card_tags.pop(j, None)
+        if tags_j:
+            self._card_tags[i] = tags_j
+        if tags_i:
+            self._card_tags[j] = tags_i
+
+        sequences = [self._due_keys, *self._columns.values(), *self._texts.values()]
+        if self._counting_days():
+            sequences.append(self._loads.days)
+        if self._owners is not None:
+            sequences.append(self._owners)
+        for values in sequences:
+            values[i], values[j] = values[j], values[i]
+        for k in (i, j):
+            if self._due_keys[k] > self._due_time:
+                heapq.heappush(self._pending, (self._due_keys[k], k))
+
+        card_i, card_j = self.flashcards[i], self.flashcards[j]
+        if self._positions is not None:
+            self._positions[id(card_i)], self._positions[id(card_j)] = \
+                self._positions[id(card_j)], self._positions[id(card_i)]
+        if self._ids is not None:
+            self._ids[card_i["id"]], self._ids[card_j["id"]] = \
+                self._ids[card_j["id"]], self._ids[card_i["id"]]
+        self._joined.clear()
+        self._text_lookup.clear()
+
+    def move_card(self, i, old_deck, new_deck):
+        """O cartão na posição i passou de old_deck para new_deck"""
+        self._change(("deck", old_deck), i, False)
+        self._change(("deck", new_deck), i, True)
+        if self._owners is not None:
+            self._owners[i] = new_deck
+
+    def add_deck(self, deck_name):
+        """Baralho criado, ainda vazio"""
+        self._buffers.setdefault(("deck", deck_name), bytearray((self.size + 7) // 8))
+
+    def remove_deck(self, deck_name):
+        """Baralho excluído (seus cartões já saíram dele)"""
+        self._buffers.pop(("deck", deck_name), None)
+        self._ints.pop(("deck", deck_name), None)
+
+    def update_card(self, i):
+        """Reindexa tags, suspensão e pendência do cartão na posição i"""
+        card = self.flashcards[i]
+        tags = tuple(card_tags(card))
+        old_tags = self._card_tags.get(i, ())
+        if tags != old_tags:
+            for tag in set(old_tags) - set(tags):
+                self._change(("tag", tag), i, False)
+            for tag in set(tags) - set(old_tags):
+                self._change(("tag", tag), i, True)
+            if tags:
+                self._card_tags[i] = tags
+            else:
+                self._card_tags.pop(i, None)
+        self._change(("suspended",), i, bool(card.get("suspended")))
+
+        for field, values in self._columns.items():
+            values[i] = card.get(field) or (0 if field in NUMERIC_FIELDS else "")
+        for field, parts in self._texts.items():
+            text = SEARCH_KEYS.key(card[field], field)
+            if parts[i] != text:
+                parts[i] = text
+                self._joined.pop(field, None)   # texto editado: unido de novo na próxima busca
+                self._text_lookup.pop(field, None)
+
+        key = card["next_review"] or ""
+        if self._counting_days():
+            loads = self._loads
+            day = key[:10] if key and not card.get("suspended") else None
+            if day != loads.days[i]:
+                loads.counts[loads.days[i]] -= 1
+                loads.counts[day] += 1
+                loads.days[i] = day
+        if key != self._due_keys[i]:
+            self._due_keys[i] = key
+            if key <= self._due_time:
+                self._change(("due",), i, True)
+            else:
+                self._change(("due",), i, False)
+                heapq.heappush(self._pending, (key, i))
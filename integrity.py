@@ -0,0 +1,308 @@
+"""Verificação de integridade e compactação ("vacuum") da coleção.
+
+A pasta de dados é percorrida por inteiro, corrigida e regravada em forma
+canônica. São tratados:
+
+- entradas do manifesto inválidas, com nome repetido ou apontando para o
+  arquivo de outro baralho (fica a primeira);
+- baralhos cujo arquivo sumiu ou não pode ser lido (ficam vazios; um
+  arquivo ilegível é preservado com a extensão .corrompido) e totais do
+  manifesto que não batem com o arquivo;
+- o mesmo cartão (id) em mais de um baralho: fica a cópia alterada por
+  último; cartões sem id recebem um e next_card_id passa do maior id;
+- campos obrigatórios ausentes, preenchidos com os valores de um cartão novo;
+- arquivos de baralho que o manifesto não cita (restos de uma gravação
+  interrompida): os que têm cartões voltam como "<nome> (recuperado)", os
+  vazios e os .tmp são apagados.
+
+Os baralhos são regravados compactos, sem mudar os nomes dos arquivos (eles
+identificam os baralhos no merge entre processos), e o manifesto recebe a
+versão do esquema (storage.SCHEMA_VERSION). Uma pasta com a versão atual não
+é verificada de novo ao abrir, e o resto do código conta com essas regras
+sem testá-las a cada uso.
+
+Snapshots (backups e o arquivo único antigo) guardam os baralhos como listas
+de posições; canonical_decks corrige posições inválidas ou repetidas,
+cartões em mais de um baralho e órfãos (que vão para "Geral").
+
+Uso avulso:
+    python integrity.py [--data flashcards_data] [--check]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+from cards import assign_card_ids, new_card, touch_card
+from storage import SCHEMA_VERSION, DeckStore, load_deck_file
+
+RECOVERED_SUFFIX = " (recuperado)"
+CORRUPT_SUFFIX = ".corrompido"
+DECK_FILE_RE = re.compile(r"deck_(\d+)\.json")
+
+PROBLEMS = {
+    "bad_entry": "Entradas inválidas no manifesto",
+    "duplicate_deck": "Baralhos com nome repetido",
+    "shared_file": "Baralhos apontando para o arquivo de outro",
+    "missing_file": "Arquivos de baralho ausentes",
+    "corrupt_file": "Arquivos de baralho ilegíveis",
+    "wrong_count": "Totais do manifesto incorretos",
+    "dangling_ref": "Referências a cartões inexistentes",
+    "duplicate_ref": "Referências repetidas no mesmo baralho",
+    "multi_deck": "Cartões em mais de um baralho",
+    "orphan_card": "Cartões sem baralho",
+    "missing_id": "Cartões sem id",
+    "missing_field": "Cartões com campos ausentes",
+    "orphan_file": "Arquivos de baralho recuperados",
+    "stale_file": "Arquivos temporários ou sem uso removidos",
+}
+
+
+class IntegrityReport:
+    """Contagem dos problemas encontrados (e corrigidos)"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.cards = 0
+        self.decks = 0
+
+    def add(self, kind, n=1):
+        if n:
+            self.counts[kind] += n
+
+    @property
+    def problems(self):
+        return sum(self.counts.values())
+
+    def format(self):
+        lines = [f"{self.decks} baralho(s), {self.cards} cartão(ões) verificados."]
+        if not self.problems:
+            lines.append("Nenhum problema encontrado.")
+        for kind, label in PROBLEMS.items():
+            if self.counts[kind]:
+                lines.append(f"• {label}: {self.counts[kind]}")
+        return "\n".join(lines)
+
+
+def repair_card(card, defaults, report):
+    """Preenche os campos ausentes de um cartão; True se algo mudou"""
+    missing = [key for key in defaults if key not in card]
+    if not missing:
+        return False
+    for key in missing:
+        card[key] = defaults[key]
+    touch_card(card)
+    report.add("missing_field")
+    return True
+
+
+def _defaults():
+    card = new_card("", "")
+    del card["mod"]
+    return card
+
+
+def canonical_decks(flashcards, decks, report=None):
+    """Baralhos de um snapshot em forma canônica: só posições válidas, sem
+    repetição, cada cartão em um único baralho (o primeiro que o cita) e os
+    órfãos em "Geral". Retorna (baralhos, relatório); os cartões sem algum
+    campo obrigatório são completados no lugar."""
+    if report is None:
+        report = IntegrityReport()
+    size = len(flashcards)
+    owner = [None] * size
+    result = {}
+    for deck_name, positions in decks.items():
+        kept = []
+        for i in positions:
+            if type(i) is not int or not 0 <= i < size:
+                report.add("dangling_ref")
+            elif owner[i] is not None:
+                report.add("duplicate_ref" if owner[i] == deck_name else "multi_deck")
+            else:
+                owner[i] = deck_name
+                kept.append(i)
+        result[deck_name] = kept
+    orphans = [i for i, deck_name in enumerate(owner) if deck_name is None]
+    result.setdefault("Geral", []).extend(orphans)
+    report.add("orphan_card", len(orphans))
+
+    defaults = _defaults()
+    for card in flashcards:
+        repair_card(card, defaults, report)
+    report.cards = size
+    report.decks = len(result)
+    return result, report
+
+
+def _read_entries(store, report):
+    """Manifesto e suas entradas válidas: (manifesto, [(nome, arquivo ou
+    None, total)]). O JSON é lido diretamente: read_manifest descartaria as
+    entradas repetidas e falharia nas inválidas."""
+    with open(store.manifest_path, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    entries = []
+    names = set()
+    files = set()
+    for entry in manifest.get("decks", []):
+        name = entry.get("name") if isinstance(entry, dict) else None
+        file_name = entry.get("file") if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not isinstance(file_name, str):
+            report.add("bad_entry")
+            continue
+        if name in names:
+            report.add("duplicate_deck")
+            continue
+        if file_name in files:
+            report.add("shared_file")
+            file_name = None   # baralho vazio; ganha um arquivo novo ao gravar
+        names.add(name)
+        files.add(file_name)
+        entries.append((name, file_name, entry.get("count", 0)))
+    return manifest, entries
+
+
+def _load(path, count, report):
+    """Cartões de um arquivo de baralho e, se ele é ilegível, seu caminho
+    (para ser preservado em vez de sobrescrito)"""
+    if not os.path.exists(path):
+        if count:   # um baralho criado vazio e nunca gravado não tem arquivo
+            report.add("missing_file")
+        return [], None
+    try:
+        cards = load_deck_file(path)
+        if not isinstance(cards, list) or not all(isinstance(card, dict) for card in cards):
+            raise ValueError("formato inválido")
+    except (ValueError, AttributeError):
+        report.add("corrupt_file")
+        return [], path
+    return cards, None
+
+
+def _orphan_cards(path):
+    """(nome, cartões) de um arquivo de baralho fora do manifesto"""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        cards = data.get("cards", [])
+        if isinstance(cards, list) and all(isinstance(card, dict) for card in cards):
+            return data.get("name"), cards
+    except (ValueError, AttributeError):
+        pass
+    return None, []
+
+
+def vacuum(store, check_only=False, progress=None):
+    """Verifica e, a menos que check_only, regrava a coleção de store em
+    forma canônica. progress(feitos, total, mensagem) é chamado a cada
+    baralho. Deve rodar sem outra gravação do mesmo processo em andamento
+    (o lock da pasta protege contra os outros processos)."""
+    report = IntegrityReport()
+    if not store.exists():
+        return report
+    with store.lock():
+        manifest, entries = _read_entries(store, report)
+        settings = manifest.get("settings", {})
+        store.version = manifest.get("version", 0)
+        store.file_versions = {entry["file"]: entry.get("version", 0)
+                               for entry in manifest.get("decks", [])
+                               if isinstance(entry, dict) and isinstance(entry.get("file"), str)}
+        # Nenhum arquivo é apagado por store.save: os que ficarem fora do
+        # manifesto são tratados abaixo, como órfãos
+        store.disk_files = {}
+        store._next_file_id = manifest.get("next_file_id", 1)
+        decks = {}
+        corrupt = []
+        for n, (name, file_name, count) in enumerate(entries):
+            if progress is not None:
+                progress(n, len(entries), name)
+            cards = []
+            if file_name is not None:
+                cards, bad = _load(os.path.join(store.decks_path, file_name), count, report)
+                if bad is not None:
+                    corrupt.append(bad)
+            if count != len(cards):
+                report.add("wrong_count")
+            decks[name] = (file_name, cards)
+
+        # Arquivos que o manifesto não cita (inclusive os de entradas repetidas)
+        in_use = {file_name for file_name, _ in decks.values() if file_name}
+        stale = [path for path in (store.manifest_path + ".tmp",) if os.path.exists(path)]
+        last_number = 0
+        if os.path.isdir(store.decks_path):
+            for file_name in sorted(os.listdir(store.decks_path)):
+                path = os.path.join(store.decks_path, file_name)
+                match = DECK_FILE_RE.fullmatch(file_name)
+                if match:
+                    last_number = max(last_number, int(match.group(1)))
+                if file_name in in_use or file_name.endswith(CORRUPT_SUFFIX):
+                    continue
+                deck_name, cards = _orphan_cards(path) if file_name.endswith(".json") else (None, [])
+                if not cards:
+                    stale.append(path)
+                    continue
+                name = f"{deck_name or file_name}{RECOVERED_SUFFIX}"
+                while name in decks:
+                    name += RECOVERED_SUFFIX
+                decks[name] = (file_name, cards)
+                report.add("orphan_file")
+        report.add("stale_file", len(stale))
+
+        # Cada id em um único baralho: fica a cópia alterada por último
+        defaults = _defaults()
+        best = {}
+        for name, (_, cards) in decks.items():
+            for card in cards:
+                repair_card(card, defaults, report)
+                if "id" not in card:
+                    continue
+                other = best.get(card["id"])
+                if other is None or card.get("mod", 0) > other.get("mod", 0):
+                    best[card["id"]] = card
+        next_id = settings.get("next_card_id", 1)
+        for name, (file_name, cards) in decks.items():
+            kept = [card for card in cards if "id" not in card or best[card["id"]] is card]
+            report.add("multi_deck", len(cards) - len(kept))
+            report.add("missing_id", sum("id" not in card for card in kept))
+            next_id = assign_card_ids(kept, next_id)
+            decks[name] = (file_name, kept)
+        settings["next_card_id"] = next_id
+        report.decks = len(decks)
+        report.cards = sum(len(cards) for _, cards in decks.values())
+        if check_only:
+            return report
+
+        for path in corrupt:
+            os.replace(path, path + CORRUPT_SUFFIX)
+        # Antes de gravar: um arquivo novo pode reutilizar o nome de um
+        # arquivo vazio deixado por uma gravação interrompida
+        for path in stale:
+            os.remove(path)
+        store.deck_files = {name: file_name for name, (file_name, _) in decks.items() if file_name}
+        store._next_file_id = max(store._next_file_id, last_number + 1)
+        store.schema = SCHEMA_VERSION
+        store.save(settings, {name: len(cards) for name, (_, cards) in decks.items()},
+                   {name: cards for name, (_, cards) in decks.items()})
+        if progress is not None:
+            progress(len(entries), len(entries), None)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica e compacta a pasta de dados do Pycard")
+    parser.add_argument("--data", default="flashcards_data", help="pasta de dados")
+    parser.add_argument("--check", action="store_true", help="só verificar, sem gravar")
+    args = parser.parse_args(argv)
+    store = DeckStore(args.data)
+    if not store.exists():
+        print(f"Pasta de dados não encontrada: {args.data}", file=sys.stderr)
+        return 1
+    report = vacuum(store, check_only=args.check)
+    print(report.format())
+    return 1 if args.check and report.problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""Tarefas demoradas fora da thread do Tk.
+
+As tarefas rodam em um pool de threads (ou, com serial=True, em uma fila de
+uma única thread, na ordem de envio, usada para as gravações em disco). A
+thread do Tk nunca espera por elas: progresso, resultado e erros entram em
+uma fila que é esvaziada por root.after a cada POLL_MS enquanto houver
+tarefas ativas, e os callbacks rodam na thread do Tk, onde podem mexer na
+interface e na coleção. O trabalho pesado que usa vários núcleos (a
+importação de arquivos) continua usando seus próprios processos; a tarefa
+apenas espera por eles fora da thread do Tk.
+
+A função da tarefa recebe um JobContext como primeiro argumento, com o qual
+informa o progresso e verifica o cancelamento (cooperativo: a função
+consulta context.cancelled ou chama context.check() entre lotes).
+
+Sem root (scripts, testes), as tarefas rodam na hora, na própria thread.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_MS = 50
+# Intervalo mínimo entre dois avisos de progresso de uma tarefa
+PROGRESS_INTERVAL = 0.1
+
+
+class JobCancelled(Exception):
+    """Lançada por JobContext.check() quando a tarefa foi cancelada"""
+
+
+class Job:
+    """Estado de uma tarefa, lido pela interface (barra de status)"""
+
+    def __init__(self, title, cancellable):
+        self.title = title
+        self.cancellable = cancellable
+        self.state = "running"     # running, done, error, cancelled
+        self.done = 0
+        self.total = None
+        self.message = ""
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def running(self):
+        return self.state == "running"
+
+    @property
+    def fraction(self):
+        """Fração concluída (0 a 1) ou None se o total é desconhecido"""
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+
+    def cancel(self):
+        if self.cancellable:
+            self._cancel.set()
+
+
+class JobContext:
+    """Passado à função da tarefa"""
+
+    def __init__(self, job, events):
+        self._job = job
+        self._events = events
+        self._last_progress = 0.0
+
+    @property
+    def cancelled(self):
+        return self._job._cancel.is_set()
+
+    def check(self):
+        if self._job._cancel.is_set():
+            raise JobCancelled()
+
+    def progress(self, done, total=None, message=None):
+        """Informa o progresso (os avisos são espaçados por PROGRESS_INTERVAL)"""
+        now = time.monotonic()
+        if now - self._last_progress < PROGRESS_INTERVAL and (total is None or done < total):
+            return
+        self._last_progress = now
+        self._events.put(("progress", self._job, (done, total, message)))
+
+
+class JobRunner:
+    """Executa tarefas e entrega seus eventos na thread do Tk.
+
+    on_change(): chamado (na thread do Tk) quando tarefas começam, avançam
+    ou terminam, para atualizar a barra de status; report_error(job, erro):
+    usado para tarefas enviadas sem on_error.
+    """
+
+    def __init__(self, root, on_change=None, report_error=None, max_workers=2):
+        self.root = root
+        self.on_change = on_change
+        self.report_error = report_error
+        self.max_workers = max_workers
+        self.active = []
+        self._events = queue.Queue()
+        self._callbacks = {}    # job -> (on_done, on_error, on_cancel)
+        self._pool = None
+        self._serial = None
+        self._polling = False
+
+    def submit(self, title, func, *args, on_done=None, on_error=None, on_cancel=None,
+               serial=False, cancellable=True):
+        """Agenda func(context, *args); on_done(resultado), on_error(exceção)
+        e on_cancel() rodam na thread do Tk. Retorna o Job."""
+        job = Job(title, cancellable)
+        context = JobContext(job, self._events)
+        self._callbacks[job] = (on_done, on_error, on_cancel)
+        self.active.append(job)
+        if self.root is None:
+            self._run(job, context, func, args)
+            self._dispatch()
+            return job
+        if serial:
+            if self._serial is None:
+                self._serial = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-serial")
+            executor = self._serial
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="job")
+            executor = self._pool
+        executor.submit(self._run, job, context, func, args)
+        self._changed()
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._poll)
+        return job
+
+    def _run(self, job, context, func, args):
+        try:
+            result = func(context, *args)
+        except JobCancelled:
+            self._events.put(("cancelled", job, None))
+        except BaseException as e:
+            self._events.put(("error", job, e))
+        else:
+            self._events.put(("done", job, result))
+        finally:
+            job._finished.set()
+
+    def _poll(self):
+        self._dispatch()
+        if self.active:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _dispatch(self):
+        """Aplica os eventos pendentes e chama os callbacks"""
+        changed = False
+        while True:
+            try:
+                kind, job, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if kind == "progress":
+                job.done, total, message = value
+                if total is not None:
+                    job.total = total
+                if message is not None:
+                    job.message = message
+                continue
+            self.active.remove(job)
+            on_done, on_error, on_cancel = self._callbacks.pop(job)
+            if kind == "done":
+                job.state, job.result = "done", value
+                if on_done is not None:
+                    on_done(value)
+            elif kind == "cancelled":
+                job.state = "cancelled"
+                if on_cancel is not None:
+                    on_cancel()
+            else:
+                job.state, job.error = "error", value
+                if on_error is not None:
+                    on_error(value)
+                elif self.report_error is not None:
+                    self.report_error(job, value)
+        if changed:
+            self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def wait(self, job):
+        """Bloqueia até a tarefa terminar e executa seus callbacks (para os
+        poucos pontos que precisam do resultado na hora, como ao fechar)"""
+        if job is None:
+            return
+        job._finished.wait()
+        self._dispatch()
+
+    def shutdown(self):
+        """Cancela as tarefas em andamento e encerra as threads"""
+        for job in self.active:
+            job.cancel()
+        for executor in (self._pool, self._serial):
+            if executor is not None:
+                executor.shutdown(wait=False)
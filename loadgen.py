@@ -0,0 +1,216 @@
+"""Gerador de carga para o servidor de revisão (server.py).
+
+Simula milhares de alunos revisando ao mesmo tempo: cada aluno pede a fila
+de pendentes, busca cada cartão e envia a avaliação. Os pedidos de todos os
+alunos compartilham um conjunto de conexões keep-alive. Ao final mostra
+vazão e latências (p50/p95/p99).
+
+Uso com um servidor já rodando:
+    python loadgen.py --url http://127.0.0.1:8765 --users 3000 --duration 30
+
+Demonstração completa em uma máquina (cria uma coleção sintética em uma
+pasta temporária e inicia o servidor em outro processo):
+    python loadgen.py --demo --users 3000 --cards 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from cards import new_card
+from storage import DeckStore
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, method, path, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: pycard\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            .encode("latin-1") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("conexão encerrada pelo servidor")
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(data) if data else None
+
+
+class LoadGenerator:
+    def __init__(self, host, port, users, connections, duration, think_time):
+        self.host = host
+        self.port = port
+        self.users = users
+        self.connections = connections
+        self.duration = duration
+        self.think_time = think_time
+        self.latencies = []
+        self.errors = 0
+        self.pool = asyncio.Queue()
+
+    async def call(self, method, path, payload=None):
+        conn = await self.pool.get()
+        start = time.perf_counter()
+        try:
+            status, data = await conn.request(method, path, payload)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            self.errors += 1
+            conn.writer.close()
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            conn = Connection(reader, writer)
+            return None
+        finally:
+            self.pool.put_nowait(conn)
+        self.latencies.append(time.perf_counter() - start)
+        if status != 200:
+            self.errors += 1
+            return None
+        return data
+
+    async def simulate_user(self, number, deadline):
+        learner = f"aluno{number}"
+        # Espalhar o início para não gerar uma rajada artificial
+        await asyncio.sleep(random.uniform(0, min(2.0, self.duration / 4)))
+        while time.monotonic() < deadline:
+            due = await self.call("GET", f"/api/learners/{learner}/due?limit=5")
+            if not due or not due["due"]:
+                await asyncio.sleep(self.think_time)
+                continue
+            for card_id in due["due"]:
+                if time.monotonic() >= deadline:
+                    return
+                await self.call("GET", f"/api/cards/{card_id}")
+                await asyncio.sleep(random.uniform(0, 2 * self.think_time))
+                quality = random.choices((0, 1, 2, 3), weights=(1, 2, 4, 3))[0]
+                await self.call("POST", f"/api/learners/{learner}/answers",
+                                {"card_id": card_id, "quality": quality,
+                                 "answer_ms": random.randint(800, 8000)})
+
+    async def run(self):
+        for _ in range(self.connections):
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self.pool.put_nowait(Connection(reader, writer))
+
+        start = time.monotonic()
+        deadline = start + self.duration
+        await asyncio.gather(*(self.simulate_user(i, deadline) for i in range(self.users)))
+        elapsed = time.monotonic() - start
+
+        while not self.pool.empty():
+            self.pool.get_nowait().writer.close()
+        return elapsed
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            print("Nenhuma requisição concluída.")
+            return
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+        print(f"Alunos simulados:   {self.users}")
+        print(f"Conexões:           {self.connections}")
+        print(f"Requisições:        {len(latencies)} em {elapsed:.1f}s "
+              f"({len(latencies) / elapsed:.0f}/s)")
+        print(f"Erros:              {self.errors}")
+        print(f"Latência p50:       {percentile(50):.2f} ms")
+        print(f"Latência p95:       {percentile(95):.2f} ms")
+        print(f"Latência p99:       {percentile(99):.2f} ms")
+        print(f"Latência máxima:    {latencies[-1] * 1000:.2f} ms")
+
+
+def create_demo_collection(directory, card_count, deck_count=5):
+    """Cria uma coleção sintética para a demonstração"""
+    store = DeckStore(directory)
+    per_deck = card_count // deck_count
+    next_id = 1
+    decks = {}
+    for d in range(deck_count):
+        cards = []
+        for _ in range(per_deck):
+            card = new_card(f"Pergunta {next_id}", f"Resposta {next_id}")
+            card["id"] = next_id
+            next_id += 1
+            cards.append(card)
+        decks["Geral" if d == 0 else f"Baralho {d}"] = cards
+    settings = {"theme": "claro", "font_size": 12, "next_card_id": next_id,
+                "scheduler_params": {}}
+    store.save(settings, {name: len(cards) for name, cards in decks.items()}, decks)
+
+
+async def wait_for_port(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga do servidor PyCard")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos de teste")
+    parser.add_argument("--think-time", type=float, default=0.5,
+                        help="tempo médio (s) que o aluno leva para responder")
+    parser.add_argument("--demo", action="store_true",
+                        help="criar coleção sintética e iniciar o servidor automaticamente")
+    parser.add_argument("--cards", type=int, default=20000, help="cartões da coleção sintética")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+
+    server_process = None
+    if args.demo:
+        workdir = tempfile.mkdtemp(prefix="pycard_demo_")
+        data_dir = os.path.join(workdir, "flashcards_data")
+        create_demo_collection(data_dir, args.cards)
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        server_process = subprocess.Popen([
+            sys.executable, server_path, "--data", data_dir,
+            "--state", os.path.join(workdir, "server_state"),
+            "--host", host, "--port", str(port)])
+
+    try:
+        if server_process is not None:
+            asyncio.run(wait_for_port(host, port))
+        generator = LoadGenerator(host, port, args.users, args.connections,
+                                  args.duration, args.think_time)
+        elapsed = asyncio.run(generator.run())
+        generator.report(elapsed)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+
+if __name__ == "__main__":
+    main()
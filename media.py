@@ -0,0 +1,227 @@
+"""Imagens dos cartões, guardadas pelo hash do conteúdo.
+
+Cada imagem é gravada uma única vez em media/<2 primeiros dígitos>/<sha256>
+<extensão>; arquivos idênticos (o mesmo diagrama em mil cartões) ocupam o
+espaço de um. O cartão guarda só o nome, nos campos opcionais
+"front_image" e "back_image".
+
+Nada é lido na inicialização. As imagens são decodificadas quando a revisão
+exibe o cartão e ficam em um cache LRU de PhotoImage com tamanho limitado;
+as do próximo cartão são lidas (e, com o Pillow, decodificadas e reduzidas)
+antecipadamente em uma thread auxiliar, e a PhotoImage é criada na thread do
+Tk quando o cartão aparece. A lista de cartões usa miniaturas, gravadas em
+media/.thumbs na primeira vez e depois lidas prontas, com um cache próprio.
+
+O Pillow é opcional: sem ele são aceitos os formatos que o Tk lê sozinho
+(PNG, GIF, PPM/PGM) e a redução é feita com PhotoImage.subsample.
+"""
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageTk
+except ImportError:  # sem Pillow, só os formatos nativos do Tk
+    Image = None
+
+MEDIA_DIR = "media"
+THUMBS_DIR = ".thumbs"
+IMAGE_FIELDS = ("front_image", "back_image")
+NATIVE_EXTENSIONS = (".png", ".gif", ".ppm", ".pgm")
+PILLOW_EXTENSIONS = NATIVE_EXTENSIONS + (".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+
+REVIEW_BOX = (480, 220)     # tamanho máximo na revisão (pixels)
+THUMB_SIZE = 96
+IMAGE_CACHE_SIZE = 32       # PhotoImages decodificadas mantidas na memória
+THUMB_CACHE_SIZE = 256
+PREFETCH_LIMIT = 8          # imagens lidas antecipadamente à espera de uso
+HASH_CHUNK = 1 << 20
+
+
+def supported_extensions():
+    return PILLOW_EXTENSIONS if Image is not None else NATIVE_EXTENSIONS
+
+
+def card_images(card):
+    """Nomes das imagens referenciadas por um cartão"""
+    return [card[field] for field in IMAGE_FIELDS if card.get(field)]
+
+
+class MediaStore:
+    """Pasta de mídia endereçada pelo conteúdo"""
+
+    def __init__(self, directory=MEDIA_DIR):
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def thumb_path(self, name, size):
+        stem = os.path.splitext(name)[0]
+        return os.path.join(self.directory, THUMBS_DIR, f"{stem}_{size}.png")
+
+    def add(self, source):
+        """Copia um arquivo para a pasta (se ainda não estiver lá) e retorna
+        seu nome. O hash é calculado lendo o arquivo em blocos."""
+        extension = os.path.splitext(source)[1].lower()
+        if extension not in supported_extensions():
+            raise ValueError(f"Formato de imagem não suportado: {extension or source}")
+        digest = hashlib.sha256()
+        with open(source, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        name = digest.hexdigest() + (".jpg" if extension == ".jpeg" else extension)
+        target = self.path(name)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Cópia para um temporário na mesma pasta e troca atômica: um
+            # arquivo com nome de hash nunca fica incompleto
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out, open(source, "rb") as file:
+                    shutil.copyfileobj(file, out, HASH_CHUNK)
+                os.replace(tmp, target)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        return name
+
+
+def _fit(width, height, box):
+    """Fator inteiro de redução para caber em box (1 = tamanho original)"""
+    return max(1, -(-width // box[0]), -(-height // box[1]))
+
+
+def _decode(path, box):
+    """Parte da carga que pode rodar fora da thread do Tk: com Pillow,
+    decodifica e reduz; sem ele, apenas lê os bytes do arquivo"""
+    if Image is not None:
+        with Image.open(path) as image:
+            image.draft("RGB", box)   # JPEG: decodifica já reduzido
+            image.thumbnail(box)
+            image.load()
+            return image.copy() if image.mode in ("RGB", "RGBA", "L") else image.convert("RGBA")
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def _photo(decoded, box):
+    """Cria a PhotoImage (na thread do Tk)"""
+    if Image is not None:
+        return ImageTk.PhotoImage(decoded)
+    photo = tk.PhotoImage(data=base64.b64encode(decoded))
+    factor = _fit(photo.width(), photo.height(), box)
+    return photo.subsample(factor) if factor > 1 else photo
+
+
+class _LRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ImageCache:
+    """PhotoImages das imagens dos cartões, criadas sob demanda.
+
+    get e thumbnail devem ser chamados na thread do Tk; prefetch só agenda
+    a leitura em uma thread auxiliar. Imagens ausentes ou ilegíveis
+    retornam None (o cartão é exibido só com o texto).
+    """
+
+    def __init__(self, store, maxsize=IMAGE_CACHE_SIZE, thumb_maxsize=THUMB_CACHE_SIZE):
+        self.store = store
+        self._images = _LRU(maxsize)
+        self._thumbs = _LRU(thumb_maxsize)
+        self._pending = OrderedDict()     # (nome, box) -> future
+        self._executor = None
+
+    def prefetch(self, names, box=REVIEW_BOX):
+        """Lê antecipadamente as imagens que serão exibidas em seguida"""
+        for name in names:
+            key = (name, box)
+            if self._images.get(key) is not None or key in self._pending:
+                continue
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media")
+            self._pending[key] = self._executor.submit(_decode, self.store.path(name), box)
+            while len(self._pending) > PREFETCH_LIMIT:
+                self._pending.popitem(last=False)[1].cancel()
+
+    def get(self, name, box=REVIEW_BOX):
+        key = (name, box)
+        photo = self._images.get(key)
+        if photo is not None:
+            return photo
+        future = self._pending.pop(key, None)
+        try:
+            # Leitura antecipada: normalmente já concluída quando o cartão aparece
+            decoded = future.result() if future is not None else _decode(self.store.path(name), box)
+            photo = _photo(decoded, box)
+        except Exception:
+            return None
+        self._images.put(key, photo)
+        return photo
+
+    def thumbnail(self, name, size=THUMB_SIZE):
+        """Miniatura para a lista; gerada uma vez e guardada em disco"""
+        key = (name, size)
+        photo = self._thumbs.get(key)
+        if photo is not None:
+            return photo
+        thumb_path = self.store.thumb_path(name, size)
+        try:
+            if not os.path.exists(thumb_path):
+                self._write_thumbnail(name, size, thumb_path)
+            photo = _photo(_decode(thumb_path, (size, size)), (size, size))
+        except Exception:
+            return None
+        self._thumbs.put(key, photo)
+        return photo
+
+    def _write_thumbnail(self, name, size, thumb_path):
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        tmp = thumb_path + ".tmp"
+        if Image is not None:
+            _decode(self.store.path(name), (size, size)).save(tmp, format="PNG")
+        else:
+            _photo(_decode(self.store.path(name), (size, size)), (size, size)).write(tmp, format="png")
+        os.replace(tmp, thumb_path)
+
+    def clear(self):
+        self._images.clear()
+        self._thumbs.clear()
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+    def shutdown(self):
+        self.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
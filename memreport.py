@@ -0,0 +1,356 @@
+"""Relatório de uso de memória da coleção e da interface.
+
+Mostra para onde vai a memória de uma sessão longa, separada por origem:
+
+- cartões: os dicionários em si e os textos (frente, verso, datas, tags);
+- listas de índices dos baralhos e estruturas auxiliares (índice em
+  bitmap, baralhos filtrados, carimbos de gravação);
+- widgets do Tk: os vivos, por classe, e os já destruídos que continuam
+  referenciados pelo Python (sobras de clear_frame), além dos comandos Tcl
+  registrados e das imagens (PhotoImage) ainda existentes;
+- figuras do matplotlib vivas e PNG/imagem dos gráficos das estatísticas.
+
+Os tamanhos vêm de percursos com sys.getsizeof; a alocação por linha de
+código vem de instantâneos do tracemalloc, que só enxerga o que foi alocado
+depois de ligado (com PYCARD_TRACEMALLOC=1 ou python -X tracemalloc ele é
+ligado na inicialização). Marcando um ponto da sessão, os relatórios
+seguintes mostram o crescimento desde a marca. Ligado, o tracemalloc deixa
+o programa mais lento e agrupar suas alocações leva alguns segundos em
+coleções grandes; por isso ele só é ligado quando pedido e a medição roda
+em uma tarefa em segundo plano.
+
+Uso avulso, para medir uma pasta de dados sem abrir a interface:
+    python memreport.py [--data flashcards_data]
+"""
+import argparse
+import gc
+import itertools
+import os
+import sys
+import time
+import tkinter
+import tracemalloc
+from collections import Counter
+
+from charts import Figure
+
+TOP_LINES = 10
+TRACE_FRAMES = 1
+
+# Objetos compartilhados pelo interpretador (não pertencem a nenhum cartão)
+_SHARED = (type(None), bool)
+_SMALL_INTS = range(-5, 257)
+# Referências que não são "conteúdo" de uma estrutura
+_OPAQUE = (type, type(sys), type(len), type(lambda: None)) + _SHARED
+
+# Categorias, na ordem do relatório
+CATEGORIES = (
+    ("card_dicts", "Dicionários dos cartões"),
+    ("card_text", "Textos dos cartões"),
+    ("card_values", "Números e listas dos cartões"),
+    ("deck_lists", "Listas de índices dos baralhos"),
+    ("indexes", "Índices e estruturas auxiliares"),
+    ("widgets", "Widgets destruídos ainda referenciados"),
+    ("charts", "Gráficos (PNG e figuras)"),
+)
+
+
+def format_bytes(size):
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{sign}{size:.0f} {unit}" if unit == "B" else f"{sign}{size:.1f} {unit}"
+        size /= 1024
+    return f"{sign}{size:.2f} GB"
+
+
+def _value_size(value):
+    """Bytes de um valor de cartão que pertencem só a ele"""
+    if isinstance(value, _SHARED) or (type(value) is int and value in _SMALL_INTS):
+        return 0
+    return sys.getsizeof(value)
+
+
+def card_sizes(flashcards):
+    """(dicionários, textos, demais valores) em bytes.
+
+    As chaves não entram na conta: são as mesmas strings em todos os
+    cartões. Um valor presente em dois cartões (raro) é contado nos dois.
+    A soma é feita campo a campo com sum(map(...)), que acumula em C: um
+    laço em Python criaria um inteiro novo a cada soma, o que fica muito
+    lento com o tracemalloc ligado.
+    """
+    getsizeof = sys.getsizeof
+    dicts = sum(map(getsizeof, flashcards))
+    text = other = 0
+    for field in set(itertools.chain.from_iterable(map(dict.keys, flashcards))):
+        column = [card.get(field) for card in flashcards]
+        text += sum(map(getsizeof, [value for value in column if type(value) is str]))
+        lists = [value for value in column if type(value) is list]
+        other += sum(map(getsizeof, lists))
+        text += sum(map(getsizeof, itertools.chain.from_iterable(lists)))
+        other += sum(map(_value_size, [value for value in column
+                                       if type(value) is not str and type(value) is not list]))
+    return dicts, text, other
+
+
+def deck_list_sizes(decks):
+    """Bytes das listas de índices dos baralhos (listas + inteiros)"""
+    getsizeof = sys.getsizeof
+    total = getsizeof(decks)
+    for deck_cards in decks.values():
+        total += getsizeof(deck_cards)
+        total += sum(map(_value_size, deck_cards))
+    return total
+
+
+def deep_sizeof(obj, seen, skip_str=False):
+    """Soma sys.getsizeof de obj e de tudo o que ele referencia.
+
+    seen: ids já contados (e de objetos a não percorrer, como a lista de
+    cartões, contada à parte). Com skip_str as strings são ignoradas: nas
+    estruturas auxiliares elas são, em geral, as mesmas dos cartões.
+    """
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _OPAQUE):
+            continue
+        if skip_str and type(obj) is str:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return total
+
+
+def widget_tree(root):
+    """Widgets vivos a partir da raiz (pelos dicionários children do tkinter)"""
+    widgets = []
+    stack = [root]
+    while stack:
+        widget = stack.pop()
+        widgets.append(widget)
+        stack.extend(widget.children.values())
+    return widgets
+
+
+def tk_report(root):
+    """Estado do Tk; deve rodar na thread do Tk"""
+    widgets = widget_tree(root)
+    image_bytes = 0
+    images = root.image_names()
+    for name in images:
+        try:
+            width = int(root.tk.call("image", "width", name))
+            height = int(root.tk.call("image", "height", name))
+        except tkinter.TclError:
+            continue
+        image_bytes += width * height * 4
+    return {
+        "live_ids": {id(widget) for widget in widgets},
+        "live_classes": Counter(type(widget).__name__ for widget in widgets),
+        "callbacks": sum(len(getattr(widget, "_tclCommands", None) or ()) for widget in widgets),
+        "images": len(images),
+        "image_bytes": image_bytes,
+    }
+
+
+def _gc_objects(live_widget_ids):
+    """Widgets fora da árvore e figuras do matplotlib ainda vivos"""
+    orphans = Counter()
+    orphan_bytes = 0
+    figures = []
+    for obj in gc.get_objects():
+        if isinstance(obj, tkinter.Misc):
+            if id(obj) not in live_widget_ids and not isinstance(obj, tkinter.Tk):
+                orphans[type(obj).__name__] += 1
+                orphan_bytes += sys.getsizeof(obj) + sys.getsizeof(obj.__dict__)
+        elif Figure is not None and isinstance(obj, Figure):
+            figures.append(obj)
+    return orphans, orphan_bytes, figures
+
+
+def resident_memory():
+    """Memória residente do processo em bytes (None fora do Linux)"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def measure(flashcards, decks, extras=(), tk_state=None, chart_png=None):
+    """Mede a coleção e a interface; retorna um dicionário de medidas.
+
+    extras: estruturas auxiliares (índice, baralhos filtrados...), medidas
+    sem as strings e sem descer na lista de cartões. tk_state: resultado
+    de tk_report, obtido antes na thread do Tk.
+    """
+    dicts, text, other = card_sizes(flashcards)
+    sizes = {
+        "card_dicts": dicts + sys.getsizeof(flashcards),
+        "card_text": text,
+        "card_values": other,
+        "deck_lists": deck_list_sizes(decks),
+    }
+    seen = {id(flashcards), id(decks)}
+    seen.update(id(deck_cards) for deck_cards in decks.values())
+    sizes["indexes"] = sum(deep_sizeof(obj, seen, skip_str=True) for obj in extras)
+
+    live_ids = tk_state["live_ids"] if tk_state else set()
+    orphans, orphan_bytes, figures = _gc_objects(live_ids)
+    sizes["widgets"] = orphan_bytes
+    chart_bytes = len(chart_png or b"")
+    if tk_state:
+        chart_bytes += tk_state["image_bytes"]
+    # Uma figura viva guarda o buffer de pixels do canvas (RGBA)
+    for figure in figures:
+        width, height = figure.get_size_inches() * figure.dpi
+        chart_bytes += int(width * height * 4)
+    sizes["charts"] = chart_bytes
+
+    return {
+        "time": time.time(),
+        "cards": len(flashcards),
+        "sizes": sizes,
+        "orphans": orphans,
+        "figures": len(figures),
+        "tk": {key: value for key, value in (tk_state or {}).items() if key != "live_ids"},
+        "rss": resident_memory(),
+        "traced": tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None,
+        "gc_objects": len(gc.get_objects()),
+    }
+
+
+class MemoryProfiler:
+    """Guarda a marca (medidas + instantâneo do tracemalloc) de um ponto da
+    sessão e compara os relatórios seguintes com ela"""
+
+    def __init__(self, frames=TRACE_FRAMES):
+        self.frames = frames
+        self.mark = None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def snapshot(self):
+        """Alocações atuais por linha de código: {"arquivo:linha": (bytes,
+        blocos)}, ou None sem tracemalloc.
+
+        Só o agrupamento é guardado (não o instantâneo, que tem um registro
+        por bloco alocado): a marca ocupa pouco e a comparação é uma
+        diferença de dicionários.
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        lines = {}
+        for stat in tracemalloc.take_snapshot().statistics("lineno"):
+            frame = stat.traceback[0]
+            if frame.filename == tracemalloc.__file__:
+                continue
+            location = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+            size, count = lines.get(location, (0, 0))
+            lines[location] = (size + stat.size, count + stat.count)
+        return lines
+
+    def set_mark(self, report, snapshot):
+        self.mark = (report, snapshot)
+
+    def format(self, report, snapshot=None):
+        """Texto do relatório, com o crescimento desde a marca, se houver"""
+        base, base_snapshot = self.mark or (None, None)
+        lines = [f"🧠 MEMÓRIA ({report['cards']} cartões carregados)", ""]
+        if report["rss"] is not None:
+            lines.append(f"Memória residente: {format_bytes(report['rss'])}"
+                         + _delta(report["rss"], base and base["rss"]))
+        if report["traced"] is not None:
+            current, peak = report["traced"]
+            lines.append(f"Alocado (tracemalloc): {format_bytes(current)}, pico {format_bytes(peak)}"
+                         + _delta(current, base and base["traced"] and base["traced"][0]))
+        lines.append(f"Objetos rastreados pelo gc: {report['gc_objects']}"
+                     + _delta(report["gc_objects"], base and base["gc_objects"], raw=True))
+        lines += ["", "📦 POR ORIGEM (sys.getsizeof)"]
+        for key, label in CATEGORIES:
+            size = report["sizes"][key]
+            lines.append(f"{label}: {format_bytes(size)}"
+                         + _delta(size, base and base["sizes"][key]))
+
+        tk_state = report["tk"]
+        if tk_state:
+            lines += ["", "🪟 TK"]
+            live = tk_state["live_classes"]
+            lines.append(f"Widgets vivos: {sum(live.values())} ("
+                         + ", ".join(f"{name} {count}" for name, count in live.most_common(5)) + ")")
+            lines.append(f"Comandos Tcl de callbacks: {tk_state['callbacks']}"
+                         + _delta(tk_state["callbacks"], base and base["tk"].get("callbacks"), raw=True))
+            lines.append(f"Imagens: {tk_state['images']} ({format_bytes(tk_state['image_bytes'])})")
+        orphans = report["orphans"]
+        if orphans:
+            lines.append(f"Widgets destruídos ainda referenciados: {sum(orphans.values())} ("
+                         + ", ".join(f"{name} {count}" for name, count in orphans.most_common(5)) + ")")
+        if report["figures"]:
+            lines.append(f"Figuras do matplotlib vivas: {report['figures']}")
+
+        if snapshot is not None:
+            if base_snapshot is not None:
+                lines += ["", f"📈 CRESCIMENTO DESDE A MARCA ({report['time'] - base['time']:.0f} s)"]
+                growth = []
+                for location in snapshot.keys() | base_snapshot.keys():
+                    size, count = snapshot.get(location, (0, 0))
+                    old_size, old_count = base_snapshot.get(location, (0, 0))
+                    if size != old_size:
+                        growth.append((size - old_size, count - old_count, location))
+                growth.sort(key=lambda item: abs(item[0]), reverse=True)
+                for size, count, location in growth[:TOP_LINES]:
+                    lines.append(f"{'+' if size > 0 else ''}{format_bytes(size)} "
+                                 f"({count:+d} blocos)  {location}")
+            else:
+                lines += ["", "🔝 MAIORES ALOCAÇÕES (tracemalloc)"]
+                top = sorted(snapshot.items(), key=lambda item: item[1][0], reverse=True)
+                for location, (size, count) in top[:TOP_LINES]:
+                    lines.append(f"{format_bytes(size)} ({count} blocos)  {location}")
+        elif not tracemalloc.is_tracing():
+            lines += ["", "tracemalloc desligado: sem alocações por linha de código."]
+        return "\n".join(lines)
+
+
+def _delta(value, base, raw=False):
+    if base is None or value is None:
+        return ""
+    diff = value - base
+    return f"  (Δ {diff:+d})" if raw else f"  (Δ {'+' if diff >= 0 else ''}{format_bytes(diff)})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de memória de uma pasta de dados do PyCard")
+    parser.add_argument("--data", default="flashcards_data", help="pasta de dados")
+    args = parser.parse_args()
+
+    from storage import DeckStore
+
+    profiler = MemoryProfiler()
+    profiler.start_tracing()
+    store = DeckStore(args.data)
+    if not store.exists():
+        parser.error(f"pasta de dados não encontrada: {args.data}")
+    manifest = store.read_manifest()
+    flashcards = []
+    decks = {}
+    for deck_name in manifest["decks"]:
+        cards = store.load_deck(deck_name)
+        decks[deck_name] = list(range(len(flashcards), len(flashcards) + len(cards)))
+        flashcards.extend(cards)
+    report = measure(flashcards, decks)
+    print(profiler.format(report, profiler.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
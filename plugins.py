@@ -0,0 +1,279 @@
+"""Ganchos (hooks) para plugins.
+
+Um plugin é um arquivo .py na pasta plugins/ com uma função
+register(hooks), que associa funções aos eventos abaixo:
+
+    def register(hooks):
+        hooks.register("after_schedule", lambda card, quality, deck_name: ...)
+
+Há dois tipos de evento. Nos de notificação (call) o retorno das funções é
+ignorado. Nos de filtro (filter) cada função recebe o valor atual e pode
+devolver um novo (None mantém o atual); False encerra o filtro e é o
+resultado (em import_row, descarta o cartão).
+
+As funções de cada evento ficam em uma tupla em hooks.handlers, substituída
+a cada registro: o disparo não precisa de lock nem de cópia. Nos caminhos
+quentes (a resposta na revisão) o disparo é protegido pelo teste da tupla,
+que sem plugins custa uma busca em dicionário, sem chamada de função:
+
+    if HOOKS.handlers["after_schedule"]:
+        HOOKS.call("after_schedule", card, quality, deck_name)
+
+Uma função que falha não interrompe o aplicativo: o erro é mostrado
+no terminal, guardado em errors e as demais funções continuam.
+
+Os plugins são carregados por load_plugins, que o aplicativo chama depois
+que a primeira tela é exibida, e não na inicialização.
+
+Medir o custo dos ganchos no caminho da revisão:
+    python plugins.py --benchmark [--answers 200000]
+"""
+import argparse
+import os
+import sys
+import time
+import traceback
+from collections import deque
+
+PLUGIN_DIR = "plugins"
+
+# evento: (tipo, argumentos, descrição)
+EVENTS = {
+    "card_created": ("call", "card, deck_name", "cartão criado (manualmente ou importado)"),
+    "before_schedule": ("filter", "quality, card, deck_name",
+                        "antes do SM-2 em process_answer; pode trocar a avaliação (0 a 3)"),
+    "after_schedule": ("call", "card, quality, deck_name",
+                       "depois do SM-2; o cartão já tem o novo intervalo"),
+    "before_save": ("call", "changed",
+                    "antes de gravar; changed = {baralho: cópias dos cartões}"),
+    "import_row": ("filter", "card, deck_name",
+                   "cartão lido de um arquivo importado; False o descarta"),
+    "render_card": ("filter", "(question, answer), card",
+                    "textos da pergunta e da resposta exibidos na revisão"),
+    "stats_compute": ("call", "stats, cards",
+                      "estatísticas (em segundo plano); acrescente itens a stats['extra']"),
+}
+
+# Avaliações aceitas em before_schedule (0=Esqueci ... 3=Fácil)
+QUALITIES = range(4)
+
+# Erros de plugins guardados para consulta
+ERROR_LIMIT = 50
+
+
+class HookRegistry:
+    """Funções registradas por evento"""
+
+    def __init__(self):
+        # evento -> tupla de funções (só leitura: use register/unregister)
+        self.handlers = {event: () for event in EVENTS}
+        self.errors = deque(maxlen=ERROR_LIMIT)   # (evento, função, exceção)
+        self.loaded = []                          # nomes dos plugins carregados
+
+    def register(self, event, handler):
+        """Associa handler ao evento e o retorna"""
+        if event not in EVENTS:
+            raise ValueError(f"evento desconhecido: {event}")
+        self.handlers[event] = self.handlers[event] + (handler,)
+        return handler
+
+    def unregister(self, event, handler):
+        self.handlers[event] = tuple(h for h in self.handlers[event] if h is not handler)
+
+    def clear(self):
+        for event in self.handlers:
+            self.handlers[event] = ()
+
+    def listening(self, event):
+        """Se há funções no evento (para evitar preparar argumentos caros)"""
+        return bool(self.handlers[event])
+
+    def call(self, event, *args):
+        """Dispara um evento de notificação"""
+        handlers = self.handlers[event]
+        if not handlers:
+            return
+        for handler in handlers:
+            try:
+                handler(*args)
+            except Exception as e:
+                self._failed(event, handler, e)
+
+    def filter(self, event, value, *args, valid=None):
+        """Dispara um evento de filtro e retorna o valor final.
+
+        Um False encerra o filtro (as funções seguintes não o recebem no
+        lugar do valor). valid(valor), se informado, recusa os valores
+        inválidos (inclusive False, se o evento não o aceita): o erro é
+        registrado e o valor anterior é mantido.
+        """
+        handlers = self.handlers[event]
+        if not handlers:
+            return value
+        for handler in handlers:
+            try:
+                result = handler(value, *args)
+            except Exception as e:
+                self._failed(event, handler, e)
+                continue
+            if result is None:
+                continue
+            if valid is not None and not valid(result):
+                self._failed(event, handler, ValueError(f"valor inválido: {result!r}"))
+                continue
+            if result is False:
+                return False
+            value = result
+        return value
+
+    def _failed(self, event, handler, error):
+        self.errors.append((event, handler, error))
+        name = getattr(handler, "__qualname__", repr(handler))
+        print(f"Erro no plugin ({event}, {name}): {error}", file=sys.stderr)
+        if error.__traceback__ is not None:   # não é um valor recusado por valid
+            traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+
+
+def valid_quality(quality):
+    """Avaliação que schedule_review aceita (before_schedule)"""
+    return type(quality) is int and quality in QUALITIES
+
+
+def valid_import_row(card):
+    """Cartão importado (ou False, que o descarta) em import_row"""
+    return card is False or isinstance(card, dict)
+
+
+def valid_rendered(texts):
+    """(pergunta, resposta) em texto, como a revisão exibe (render_card)"""
+    return (isinstance(texts, tuple) and len(texts) == 2
+            and all(isinstance(text, str) for text in texts))
+
+
+# Registro usado pelo aplicativo
+HOOKS = HookRegistry()
+
+
+def load_plugins(directory=PLUGIN_DIR, hooks=HOOKS):
+    """Importa os plugins da pasta (arquivos .py que não começam com "_",
+    em ordem alfabética) e chama register(hooks) de cada um. Retorna
+    [(nome, erro)] dos que falharam; sem a pasta, nada é importado."""
+    if not os.path.isdir(directory):
+        return []
+    import importlib.util   # só quando há plugins
+
+    failed = []
+    for file_name in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(file_name)
+        if extension != ".py" or name.startswith("_") or name in hooks.loaded:
+            continue
+        try:
+            spec = importlib.util.spec_from_file_location(f"pycard_plugin_{name}",
+                                                          os.path.join(directory, file_name))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[spec.name] = module
+            spec.loader.exec_module(module)
+            register = getattr(module, "register", None)
+            if register is None:
+                raise AttributeError("o plugin não define register(hooks)")
+            register(hooks)
+        except Exception as e:
+            sys.modules.pop(f"pycard_plugin_{name}", None)
+            failed.append((name, e))
+            continue
+        hooks.loaded.append(name)
+    return failed
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+def _time_answers(hooks, cards, answers, dispatch):
+    """Segundos para responder answers vezes: SM-2 (e os ganchos, se dispatch)"""
+    from scheduler import schedule_review
+
+    start = time.perf_counter()
+    for n in range(answers):
+        i = n % len(cards)
+        if i == 0:
+            # Uma resposta por cartão a cada volta, sempre a partir do zero
+            for card in cards:
+                card.update(interval=0, repetitions=0, ease_factor=2.5)
+        card = cards[i]
+        quality = n & 3
+        if dispatch and hooks.handlers["before_schedule"]:
+            quality = hooks.filter("before_schedule", quality, card, "Geral",
+                                   valid=valid_quality)
+        schedule_review(card, quality)
+        if dispatch and hooks.handlers["after_schedule"]:
+            hooks.call("after_schedule", card, quality, "Geral")
+    return time.perf_counter() - start
+
+
+def _time_dispatch(hooks, calls):
+    """Segundos para disparar before_schedule + after_schedule calls vezes
+    (como em process_answer), descontado o próprio laço"""
+    card = {}
+    quality = 2
+    start = time.perf_counter()
+    for n in range(calls):
+        pass
+    empty = time.perf_counter() - start
+    start = time.perf_counter()
+    for n in range(calls):
+        if hooks.handlers["before_schedule"]:
+            quality = hooks.filter("before_schedule", quality, card, "Geral",
+                                   valid=valid_quality)
+        if hooks.handlers["after_schedule"]:
+            hooks.call("after_schedule", card, quality, "Geral")
+    return time.perf_counter() - start - empty
+
+
+def benchmark(answers=200000, handler_counts=(0, 1, 10)):
+    """Custo dos ganchos before_schedule + after_schedule com 0, 1 e 10
+    funções (que não fazem nada) em cada um.
+
+    Retorna [(funções, ns por resposta com SM-2, ns por disparo)]; a
+    primeira linha (funções=None) é o SM-2 sem ganchos. O custo por disparo
+    é medido à parte, sem o SM-2, cuja variação entre execuções é maior que
+    o custo de um gancho vazio.
+    """
+    from cards import new_card
+
+    cards = [new_card(f"frente {i}", f"verso {i}") for i in range(1000)]
+    hooks = HookRegistry()
+    _time_answers(hooks, cards, answers // 10, True)   # aquecimento
+    base = min(_time_answers(hooks, cards, answers, False) for _ in range(3))
+    results = [(None, base / answers * 1e9, 0.0)]
+    for count in handler_counts:
+        hooks.clear()
+        for _ in range(count):
+            hooks.register("before_schedule", lambda quality, card, deck_name: None)
+            hooks.register("after_schedule", lambda card, quality, deck_name: None)
+        elapsed = min(_time_answers(hooks, cards, answers, True) for _ in range(3))
+        dispatch = min(_time_dispatch(hooks, answers) for _ in range(3))
+        # Dois disparos por resposta
+        results.append((count, elapsed / answers * 1e9, dispatch / answers / 2 * 1e9))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o custo dos ganchos de plugins na revisão")
+    parser.add_argument("--benchmark", action="store_true", help="medir o custo dos ganchos")
+    parser.add_argument("--answers", type=int, default=200000, help="respostas simuladas")
+    parser.add_argument("--list", action="store_true", help="listar os eventos")
+    args = parser.parse_args(argv)
+    if args.list or not args.benchmark:
+        for event, (kind, arguments, description) in EVENTS.items():
+            print(f"{event:16} {kind:6} ({arguments}) — {description}")
+        return 0
+    print(f"{args.answers} respostas (before_schedule + after_schedule em cada uma)")
+    print(f"{'funções':>11} {'ns/resposta':>12} {'ns/disparo':>11}")
+    for count, per_answer, per_hook in benchmark(args.answers):
+        label = "sem ganchos" if count is None else str(count)
+        print(f"{label:>11} {per_answer:12.0f} {per_hook:11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,499 @@
+"""Linguagem de busca de cartões.
+
+Exemplos:
+    verbo                       frente ou verso contém "verbo"
+    front:casa back:"to be"     busca em um só lado
+    deck:"Baralho 1" tag:verb*  baralho e tag (* casa qualquer trecho)
+    ease<2.2 reviews>10         facilidade, total de revisões
+    interval>=30 reps:0 streak>5 id:42
+    due:today due:overdue due:3 pendentes hoje, atrasados, em até 3 dias
+    created:2026-01             criados em janeiro de 2026
+    created>=2026-01-15 reviewed<2026
+    reviewed:today streak:0     errados hoje (também yesterday/ontem)
+    is:due is:new is:suspended
+    (tag:a or tag:b) -deck:Geral not is:suspended
+
+Textos não diferenciam acentos nem maiúsculas ("acao" encontra "Ação").
+Termos separados por espaço são combinados com E; "and" e "or" são os
+operadores explícitos, "not" ou "-" negam e parênteses agrupam.
+
+A consulta é analisada uma vez (parse_query guarda as últimas em cache) e
+vira uma árvore de nós; cada nó produz o bitmap (ver index.py) dos cartões
+que a satisfazem. Baralho, tag, pendência e suspensão vêm direto dos bitmaps
+do índice; os demais termos fazem uma varredura vetorizada de uma coluna
+(comparação de array NumPy, str.find no texto unido), ou, quando os termos
+anteriores de um E já deixaram poucos candidatos, testam só esses cartões.
+matches avalia a mesma árvore para um único cartão (ver filtered.py).
+"""
+import datetime
+import fnmatch
+import functools
+import re
+
+from cards import SEARCH_KEYS, now_str, search_key
+from index import bitmap_count, bitmap_indices, card_tags, mask_bitmap, positions_bitmap
+
+try:
+    import numpy as np
+except ImportError:  # sem NumPy as colunas numéricas são listas
+    np = None
+
+# Abaixo de 1/SPARSE_RATIO da coleção, testar cartão a cartão é mais barato
+# que varrer a coluna inteira
+SPARSE_RATIO = 32
+
+TEXT_FIELDS = {"front": ("front",), "frente": ("front",),
+               "back": ("back",), "verso": ("back",)}
+NUMBER_FIELDS = {"ease": "ease_factor", "facilidade": "ease_factor",
+                 "interval": "interval", "intervalo": "interval",
+                 "reps": "repetitions", "repetitions": "repetitions",
+                 "streak": "correct_streak",
+                 "reviews": "total_reviews", "revisoes": "total_reviews",
+                 "revisões": "total_reviews",
+                 "id": "id"}
+DATE_FIELDS = {"created": "created_at", "criado": "created_at",
+               "reviewed": "last_review", "revisado": "last_review",
+               "next": "next_review"}
+STATES = ("due", "new", "suspended")
+RELATIVE_DAYS = {"today": 0, "hoje": 0, "yesterday": 1, "ontem": 1}
+
+_FIELD_RE = re.compile(r"^([^\W\d]+)(<=|>=|!=|:|<|>|=)(.*)$")
+_COMPARE = {
+    ":": lambda a, b: a == b,
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+_OPERATORS = {"and": "and", "or": "or", "not": "not"}
+
+
+class QueryError(ValueError):
+    pass
+
+
+# ----------------------------------------------------------------------
+# Nós
+# ----------------------------------------------------------------------
+class Node:
+    """Um nó produz bitmap(index, candidates), exato dentro dos candidatos
+    (fora deles o resultado pode conter bits a mais), e matches(card,
+    deck_name) para um cartão avulso"""
+    cost = 1   # 0: resolvido pelos bitmaps do índice; 1: varre uma coluna
+    time_dependent = False   # o resultado muda com o passar do tempo
+
+    def bitmap(self, index, candidates=None):
+        raise NotImplementedError
+
+    def matches(self, card, deck_name):
+        raise NotImplementedError
+
+
+class And(Node):
+    def __init__(self, children):
+        # Os termos resolvidos pelo índice primeiro, para restringir os demais
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = max(child.cost for child in self.children)
+        self.time_dependent = any(child.time_dependent for child in children)
+
+    def bitmap(self, index, candidates=None):
+        result = index.all if candidates is None else candidates
+        for child in self.children:
+            result &= child.bitmap(index, result)
+            if not result:
+                break
+        return result
+
+    def matches(self, card, deck_name):
+        return all(child.matches(card, deck_name) for child in self.children)
+
+
+class Or(Node):
+    def __init__(self, children):
+        self.children = children
+        self.cost = max(child.cost for child in children)
+        self.time_dependent = any(child.time_dependent for child in children)
+
+    def bitmap(self, index, candidates=None):
+        result = 0
+        for child in self.children:
+            result |= child.bitmap(index, candidates)
+        return result
+
+    def matches(self, card, deck_name):
+        return any(child.matches(card, deck_name) for child in self.children)
+
+
+class Not(Node):
+    def __init__(self, child):
+        self.child = child
+        self.cost = child.cost
+        self.time_dependent = child.time_dependent
+
+    def bitmap(self, index, candidates=None):
+        return index.all & ~self.child.bitmap(index, candidates)
+
+    def matches(self, card, deck_name):
+        return not self.child.matches(card, deck_name)
+
+
+class ScanTerm(Node):
+    """Termo sem bitmap próprio: varre a coluna inteira ou, com poucos
+    candidatos, testa cartão a cartão com match"""
+
+    def bitmap(self, index, candidates=None):
+        self.prepare()
+        if candidates is not None and bitmap_count(candidates) * SPARSE_RATIO < index.size:
+            flashcards = index.flashcards
+            return positions_bitmap([i for i in bitmap_indices(candidates)
+                                     if self.match(flashcards[i])], index.size)
+        return self.scan(index)
+
+    def matches(self, card, deck_name):
+        self.prepare()
+        return self.match(card)
+
+    def prepare(self):
+        """Calcula o que depende da data atual, antes de cada avaliação"""
+
+    def match(self, card):
+        raise NotImplementedError
+
+    def scan(self, index):
+        raise NotImplementedError
+
+
+class TextTerm(ScanTerm):
+    """Contém o texto, sem diferenciar acentos nem maiúsculas"""
+
+    def __init__(self, fields, value):
+        self.fields = fields
+        self.value = search_key(value)
+
+    def match(self, card):
+        return any(self.value in SEARCH_KEYS.key(card[field], field) for field in self.fields)
+
+    def scan(self, index):
+        result = 0
+        for field in self.fields:
+            result |= index.search_text(field, self.value)
+        return result
+
+
+class NumberTerm(ScanTerm):
+    def __init__(self, field, op, value):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def match(self, card):
+        return _COMPARE[self.op](card.get(self.field) or 0, self.value)
+
+    def scan(self, index):
+        column = index.column(self.field)
+        compare = _COMPARE[self.op]
+        if np is not None:
+            return mask_bitmap(compare(column, self.value))
+        return positions_bitmap([i for i, v in enumerate(column) if compare(v, self.value)],
+                                index.size)
+
+
+class DateTerm(ScanTerm):
+    """Compara datas pelo texto: "created:2026-01" casa todo o mês, ">" quer
+    depois do período inteiro, "<" antes do seu início. "today" e
+    "yesterday" valem pelo dia em que a consulta é avaliada."""
+
+    def __init__(self, field, op, value):
+        self.field = field
+        self.op = op
+        self.days_ago = RELATIVE_DAYS.get(value.lower())
+        self.time_dependent = self.days_ago is not None
+        self.set_bounds(value)
+
+    def set_bounds(self, value):
+        self.low = value
+        self.high = value + "\uffff"
+
+    def prepare(self):
+        if self.days_ago is not None:
+            day = datetime.date.today() - datetime.timedelta(days=self.days_ago)
+            self.set_bounds(day.isoformat())
+
+    def test(self, value):
+        if not value:
+            return self.op == "!="
+        op = self.op
+        if op in (":", "="):
+            return self.low <= value < self.high
+        if op == "!=":
+            return not self.low <= value < self.high
+        if op == "<":
+            return value < self.low
+        if op == "<=":
+            return value < self.high
+        if op == ">":
+            return value >= self.high
+        return value >= self.low
+
+    def mask(self, column):
+        """A mesma comparação de test, vetorizada sobre um array NumPy"""
+        op = self.op
+        inside = (column >= self.low) & (column < self.high)
+        if op in (":", "="):
+            return inside
+        if op == "!=":
+            return ~inside
+        if op == "<":
+            return (column < self.low) & (column != "")
+        if op == "<=":
+            return (column < self.high) & (column != "")
+        if op == ">":
+            return column >= self.high
+        return column >= self.low
+
+    def match(self, card):
+        return self.test(card.get(self.field) or "")
+
+    def scan(self, index):
+        column = index.column(self.field)
+        if np is not None:
+            return mask_bitmap(self.mask(column))
+        test = self.test
+        return positions_bitmap([i for i, v in enumerate(column) if test(v)], index.size)
+
+
+class DueTerm(DateTerm):
+    """due:today, due:overdue ou due:N (vence em até N dias); a data é
+    calculada a cada avaliação, para valer depois da meia-noite"""
+
+    time_dependent = True
+
+    def __init__(self, days):
+        self.days = days
+        self.field = "next_review"
+
+    def prepare(self):
+        today = datetime.date.today()
+        if self.days is None:   # atrasados: antes de hoje
+            self.limit = today.isoformat()
+        else:
+            self.limit = (today + datetime.timedelta(days=self.days + 1)).isoformat()
+
+    def test(self, value):
+        return value < self.limit
+
+    def mask(self, column):
+        return column < self.limit
+
+
+class NewTerm(DateTerm):
+    """Cartões nunca revisados (ou com o agendamento reiniciado)"""
+
+    def __init__(self):
+        self.field = "last_review"
+
+    def prepare(self):
+        pass
+
+    def test(self, value):
+        return not value
+
+    def mask(self, column):
+        return column == ""
+
+
+class IndexTerm(Node):
+    """Termos respondidos pelos bitmaps do índice"""
+    cost = 0
+
+    def __init__(self, kind, value=None):
+        self.kind = kind
+        self.value = value
+        self.time_dependent = kind == "due"
+
+    def matches(self, card, deck_name):
+        if self.kind == "due":
+            return (card["next_review"] or "") <= now_str()
+        if self.kind == "suspended":
+            return bool(card.get("suspended"))
+        pattern = self.value.lower()
+        if self.kind == "deck":
+            return deck_name is not None and fnmatch.fnmatchcase(deck_name.lower(), pattern)
+        return any(fnmatch.fnmatchcase(tag.lower(), pattern) for tag in card_tags(card))
+
+    def bitmap(self, index, candidates=None):
+        if self.kind == "due":
+            return index.due()
+        if self.kind == "suspended":
+            return index.suspended()
+        names = index.decks() if self.kind == "deck" else index.tags()
+        pattern = self.value.lower()
+        result = 0
+        for name in names:
+            if fnmatch.fnmatchcase(name.lower(), pattern):
+                result |= index.deck(name) if self.kind == "deck" else index.tag(name)
+        return result
+
+
+# ----------------------------------------------------------------------
+# Análise
+# ----------------------------------------------------------------------
+def tokenize(text):
+    """Divide a consulta em "(", ")", operadores e termos (texto original,
+    com as aspas)"""
+    tokens = []
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            i += 1
+            continue
+        if c in "()":
+            tokens.append(c)
+            i += 1
+            continue
+        start = i
+        quoted = False
+        while i < n and (quoted or not (text[i].isspace() or text[i] in "()")):
+            if text[i] == '"':
+                quoted = not quoted
+            i += 1
+        if quoted:
+            raise QueryError("aspas não fechadas")
+        word = text[start:i]
+        if word.lower() in _OPERATORS:
+            tokens.append(_OPERATORS[word.lower()])
+        elif word.startswith("-"):
+            tokens.append("not")
+            if len(word) > 1:
+                tokens.append(("term", word[1:]))
+        else:
+            tokens.append(("term", word))
+    return tokens
+
+
+def make_term(word):
+    """Converte um termo ("ease<2.2", "deck:X", "verbo") em um nó"""
+    match = None if word.startswith('"') else _FIELD_RE.match(word)
+    if match is None:
+        value = word.replace('"', "")
+        if not value:
+            raise QueryError("termo vazio")
+        return TextTerm(("front", "back"), value)
+
+    field, op, value = match.group(1).lower(), match.group(2), match.group(3).replace('"', "")
+    if not value:
+        raise QueryError(f"valor ausente em '{word}'")
+    if field in TEXT_FIELDS:
+        if op != ":":
+            raise QueryError(f"use {field}:texto")
+        return TextTerm(TEXT_FIELDS[field], value)
+    if field in ("deck", "baralho", "tag"):
+        if op != ":":
+            raise QueryError(f"use {field}:nome")
+        return IndexTerm("deck" if field != "tag" else "tag", value)
+    if field == "is":
+        value = value.lower()
+        if op != ":" or value not in STATES:
+            raise QueryError("use is:due, is:new ou is:suspended")
+        return NewTerm() if value == "new" else IndexTerm(value)
+    if field == "due":
+        value = value.lower()
+        if op != ":":
+            raise QueryError("use due:today, due:overdue ou due:N")
+        if value in ("today", "hoje"):
+            return DueTerm(0)
+        if value in ("overdue", "atrasados"):
+            return DueTerm(None)
+        if value.isdigit():
+            return DueTerm(int(value))
+        raise QueryError(f"prazo inválido: '{value}'")
+    if field in NUMBER_FIELDS:
+        try:
+            number = float(value)
+        except ValueError:
+            raise QueryError(f"número inválido em '{word}'")
+        return NumberTerm(NUMBER_FIELDS[field], op, number)
+    if field in DATE_FIELDS:
+        return DateTerm(DATE_FIELDS[field], op, value)
+    # Campo desconhecido: o termo inteiro é texto (ex.: "obs:")
+    return TextTerm(("front", "back"), word.replace('"', ""))
+
+
+class _Parser:
+    """or_expr := and_expr ("or" and_expr)*
+    and_expr := unary (["and"] unary)*
+    unary := "not" unary | "(" or_expr ")" | termo"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.or_expr()
+        if self.peek() is not None:
+            raise QueryError("parêntese ')' sem '(' correspondente")
+        return node
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.peek() == "or":
+            self.take()
+            children.append(self.and_expr())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def and_expr(self):
+        children = [self.unary()]
+        while self.peek() not in (None, "or", ")"):
+            if self.peek() == "and":
+                self.take()
+            children.append(self.unary())
+        return children[0] if len(children) == 1 else And(children)
+
+    def unary(self):
+        token = self.take()
+        if token == "not":
+            return Not(self.unary())
+        if token == "(":
+            node = self.or_expr()
+            if self.take() != ")":
+                raise QueryError("falta fechar um parêntese")
+            return node
+        if isinstance(token, tuple):
+            return make_term(token[1])
+        if token is None:
+            raise QueryError("consulta incompleta")
+        raise QueryError(f"'{token}' fora de lugar")
+
+
+@functools.lru_cache(maxsize=64)
+def parse_query(text):
+    """Analisa a consulta; retorna a árvore de nós, ou None se vazia.
+
+    Lança QueryError se a consulta for inválida.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    return _Parser(tokens).parse()
+
+
+def search(index, text, candidates=None):
+    """Bitmap dos cartões do índice que satisfazem a consulta (restrito a
+    candidates, se informado)"""
+    node = parse_query(text.strip())
+    result = index.all if candidates is None else candidates & index.all
+    if node is None:
+        return result
+    return node.bitmap(index, result) & result
@@ -0,0 +1,111 @@
+"""Fila de revisão com os cartões pendentes de todos os baralhos.
+
+Cada baralho contribui com sua própria fila, em ordem de vencimento: as
+posições saem da interseção de bitmaps do índice (baralho E pendente E NÃO
+suspenso) e só os primeiros cartões que cabem no limite diário do baralho
+são ordenados e guardados. As filas são intercaladas por uma fusão de k
+vias (um heap com o próximo cartão de cada baralho), então o cartão mais
+atrasado da coleção sai primeiro, e um baralho que atinge o limite do dia
+deixa de contribuir.
+"""
+import datetime
+import heapq
+
+from index import bitmap_indices
+
+try:
+    import numpy as np
+except ImportError:  # sem NumPy a ordenação usa heapq.nsmallest
+    np = None
+
+DEFAULT_DAILY_LIMIT = 200
+
+
+def reviews_today(history, card_deck):
+    """Revisões feitas hoje por baralho, a partir do histórico.
+
+    card_deck: função id do cartão -> nome do baralho (ou None).
+    """
+    midnight = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    counts = {}
+    for card_id in history.scan_time(start=int(midnight.timestamp()))["card_id"]:
+        deck_name = card_deck(card_id)
+        if deck_name is not None:
+            counts[deck_name] = counts.get(deck_name, 0) + 1
+    return counts
+
+
+def due_positions(index, deck_name, limit):
+    """As até limit posições pendentes do baralho que venceram primeiro, em
+    ordem de vencimento"""
+    positions = bitmap_indices(index.query(deck_name, due=True, suspended=False))
+    if np is not None and positions:
+        keys = index.column("next_review")[positions]
+        order = np.argsort(keys, kind="stable")[:limit]
+        return [positions[i] for i in order.tolist()]
+    if len(positions) <= limit:
+        return sorted(positions, key=index.due_key)
+    return heapq.nsmallest(limit, positions, key=index.due_key)
+
+
+class MergedDueQueue:
+    """Fila única com os pendentes de vários baralhos.
+
+    limits: baralho -> revisões permitidas por dia (DEFAULT_DAILY_LIMIT se
+    ausente); done_today: baralho -> revisões já feitas hoje.
+    """
+
+    def __init__(self, index, deck_names, limits=None, done_today=None):
+        limits = limits or {}
+        done_today = done_today or {}
+        self.remaining = {}     # baralho -> cartões que ainda pode fornecer hoje
+        self._heap = []         # (vencimento, ordem do baralho, baralho, iterador)
+        for order, deck_name in enumerate(deck_names):
+            allowed = limits.get(deck_name, DEFAULT_DAILY_LIMIT) - done_today.get(deck_name, 0)
+            if allowed <= 0:
+                continue
+            # Os cartões, e não as posições, que mudam se a coleção for recarregada
+            cards = [index.flashcards[i] for i in due_positions(index, deck_name, allowed)]
+            self.remaining[deck_name] = len(cards)
+            self._push(order, deck_name, iter(cards))
+        self.count = sum(self.remaining.values())
+        self._returned = []     # (cartão, baralho) devolvidos por unpop
+
+    def _push(self, order, deck_name, cards):
+        for card in cards:
+            heapq.heappush(self._heap, (card["next_review"] or "", order, card, deck_name, cards))
+            return
+
+    def __len__(self):
+        return self.count
+
+    def peek(self):
+        """Cartão que pop retornará em seguida (pode estar desatualizado se
+        foi respondido em outra sessão); None se a fila acabou"""
+        if self._returned:
+            return self._returned[-1][0]
+        return self._heap[0][2] if self._heap else None
+
+    def unpop(self, card, deck_name):
+        """Devolve um cartão à frente da fila (resposta desfeita)"""
+        self._returned.append((card, deck_name))
+        self.remaining[deck_name] = self.remaining.get(deck_name, 0) + 1
+        self.count += 1
+
+    def pop(self):
+        """Próximo cartão (o que venceu primeiro) e seu baralho, ou (None, None)"""
+        if self._returned:
+            card, deck_name = self._returned.pop()
+            self.remaining[deck_name] -= 1
+            self.count -= 1
+            return card, deck_name
+        while self._heap:
+            key, order, card, deck_name, cards = heapq.heappop(self._heap)
+            self._push(order, deck_name, cards)
+            self.remaining[deck_name] -= 1
+            self.count -= 1
+            # Respondido em outra sessão desde que a fila foi montada: pular
+            if (card["next_review"] or "") != key:
+                continue
+            return card, deck_name
+        return None, None
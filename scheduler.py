@@ -0,0 +1,325 @@
+"""Algoritmo SM-2 parametrizado e ajuste dos parâmetros pelo histórico.
+
+O passo de agendamento (schedule_review) é puro Python e não depende de
+nada além da biblioteca padrão. Com o balanceamento de carga, o dia da
+próxima revisão é escolhido dentro de uma janela em torno do intervalo
+ideal: o de menos revisões agendadas, consultado em uma contagem por dia
+mantida pelo índice (CardIndex.day_load) e, para os baralhos não
+carregados, gravada no manifesto (DeckStore.deck_due_days).
+
+O ajuste dos parâmetros (fit_params, fit_decks) usa NumPy, que é opcional:
+a verossimilhança é avaliada de forma vetorizada sobre todas as revisões de
+um baralho e vários baralhos são ajustados em paralelo em um
+ProcessPoolExecutor.
+"""
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from cards import DATE_FORMAT
+
+try:
+    import numpy as np
+except ImportError:  # NumPy só é necessário para o ajuste
+    np = None
+
+DEFAULT_PARAMS = {
+    "ease_floor": 1.3,         # fator de facilidade mínimo
+    "first_interval": 1,       # dias após o primeiro acerto
+    "second_interval": 6,      # dias após o segundo acerto
+    "hard_multiplier": 1.2,    # multiplicador do intervalo em "Difícil"
+    "easy_multiplier": 1.3,    # multiplicador do intervalo em "Fácil"
+    # Variação do fator: base - (5 - q) * (linear + (5 - q) * quadratic)
+    "ease_base": 0.1,
+    "ease_linear": 0.08,
+    "ease_quadratic": 0.02,
+}
+
+# Limites usados pelo otimizador
+PARAM_BOUNDS = {
+    "ease_floor": (1.1, 2.5),
+    "first_interval": (1, 5),
+    "second_interval": (2, 15),
+    "hard_multiplier": (0.8, 2.0),
+    "easy_multiplier": (1.0, 2.5),
+    "ease_base": (-0.2, 0.3),
+    "ease_linear": (0.0, 0.2),
+    "ease_quadratic": (0.0, 0.05),
+}
+
+# Janela de balanceamento: intervalos menores que FUZZ_MIN_INTERVAL ficam
+# exatos; até 7 dias, ±1; até 30, ±15% (mínimo 2); acima, ±5% (mínimo 4)
+FUZZ_MIN_INTERVAL = 3
+
+# Retenção esperada ao fim do intervalo agendado
+TARGET_RETENTION = 0.9
+# Baralhos com menos revisões que isso mantêm os parâmetros padrão
+MIN_REVIEWS_TO_FIT = 50
+
+
+def fuzz_range(interval):
+    """Dias (mínimo, máximo) aceitáveis para um intervalo ideal"""
+    if interval < FUZZ_MIN_INTERVAL:
+        return interval, interval
+    if interval < 7:
+        delta = 1
+    elif interval < 30:
+        delta = max(2, round(interval * 0.15))
+    else:
+        delta = max(4, round(interval * 0.05))
+    return max(FUZZ_MIN_INTERVAL - 1, interval - delta), interval + delta
+
+
+def balanced_interval(interval, now, day_load):
+    """Intervalo da janela de fuzz_range cujo dia tem menos revisões
+    agendadas (day_load("AAAA-MM-DD") -> total); empates ficam com o mais
+    próximo do ideal e, depois, com o mais curto"""
+    low, high = fuzz_range(interval)
+    if low == high:
+        return interval
+    today = now.date()
+    return min(range(low, high + 1),
+               key=lambda days: (day_load((today + datetime.timedelta(days=days)).isoformat()),
+                                 abs(days - interval), days))
+
+
+def schedule_review(card, quality, params=None, now=None, day_load=None):
+    """Aplica um passo do SM-2 ao cartão (altera o dicionário in-place).
+
+    Com day_load (ver balanced_interval), o intervalo é ajustado para o
+    dia menos carregado da janela em torno do ideal.
+    """
+    p = DEFAULT_PARAMS if params is None else params
+    if now is None:
+        now = datetime.datetime.now()
+
+    card["last_review"] = now.strftime(DATE_FORMAT)
+    card["total_reviews"] = card.get("total_reviews", 0) + 1
+
+    if quality >= 3:  # Resposta correta
+        if card["repetitions"] == 0:
+            card["interval"] = round(p["first_interval"])
+        elif card["repetitions"] == 1:
+            card["interval"] = round(p["second_interval"])
+        else:
+            card["interval"] = round(card["interval"] * card["ease_factor"])
+
+        card["repetitions"] += 1
+        card["correct_streak"] = card.get("correct_streak", 0) + 1
+    else:  # Resposta incorreta
+        card["repetitions"] = 0
+        card["interval"] = 1
+        card["correct_streak"] = 0
+
+    # Atualizar fator de facilidade
+    q = 5 - quality
+    card["ease_factor"] = max(p["ease_floor"], card["ease_factor"] + (
+        p["ease_base"] - q * (p["ease_linear"] + q * p["ease_quadratic"])))
+
+    # Ajustar intervalo baseado na qualidade
+    if quality == 0:  # Esqueci
+        card["interval"] = 1
+    elif quality == 1:  # Difícil
+        card["interval"] = max(1, round(card["interval"] * p["hard_multiplier"]))
+    elif quality == 3:  # Fácil
+        card["interval"] = round(card["interval"] * p["easy_multiplier"])
+
+    if day_load is not None:
+        card["interval"] = balanced_interval(card["interval"], now, day_load)
+    next_review_date = now + datetime.timedelta(days=card["interval"])
+    card["next_review"] = next_review_date.strftime(DATE_FORMAT)
+
+
+# ----------------------------------------------------------------------
+# Ajuste dos parâmetros
+# ----------------------------------------------------------------------
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("O ajuste do agendador requer NumPy (pip install numpy).")
+
+
+def prepare_reviews(card_ids, timestamps, qualities):
+    """Organiza as revisões de um baralho para a avaliação vetorizada.
+
+    Ordena por (cartão, data) e agrupa as linhas pela posição da revisão
+    dentro do cartão: o passo k do replay processa de uma vez a k-ésima
+    revisão de todos os cartões.
+    """
+    _require_numpy()
+    card_ids = np.asarray(card_ids, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    qualities = np.asarray(qualities, dtype=np.int8)
+
+    order = np.lexsort((timestamps, card_ids))
+    card_ids = card_ids[order]
+    timestamps = timestamps[order]
+    qualities = qualities[order]
+
+    _, card_slot, counts = np.unique(card_ids, return_inverse=True, return_counts=True)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = np.arange(len(card_ids)) - np.repeat(starts, counts)
+
+    elapsed = np.zeros(len(card_ids))
+    elapsed[1:] = (timestamps[1:] - timestamps[:-1]) / 86400.0
+    elapsed[position == 0] = 0.0
+
+    by_position = np.argsort(position, kind="stable")
+    step_sizes = np.bincount(position) if len(position) else np.zeros(0, dtype=np.int64)
+    steps = np.split(by_position, np.cumsum(step_sizes)[:-1])
+    return {
+        "n_cards": len(counts),
+        "slot": card_slot,
+        "quality": qualities,
+        "elapsed": elapsed,
+        "steps": steps,
+    }
+
+
+def log_likelihood(params, prepared):
+    """Log-verossimilhança média das revisões sob os parâmetros dados.
+
+    O cartão é reagendado revisão a revisão com os parâmetros candidatos;
+    a probabilidade de lembrar após t dias de um intervalo agendado I é
+    TARGET_RETENTION ** (t / I), e "lembrar" é qualquer avaliação acima de
+    Esqueci. Cada passo é vetorizado sobre todos os cartões do baralho.
+    """
+    n = prepared["n_cards"]
+    ease = np.full(n, 2.5)
+    reps = np.zeros(n, dtype=np.int64)
+    interval = np.zeros(n)
+    total = 0.0
+    count = 0
+
+    for k, rows in enumerate(prepared["steps"]):
+        slot = prepared["slot"][rows]
+        quality = prepared["quality"][rows]
+
+        if k > 0:
+            scheduled = np.maximum(interval[slot], 1.0)
+            recall = TARGET_RETENTION ** (prepared["elapsed"][rows] / scheduled)
+            recall = np.clip(recall, 1e-6, 1 - 1e-6)
+            recalled = quality >= 1
+            total += np.sum(np.where(recalled, np.log(recall), np.log1p(-recall)))
+            count += len(rows)
+
+        # Mesmo passo de schedule_review, vetorizado
+        cur_ease = ease[slot]
+        cur_reps = reps[slot]
+        cur_interval = interval[slot]
+        correct = quality >= 3
+        grown = np.where(cur_reps == 0, np.round(params["first_interval"]),
+                         np.where(cur_reps == 1, np.round(params["second_interval"]),
+                                  np.round(cur_interval * cur_ease)))
+        new_interval = np.where(correct, grown, 1.0)
+        new_reps = np.where(correct, cur_reps + 1, 0)
+
+        q = 5 - quality.astype(np.float64)
+        new_ease = np.maximum(params["ease_floor"], cur_ease + (
+            params["ease_base"] - q * (params["ease_linear"] + q * params["ease_quadratic"])))
+
+        new_interval = np.where(quality == 0, 1.0, new_interval)
+        new_interval = np.where(quality == 1,
+                                np.maximum(1.0, np.round(new_interval * params["hard_multiplier"])),
+                                new_interval)
+        new_interval = np.where(quality == 3,
+                                np.round(new_interval * params["easy_multiplier"]),
+                                new_interval)
+
+        ease[slot] = new_ease
+        reps[slot] = new_reps
+        interval[slot] = new_interval
+
+    return total / count if count else 0.0
+
+
+def _clip(name, value):
+    low, high = PARAM_BOUNDS[name]
+    return min(high, max(low, value))
+
+
+def fit_params(card_ids, timestamps, qualities, start=None, max_rounds=30):
+    """Ajusta os parâmetros do SM-2 às revisões de um baralho.
+
+    Busca por coordenadas com passo decrescente, restrita a PARAM_BOUNDS.
+    Retorna um dicionário com "params", "reviews", "before" e "after"
+    (log-verossimilhança média antes e depois do ajuste).
+    """
+    _require_numpy()
+    params = dict(DEFAULT_PARAMS if start is None else start)
+    if len(card_ids) < MIN_REVIEWS_TO_FIT:
+        return {"params": params, "reviews": len(card_ids), "before": None, "after": None}
+
+    prepared = prepare_reviews(card_ids, timestamps, qualities)
+    best = before = log_likelihood(params, prepared)
+    steps = {name: (high - low) / 4.0 for name, (low, high) in PARAM_BOUNDS.items()}
+
+    for _ in range(max_rounds):
+        improved = False
+        for name in PARAM_BOUNDS:
+            for direction in (1, -1):
+                candidate = dict(params)
+                candidate[name] = _clip(name, params[name] + direction * steps[name])
+                if candidate[name] == params[name]:
+                    continue
+                score = log_likelihood(candidate, prepared)
+                if score > best + 1e-9:
+                    best, params, improved = score, candidate, True
+                    break
+        if not improved:
+            steps = {name: step / 2.0 for name, step in steps.items()}
+            if max(step / (PARAM_BOUNDS[name][1] - PARAM_BOUNDS[name][0])
+                   for name, step in steps.items()) < 1e-3:
+                break
+
+    params["first_interval"] = round(params["first_interval"])
+    params["second_interval"] = round(params["second_interval"])
+    return {"params": params, "reviews": len(card_ids), "before": float(before),
+            "after": float(log_likelihood(params, prepared))}
+
+
+def _fit_worker(args):
+    deck_name, card_ids, timestamps, qualities = args
+    return deck_name, fit_params(card_ids, timestamps, qualities)
+
+
+def group_reviews_by_deck(history, deck_of_card):
+    """Separa as colunas do histórico por baralho.
+
+    deck_of_card mapeia id do cartão -> nome do baralho; revisões de
+    cartões que não existem mais são ignoradas.
+    """
+    _require_numpy()
+    columns = history.load()
+    card_ids = np.array(columns["card_id"], dtype=np.int64)
+    timestamps = np.array(columns["timestamp"], dtype=np.int64)
+    qualities = np.array(columns["quality"], dtype=np.int8)
+
+    deck_names = sorted(set(deck_of_card.values()))
+    code = {deck_name: i for i, deck_name in enumerate(deck_names)}
+    known_ids = np.array(sorted(deck_of_card), dtype=np.int64)
+    known_decks = np.array([code[deck_of_card[cid]] for cid in known_ids.tolist()],
+                           dtype=np.int64)
+
+    # Localizar o baralho de cada revisão por busca binária nos ids
+    pos = np.clip(np.searchsorted(known_ids, card_ids), 0, max(len(known_ids) - 1, 0))
+    found = (known_ids[pos] == card_ids) if len(known_ids) else np.zeros(len(card_ids), bool)
+    review_deck = np.where(found, known_decks[pos] if len(known_ids) else -1, -1)
+
+    # Uma ordenação estável por baralho (as revisões de cada um continuam
+    # em ordem cronológica) e os limites de cada fatia por busca binária
+    order = np.argsort(review_deck, kind="stable")
+    bounds = np.searchsorted(review_deck[order], np.arange(len(deck_names) + 1))
+    groups = {}
+    for i, deck_name in enumerate(deck_names):
+        rows = order[bounds[i]:bounds[i + 1]]
+        groups[deck_name] = (card_ids[rows], timestamps[rows], qualities[rows])
+    return groups
+
+
+def fit_decks(groups, max_workers=None):
+    """Ajusta vários baralhos em paralelo; retorna {baralho: resultado}"""
+    _require_numpy()
+    jobs = [(deck_name,) + tuple(columns) for deck_name, columns in groups.items()]
+    if len(jobs) <= 1 or max_workers == 1:
+        return dict(_fit_worker(job) for job in jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(_fit_worker, jobs))
@@ -0,0 +1,472 @@
+"""Servidor de revisão HTTP/JSON (asyncio) para vários alunos.
+
+Serve uma coleção compartilhada (somente leitura) para uma turma: cada
+aluno tem seu próprio estado de agendamento SM-2 por cartão. O laço de
+eventos nunca faz E/S de disco: o estado dos alunos é lido e gravado em
+lotes por uma thread auxiliar (run_in_executor).
+
+Uso:
+    python server.py --data flashcards_data --state server_state --port 8765
+
+Rotas:
+    GET  /                                   página simples de revisão
+    GET  /api/decks                          baralhos e total de cartões
+    GET  /api/cards/<id>                     frente e verso de um cartão
+    GET  /api/learners/<aluno>/due           fila de cartões pendentes
+                                             (?deck=<nome>&limit=<n>)
+    POST /api/learners/<aluno>/answers       {"card_id", "quality", "answer_ms"}
+    GET  /api/learners/<aluno>/stats         resumo do aluno
+"""
+import argparse
+import asyncio
+import datetime
+import heapq
+import json
+import os
+import re
+import signal
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from scheduler import schedule_review
+from storage import DeckStore, write_json_atomic
+
+LEARNER_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+MAX_BODY_SIZE = 64 * 1024
+DEFAULT_DUE_LIMIT = 20
+MAX_DUE_LIMIT = 200
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Learner:
+    """Estado de agendamento de um aluno e suas filas de cartões pendentes.
+
+    Cartões já vistos ficam em um heap por baralho ordenado pela data da
+    próxima revisão; quando vencem passam para a fila "ready". Cartões
+    nunca vistos são servidos na ordem do baralho a partir de new_pos.
+    """
+
+    def __init__(self, learner_id, states):
+        self.learner_id = learner_id
+        self.states = states          # id do cartão -> estado SM-2
+        self.heaps = {}               # baralho -> [(vencimento, id)]
+        self.ready = {}               # baralho -> {id: None} (ordem de chegada)
+        self.new_pos = {}             # baralho -> posição do próximo cartão novo
+
+    def _init_deck(self, deck_name, deck_cards):
+        heap = []
+        for card_id in deck_cards:
+            state = self.states.get(card_id)
+            if state is not None:
+                heap.append((state["due"], card_id))
+        heapq.heapify(heap)
+        self.heaps[deck_name] = heap
+        self.ready[deck_name] = {}
+        self.new_pos[deck_name] = 0
+
+    def due(self, deck_name, deck_cards, limit, now):
+        """Retorna até limit ids pendentes do baralho"""
+        if deck_name not in self.heaps:
+            self._init_deck(deck_name, deck_cards)
+        heap = self.heaps[deck_name]
+        ready = self.ready[deck_name]
+
+        while heap and heap[0][0] <= now:
+            due_ts, card_id = heapq.heappop(heap)
+            state = self.states.get(card_id)
+            # Entradas antigas (cartão reagendado depois) são descartadas
+            if state is not None and state["due"] == due_ts:
+                ready[card_id] = None
+
+        pos = self.new_pos[deck_name]
+        while len(ready) < limit and pos < len(deck_cards):
+            card_id = deck_cards[pos]
+            pos += 1
+            if card_id not in self.states:
+                ready[card_id] = None
+        self.new_pos[deck_name] = pos
+
+        result = []
+        for card_id in ready:
+            if len(result) >= limit:
+                break
+            result.append(card_id)
+        return result
+
+    def answer(self, deck_name, card_id, quality, params, now):
+        """Aplica o SM-2 ao estado do aluno para o cartão"""
+        state = self.states.get(card_id)
+        if state is None:
+            state = {"ease_factor": 2.5, "interval": 0, "repetitions": 0,
+                     "correct_streak": 0, "total_reviews": 0, "lapses": 0}
+            self.states[card_id] = state
+        schedule_review(state, quality, params, datetime.datetime.fromtimestamp(now))
+        state["due"] = now + state["interval"] * 86400
+        if quality == 0:
+            state["lapses"] = state.get("lapses", 0) + 1
+
+        if deck_name in self.heaps:
+            self.ready[deck_name].pop(card_id, None)
+            heapq.heappush(self.heaps[deck_name], (state["due"], card_id))
+        return state
+
+
+class ReviewService:
+    """Lógica de revisão independente de transporte"""
+
+    def __init__(self, data_dir, state_dir, flush_interval=2.0):
+        self.state_dir = state_dir
+        self.flush_interval = flush_interval
+        self.cards = {}
+        self.deck_cards = {}
+        self.card_deck = {}
+        self.params = {}
+        self.learners = {}
+        self._loading = {}
+        self._dirty = set()
+        self._pending_flush = None
+        self.load_collection(data_dir)
+
+    def load_collection(self, data_dir):
+        """Carrega a coleção inteira (feito uma vez, antes de servir)"""
+        store = DeckStore(data_dir)
+        manifest = store.read_manifest()
+        self.params = manifest["settings"].get("scheduler_params", {})
+        for deck_name in manifest["decks"]:
+            ids = []
+            for card in store.load_deck(deck_name):
+                self.cards[card["id"]] = {"id": card["id"], "front": card["front"],
+                                          "back": card["back"]}
+                self.card_deck[card["id"]] = deck_name
+                ids.append(card["id"])
+            self.deck_cards[deck_name] = ids
+
+    # ------------------------------------------------------------------
+    # Estado dos alunos (E/S sempre fora do laço de eventos)
+    # ------------------------------------------------------------------
+    def _learner_path(self, learner_id):
+        return os.path.join(self.state_dir, learner_id + ".json")
+
+    def _read_learner(self, learner_id):
+        path = self._learner_path(learner_id)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as file:
+            return {int(card_id): state for card_id, state in json.load(file).items()}
+
+    async def get_learner(self, learner_id):
+        learner = self.learners.get(learner_id)
+        if learner is not None:
+            return learner
+        # Vários pedidos simultâneos do mesmo aluno esperam a mesma leitura
+        pending = self._loading.get(learner_id)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(None, self._read_learner, learner_id)
+            self._loading[learner_id] = pending
+        try:
+            states = await pending
+        finally:
+            self._loading.pop(learner_id, None)
+        if learner_id not in self.learners:
+            self.learners[learner_id] = Learner(learner_id, states)
+        return self.learners[learner_id]
+
+    def _write_learners(self, snapshot):
+        os.makedirs(self.state_dir, exist_ok=True)
+        for learner_id, states in snapshot.items():
+            write_json_atomic(self._learner_path(learner_id), states)
+
+    async def flush(self):
+        """Grava em lote o estado dos alunos alterados desde o último flush"""
+        # Esperar uma gravação anterior ainda em andamento (asyncio.wait não
+        # cancela a gravação se quem espera for cancelado)
+        if self._pending_flush is not None:
+            await asyncio.wait([self._pending_flush])
+        if not self._dirty:
+            return
+        snapshot = {}
+        for learner_id in self._dirty:
+            states = self.learners[learner_id].states
+            snapshot[learner_id] = {str(card_id): dict(state) for card_id, state in states.items()}
+        self._dirty = set()
+        loop = asyncio.get_running_loop()
+        self._pending_flush = loop.run_in_executor(None, self._write_learners, snapshot)
+        await asyncio.wait([self._pending_flush])
+        if self._pending_flush.exception() is not None:
+            # Tentar de novo no próximo lote
+            self._dirty.update(snapshot)
+            raise self._pending_flush.exception()
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except OSError as e:
+                print(f"Erro ao gravar estado dos alunos: {e}")
+
+    # ------------------------------------------------------------------
+    # Operações da API
+    # ------------------------------------------------------------------
+    def list_decks(self):
+        return {"decks": [{"name": name, "cards": len(ids)}
+                          for name, ids in self.deck_cards.items()]}
+
+    def get_card(self, card_id):
+        card = self.cards.get(card_id)
+        if card is None:
+            raise HTTPError(404, "cartão não encontrado")
+        return dict(card, deck=self.card_deck[card_id])
+
+    async def due(self, learner_id, deck_name, limit):
+        learner = await self.get_learner(learner_id)
+        now = time.time()
+        if deck_name is not None:
+            if deck_name not in self.deck_cards:
+                raise HTTPError(404, "baralho não encontrado")
+            decks = [deck_name]
+        else:
+            decks = list(self.deck_cards)
+        result = []
+        for name in decks:
+            if len(result) >= limit:
+                break
+            result.extend(learner.due(name, self.deck_cards[name], limit - len(result), now))
+        return {"learner": learner_id, "due": result}
+
+    async def answer(self, learner_id, payload):
+        try:
+            card_id = int(payload["card_id"])
+            quality = int(payload["quality"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, "card_id e quality são obrigatórios")
+        if quality not in (0, 1, 2, 3):
+            raise HTTPError(400, "quality deve estar entre 0 e 3")
+        deck_name = self.card_deck.get(card_id)
+        if deck_name is None:
+            raise HTTPError(404, "cartão não encontrado")
+
+        learner = await self.get_learner(learner_id)
+        state = learner.answer(deck_name, card_id, quality,
+                               self.params.get(deck_name), time.time())
+        self._dirty.add(learner_id)
+        return {"card_id": card_id, "interval": state["interval"],
+                "ease_factor": state["ease_factor"], "next_review": state["next_review"]}
+
+    async def stats(self, learner_id):
+        learner = await self.get_learner(learner_id)
+        now = time.time()
+        states = learner.states.values()
+        return {
+            "learner": learner_id,
+            "seen": len(learner.states),
+            "unseen": len(self.cards) - len(learner.states),
+            "due_now": sum(1 for state in states if state["due"] <= now),
+            "total_reviews": sum(state["total_reviews"] for state in states),
+            "lapses": sum(state.get("lapses", 0) for state in states),
+        }
+
+
+# ----------------------------------------------------------------------
+# HTTP
+# ----------------------------------------------------------------------
+REVIEW_PAGE = """<!DOCTYPE html>
+<html lang="pt-br"><head><meta charset="utf-8"><title>PyCard</title>
+<style>body{font-family:Arial;max-width:640px;margin:40px auto}
+#card{border:2px solid #ddd;padding:24px;min-height:120px;font-size:20px}
+button{font-size:16px;margin:6px;padding:8px 14px}</style></head>
+<body><h2>🧠 PyCard</h2>
+<p>Aluno: <input id="learner" value="aluno1"> <button onclick="next()">Começar</button></p>
+<div id="card"></div><div id="buttons"></div>
+<script>
+let card=null;
+const api=(p,o)=>fetch(p,o).then(r=>r.json());
+const learner=()=>encodeURIComponent(document.getElementById('learner').value);
+async function next(){
+  const d=await api('/api/learners/'+learner()+'/due?limit=1');
+  const box=document.getElementById('card'), btns=document.getElementById('buttons');
+  if(!d.due||!d.due.length){box.textContent='🎉 Revisão completa!';btns.innerHTML='';return;}
+  card=await api('/api/cards/'+d.due[0]);
+  box.textContent=card.front;
+  btns.innerHTML='<button onclick="show()">💡 Mostrar Resposta</button>';
+}
+function show(){
+  document.getElementById('card').textContent=card.front+' → '+card.back;
+  document.getElementById('buttons').innerHTML=['Esqueci','Difícil','Bom','Fácil']
+    .map((t,q)=>'<button onclick="rate('+q+')">'+t+'</button>').join('');
+}
+async function rate(q){
+  await api('/api/learners/'+learner()+'/answers',{method:'POST',
+    headers:{'Content-Type':'application/json'},body:JSON.stringify({card_id:card.id,quality:q})});
+  next();
+}
+</script></body></html>
+"""
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large",
+               500: "Internal Server Error"}
+
+
+class ReviewServer:
+    """Servidor HTTP/1.1 mínimo (keep-alive, corpo JSON) sobre asyncio"""
+
+    max_body_size = MAX_BODY_SIZE
+
+    def __init__(self, service):
+        self.service = service
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        query = parse_qs(url.query)
+
+        if not parts and method == "GET":
+            return 200, REVIEW_PAGE.encode("utf-8"), "text/html; charset=utf-8"
+        if not parts or parts[0] != "api":
+            raise HTTPError(404, "rota não encontrada")
+        parts = parts[1:]
+
+        if parts == ["decks"] and method == "GET":
+            result = self.service.list_decks()
+        elif len(parts) == 2 and parts[0] == "cards" and method == "GET":
+            try:
+                card_id = int(parts[1])
+            except ValueError:
+                raise HTTPError(404, "cartão não encontrado")
+            result = self.service.get_card(card_id)
+        elif len(parts) == 3 and parts[0] == "learners":
+            learner_id, action = parts[1], parts[2]
+            if not LEARNER_ID_RE.match(learner_id):
+                raise HTTPError(400, "id de aluno inválido")
+            if action == "due" and method == "GET":
+                try:
+                    limit = int(query.get("limit", [DEFAULT_DUE_LIMIT])[0])
+                except ValueError:
+                    raise HTTPError(400, "limit inválido")
+                limit = max(1, min(MAX_DUE_LIMIT, limit))
+                deck_name = query.get("deck", [None])[0]
+                result = await self.service.due(learner_id, deck_name, limit)
+            elif action == "answers" and method == "POST":
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    raise HTTPError(400, "JSON inválido")
+                if not isinstance(payload, dict):
+                    raise HTTPError(400, "JSON inválido")
+                result = await self.service.answer(learner_id, payload)
+            elif action == "stats" and method == "GET":
+                result = await self.service.stats(learner_id)
+            else:
+                raise HTTPError(405, "método não permitido")
+        else:
+            raise HTTPError(404, "rota não encontrada")
+
+        payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        return 200, payload, "application/json; charset=utf-8"
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (version == "HTTP/1.1" and
+                              headers.get("connection", "").lower() != "close")
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length > self.max_body_size:
+                        raise HTTPError(413, "corpo muito grande")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload, content_type = await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, content_type = e.status, "application/json; charset=utf-8"
+                    payload = json.dumps({"error": e.message}, ensure_ascii=False).encode("utf-8")
+                    if e.status == 413:
+                        keep_alive = False
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    raise
+                except Exception as e:
+                    status, content_type = 500, "application/json; charset=utf-8"
+                    payload = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(data_dir, state_dir, host, port, flush_interval):
+    service = ReviewService(data_dir, state_dir, flush_interval)
+    server = ReviewServer(service)
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port, backlog=4096)
+    flusher = asyncio.create_task(service.flush_periodically())
+
+    # Encerrar com Ctrl+C/SIGTERM gravando o estado pendente
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+
+    print(f"PyCard servindo {len(service.cards)} cartões em http://{host}:{port}/")
+    try:
+        await stop.wait()
+    finally:
+        tcp_server.close()
+        flusher.cancel()
+        try:
+            await flusher
+        except asyncio.CancelledError:
+            pass
+        await service.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de revisão do PyCard")
+    parser.add_argument("--data", default="flashcards_data", help="pasta da coleção")
+    parser.add_argument("--state", default="server_state", help="pasta do estado dos alunos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--flush-interval", type=float, default=2.0,
+                        help="segundos entre gravações em lote")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.data, args.state, args.host, args.port, args.flush_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""Armazenamento da coleção em arquivos separados por baralho.
+
+Layout em disco:
+
+    flashcards_data/
+        manifest.json        configurações + lista de baralhos (nome, arquivo, total,
+                             revisões agendadas por dia)
+        decks/deck_0001.json cartões de um baralho
+
+Apenas os baralhos alterados são regravados, e cada baralho só é lido
+quando é usado pela primeira vez. Os arquivos de baralho têm nome fixo
+(renomear um baralho altera apenas o manifesto).
+
+Vários processos podem usar a mesma pasta: as gravações são feitas sob um
+lock consultivo (flock/msvcrt) e o manifesto guarda um contador de versão
+global e um por baralho, para que cada processo detecte e incorpore as
+alterações dos outros antes de gravar (ver merge_deck_cards).
+
+Snapshots (a coleção inteira em um arquivo JSON único, usado em backups)
+podem ser comprimidos com gzip (.gz) ou lzma (.xz), conforme a extensão.
+Eles são gravados e lidos em fluxo, um cartão por vez: nem o texto JSON
+inteiro nem o arquivo descomprimido ficam na memória.
+"""
+import gzip
+import json
+import lzma
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+STORAGE_FORMAT = 1
+# Versão das regras de integridade (ver integrity.py) que a pasta de dados
+# cumpre; pastas com versão menor são verificadas e compactadas ao abrir
+SCHEMA_VERSION = 2
+SNAPSHOT_EXTENSIONS = (".json", ".json.gz", ".json.xz")
+# Tamanho dos blocos lidos do snapshot (em caracteres)
+READ_CHUNK = 1 << 16
+MANIFEST_NAME = "manifest.json"
+DECKS_DIR = "decks"
+LOCK_NAME = ".lock"
+
+
+@contextmanager
+def file_lock(path):
+    """Lock exclusivo e consultivo entre processos, liberado ao sair do bloco.
+
+    Não é reentrante: o mesmo processo não deve abrir o lock duas vezes.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a+b") as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_json_atomic(path, data, indent=None):
+    """Grava JSON em um arquivo temporário e o substitui de uma vez, para
+    que uma interrupção nunca deixe um arquivo pela metade"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        if indent is None:
+            # json.dumps sem indentação usa o codificador em C (json.dump
+            # nunca usa, pois codifica em pedaços), bem mais rápido
+            file.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+        else:
+            json.dump(data, file, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def open_data_file(path, mode="r"):
+    """Abre um arquivo de texto, comprimido ou não conforme a extensão
+    (.gz: gzip; .xz/.lzma: lzma)"""
+    lower = path.lower()
+    if lower.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    if lower.endswith((".xz", ".lzma")):
+        return lzma.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_snapshot(path, data):
+    """Grava um objeto JSON em fluxo, com compressão conforme a extensão.
+
+    Listas e dicionários do primeiro nível são escritos item a item (um
+    por linha, cada um codificado pelo json.dumps em C), então só um
+    cartão por vez existe como texto. A gravação é atômica, como em
+    write_json_atomic.
+    """
+    root, ext = os.path.splitext(path)
+    tmp_path = root + ".tmp" + ext   # mantém a extensão (e a compressão)
+    dumps = json.dumps
+    with open_data_file(tmp_path, "w") as file:
+        file.write("{")
+        for n, (key, value) in enumerate(data.items()):
+            file.write(",\n" if n else "\n")
+            file.write(dumps(key) + ": ")
+            if isinstance(value, list):
+                file.write("[")
+                for i, item in enumerate(value):
+                    file.write(",\n" if i else "\n")
+                    file.write(dumps(item, ensure_ascii=False))
+                file.write("\n]")
+            elif isinstance(value, dict):
+                file.write("{")
+                for i, (item_key, item) in enumerate(value.items()):
+                    file.write(",\n" if i else "\n")
+                    file.write(dumps(item_key, ensure_ascii=False) + ": ")
+                    file.write(dumps(item, ensure_ascii=False))
+                file.write("\n}")
+            else:
+                file.write(dumps(value, ensure_ascii=False))
+        file.write("\n}\n")
+    os.replace(tmp_path, path)
+
+
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+
+class _JsonStream:
+    """Leitor de JSON em fluxo.
+
+    Os contêineres do primeiro e do segundo nível são percorridos item a
+    item; cada item (um cartão, a lista de um baralho) é decodificado pelo
+    JSONDecoder em C a partir de um buffer que só guarda o trecho ainda não
+    lido.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        # Lê pelo menos o tamanho do que está pendente, para que um item
+        # grande seja completado em poucas leituras
+        chunk = self.file.read(max(READ_CHUNK, len(self.buffer) - self.pos))
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def peek(self):
+        """Próximo caractere que não é espaço ("" no fim do arquivo)"""
+        while True:
+            self.pos = _WHITESPACE_RE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self._error(f"Esperado {char!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decodifica um valor inteiro (um cartão, um número...)"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # Um número no fim do buffer pode continuar no próximo bloco
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            self._fill()
+
+    def _items(self, close):
+        """Percorre os separadores de um contêiner já aberto"""
+        if self.peek() == close:
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == close:
+                return
+            if char != ",":
+                self.pos -= 1
+                raise self._error(f"Esperado ',' ou {close!r}")
+
+    def container(self, depth):
+        """Decodifica o valor seguinte, percorrendo item a item os
+        contêineres até a profundidade informada"""
+        char = self.peek()
+        if depth <= 0 or char not in "[{":
+            return self.value()
+        self.pos += 1
+        if char == "[":
+            return [self.container(depth - 1) for _ in self._items("]")]
+        result = {}
+        for _ in self._items("}"):
+            key = self.value()
+            if not isinstance(key, str):
+                raise self._error("Chave inválida")
+            self.expect(":")
+            result[key] = self.container(depth - 1)
+        return result
+
+
+def read_snapshot(path):
+    """Lê um snapshot (comprimido ou não, conforme a extensão) em fluxo"""
+    with open_data_file(path) as file:
+        stream = _JsonStream(file)
+        if stream.peek() != "{":
+            raise stream._error("O snapshot deve ser um objeto JSON")
+        data = stream.container(depth=2)
+        if stream.peek():
+            raise stream._error("Dados extras após o JSON")
+    return data
+
+
+def due_days(cards):
+    """{dia: cartões} das próximas revisões de um baralho, sem os suspensos
+    (a mesma contagem de CardIndex.day_load, para baralhos não carregados)"""
+    return dict(Counter(card["next_review"][:10] for card in cards
+                        if card.get("next_review") and not card.get("suspended")))
+
+
+def load_deck_file(path):
+    """Cartões de um arquivo de baralho (lista vazia se ele não existe)"""
+    if not os.path.exists(path):  # baralho criado vazio e nunca gravado
+        return []
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file).get("cards", [])
+
+
+class DeckStore:
+    """Manifesto + um arquivo JSON por baralho.
+
+    deck_files é o mapeamento nome -> arquivo em uso por este processo
+    (inclui renomeações locais ainda não gravadas); disk_files e
+    file_versions refletem o manifesto como estava na última leitura ou
+    gravação feita por este processo.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.decks_path = os.path.join(directory, DECKS_DIR)
+        self.deck_files = {}
+        self.disk_files = {}
+        self.file_versions = {}
+        self.file_due_days = {}   # arquivo -> due_days dos cartões gravados
+        self.version = 0
+        # Uma pasta nova é criada já canônica; a de uma pasta existente vem do manifesto
+        self.schema = SCHEMA_VERSION
+        self._next_file_id = 1
+        self._manifest_stat = None
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def lock(self):
+        """Lock da pasta de dados; use em volta de leitura + merge + gravação"""
+        return file_lock(os.path.join(self.directory, LOCK_NAME))
+
+    def _stat(self):
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def changed_on_disk(self):
+        """Verificação barata (mtime/tamanho) se outro processo gravou o
+        manifesto desde a última leitura ou gravação deste processo"""
+        return self._stat() != self._manifest_stat
+
+    def read_manifest(self):
+        """Lê o manifesto e retorna {"settings": {...}, "decks": {nome: total}}"""
+        with open(self.manifest_path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+
+        self._manifest_stat = self._stat()
+        self.deck_files = {}
+        self.file_versions = {}
+        self.file_due_days = {}
+        deck_counts = {}
+        for entry in manifest.get("decks", []):
+            self.deck_files[entry["name"]] = entry["file"]
+            self.file_versions[entry["file"]] = entry.get("version", 0)
+            self.file_due_days[entry["file"]] = entry.get("due_days", {})
+            deck_counts[entry["name"]] = entry.get("count", 0)
+        self.disk_files = dict(self.deck_files)
+        self.version = manifest.get("version", 0)
+        self.schema = manifest.get("schema", 0)
+        self._next_file_id = manifest.get("next_file_id", len(self.deck_files) + 1)
+        return {"settings": manifest.get("settings", {}), "decks": deck_counts}
+
+    def deck_path(self, deck_name):
+        """Caminho do arquivo de um baralho (None se não há arquivo)"""
+        file_name = self.deck_files.get(deck_name)
+        if file_name is None:
+            return None
+        return os.path.join(self.decks_path, file_name)
+
+    def deck_due_days(self, deck_name):
+        """{dia: cartões agendados} de um baralho como está gravado, sem lê-lo
+        (vazio para baralhos gravados antes de o manifesto guardar a contagem)"""
+        return self.file_due_days.get(self.deck_files.get(deck_name), {})
+
+    def load_deck(self, deck_name):
+        """Lê os cartões de um baralho"""
+        path = self.deck_path(deck_name)
+        return load_deck_file(path) if path is not None else []
+
+    def rename_deck(self, old_name, new_name):
+        """Renomeia um baralho sem regravar seus cartões"""
+        if old_name in self.deck_files:
+            self.deck_files[new_name] = self.deck_files.pop(old_name)
+
+    def modify_deck(self, deck_name, func):
+        """Altera um baralho a partir de um script, sem a interface.
+
+        Sob o lock, relê o manifesto e o baralho, aplica func(cartões,
+        próximo id livre) -> (cartões, próximo id livre) e grava. O
+        aplicativo aberto incorpora a mudança no próximo salvamento.
+        """
+        with self.lock():
+            if self.exists():
+                manifest = self.read_manifest()
+            else:
+                manifest = {"settings": {}, "decks": {}}
+            settings = manifest["settings"]
+            deck_counts = manifest["decks"]
+            cards, settings["next_card_id"] = func(self.load_deck(deck_name),
+                                                   settings.get("next_card_id", 1))
+            deck_counts[deck_name] = len(cards)
+            self.save(settings, deck_counts, {deck_name: cards})
+        return cards
+
+    def _file_for(self, deck_name):
+        if deck_name not in self.deck_files:
+            self.deck_files[deck_name] = f"deck_{self._next_file_id:04d}.json"
+            self._next_file_id += 1
+        return self.deck_files[deck_name]
+
+    def save(self, settings, deck_counts, changed_decks):
+        """Grava os baralhos alterados e o manifesto.
+
+        deck_counts: {nome: total de cartões} de todos os baralhos, na ordem
+        de exibição; changed_decks: {nome: lista de cartões} só dos alterados.
+        Arquivos de baralhos que não existem mais são removidos.
+        """
+        os.makedirs(self.decks_path, exist_ok=True)
+
+        for deck_name, cards in changed_decks.items():
+            file_name = self._file_for(deck_name)
+            self.file_versions[file_name] = self.file_versions.get(file_name, 0) + 1
+            self.file_due_days[file_name] = due_days(cards)
+            write_json_atomic(os.path.join(self.decks_path, file_name),
+                              {"name": deck_name, "cards": cards})
+
+        for deck_name in list(self.deck_files):
+            if deck_name not in deck_counts:
+                del self.deck_files[deck_name]
+        in_use = set(self.deck_files.values())
+        removed = [file_name for file_name in self.disk_files.values() if file_name not in in_use]
+
+        self.version += 1
+        manifest = {
+            "format": STORAGE_FORMAT,
+            "version": self.version,
+            "schema": self.schema,
+            "settings": settings,
+            "next_file_id": self._next_file_id,
+            "decks": [{"name": name, "file": self._file_for(name), "count": count,
+                       "version": self.file_versions.get(self._file_for(name), 0),
+                       "due_days": self.file_due_days.get(self._file_for(name), {})}
+                      for name, count in deck_counts.items()],
+        }
+        write_json_atomic(self.manifest_path, manifest, indent=4)
+        self._manifest_stat = self._stat()
+        self.disk_files = dict(self.deck_files)
+
+        # Só apagar os arquivos depois que o manifesto deixou de citá-los
+        for file_name in removed:
+            self.file_versions.pop(file_name, None)
+            self.file_due_days.pop(file_name, None)
+            path = os.path.join(self.decks_path, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _card_mod(card):
+    return card.get("mod", 0) if card is not None else None
+
+
+def merge_deck_cards(base, ours, theirs):
+    """Junta as alterações locais e externas de um baralho (merge de três vias).
+
+    base: {id: mod} dos cartões como estavam no disco quando este processo
+    leu ou gravou o baralho pela última vez; ours/theirs: listas de cartões
+    em memória e no disco. O carimbo "mod" de cada cartão muda a cada
+    alteração, então um lado alterou o cartão se o mod difere da base.
+
+    Retorna (cartões, conflitos, colisões). Em um conflito (os dois lados
+    alteraram o mesmo cartão de formas diferentes) vence a alteração mais
+    recente. Colisões são cartões novos locais cujo id também foi usado por
+    um cartão novo externo: os dois são mantidos e o chamador deve dar um
+    novo id aos cartões locais listados.
+    """
+    ours_by_id = {card["id"]: card for card in ours}
+    theirs_by_id = {card["id"]: card for card in theirs}
+    merged = []
+    conflicts = []
+    collisions = []
+
+    for card in ours:
+        card_id = card["id"]
+        other = theirs_by_id.get(card_id)
+        ours_changed = _card_mod(card) != base.get(card_id)
+        if other is None:
+            if card_id not in base or ours_changed:
+                # Novo aqui, ou excluído lá mas alterado aqui
+                if card_id in base:
+                    conflicts.append(card)
+                merged.append(card)
+            continue
+        if card_id not in base:
+            collisions.append(card)
+            merged.append(card)
+            merged.append(other)
+            continue
+        theirs_changed = _card_mod(other) != base.get(card_id)
+        if ours_changed and theirs_changed and card != other:
+            conflicts.append(card)
+            merged.append(card if _card_mod(card) >= _card_mod(other) else other)
+        elif theirs_changed:
+            merged.append(other)
+        else:
+            merged.append(card)
+
+    for card in theirs:
+        card_id = card["id"]
+        if card_id in ours_by_id:
+            continue
+        if card_id not in base:
+            merged.append(card)   # criado (ou movido para cá) lá
+        elif _card_mod(card) != base.get(card_id):
+            conflicts.append(card)  # excluído aqui mas alterado lá: mantém a exclusão
+    return merged, conflicts, collisions
@@ -0,0 +1,317 @@
+"""Sincronização incremental da coleção com um servidor (ver sync_server.py).
+
+Só as alterações feitas desde a última sincronização são trocadas, nos dois
+sentidos, em lotes JSON comprimidos com gzip:
+
+- cartões: cada cartão guarda em "usn" a versão do servidor em que foi
+  sincronizado pela última vez; touch_card marca "usn" = -1 (pendente) e
+  cartões sem "usn" nunca foram enviados. Só os baralhos cujo arquivo mudou
+  desde a última sincronização precisam ser lidos para achar os pendentes;
+- exclusões de cartões e operações de baralho (criar, renomear, excluir)
+  ficam em um diário (sync_journal.jsonl) gravado pelo aplicativo junto com
+  o salvamento, e é esvaziado após cada sincronização.
+
+O estado da sincronização (servidor, versão, versões dos arquivos de
+baralho e um índice arquivo -> ids dos cartões) fica em sync.json, na pasta
+de dados. Tudo é feito sob o lock da pasta, como os demais escritores.
+
+Uso sem a interface:
+    python sync.py --server http://127.0.0.1:8766
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+from storage import DeckStore, write_json_atomic
+
+SYNC_STATE_NAME = "sync.json"
+JOURNAL_NAME = "sync_journal.jsonl"
+CONTENT_TYPE = "application/x-pycard-sync"
+DECK_OPS = ("add_deck", "rename_deck", "delete_deck")
+
+
+class SyncError(Exception):
+    pass
+
+
+def encode_batch(data):
+    """Serializa um lote de sincronização (JSON compacto + gzip)"""
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(raw, compresslevel=6)
+
+
+def decode_batch(body):
+    return json.loads(gzip.decompress(body).decode("utf-8"))
+
+
+# ----------------------------------------------------------------------
+# Estado local e diário
+# ----------------------------------------------------------------------
+def read_sync_state(directory):
+    """Estado da última sincronização, ou None se nunca sincronizou"""
+    path = os.path.join(directory, SYNC_STATE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def record_changes(directory, entries):
+    """Anexa ao diário exclusões e operações de baralho.
+
+    Deve ser chamado com o lock da pasta de dados. Sem sincronização
+    configurada não há nada a registrar (a primeira sincronização envia a
+    coleção inteira).
+    """
+    if not entries or read_sync_state(directory) is None:
+        return
+    with open(os.path.join(directory, JOURNAL_NAME), "a", encoding="utf-8") as file:
+        for entry in entries:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def read_journal(directory):
+    path = os.path.join(directory, JOURNAL_NAME)
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+def post_batch(server_url, data, timeout=30.0):
+    """Envia um lote ao servidor; retorna (resposta, bytes enviados, bytes recebidos)"""
+    body = encode_batch(data)
+    request = urllib.request.Request(server_url.rstrip("/") + "/sync", data=body,
+                                     headers={"Content-Type": CONTENT_TYPE}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            reply = response.read()
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", str(e))
+        except ValueError:
+            message = str(e)
+        raise SyncError(f"o servidor recusou a sincronização: {message}")
+    except (urllib.error.URLError, OSError) as e:
+        raise SyncError(f"não foi possível contatar o servidor: {e}")
+    return decode_batch(reply), len(body), len(reply)
+
+
+# ----------------------------------------------------------------------
+# Sincronização
+# ----------------------------------------------------------------------
+def sync_collection(store, server_url=None, timeout=30.0):
+    """Sincroniza a pasta de dados de store com o servidor.
+
+    Retorna um resumo com "sent", "received", "bytes_sent",
+    "bytes_received", "seconds" e "version". Se server_url for diferente do
+    servidor usado antes, a coleção inteira é enviada (sincronização total).
+    """
+    start = time.perf_counter()
+    with store.lock():
+        state = read_sync_state(store.directory) or {}
+        server_url = server_url or state.get("server")
+        if not server_url:
+            raise SyncError("nenhum servidor de sincronização configurado")
+        if server_url != state.get("server"):
+            state = {"server": server_url}
+        since = state.get("version", 0)
+
+        if store.exists():
+            manifest = store.read_manifest()
+        else:
+            manifest = {"settings": {}, "decks": {}}
+        settings = manifest["settings"]
+        deck_counts = dict(manifest["decks"])
+        deck_counts.setdefault("Geral", 0)
+
+        decks = {}
+
+        def load(deck_name):
+            if deck_name not in decks:
+                decks[deck_name] = store.load_deck(deck_name)
+            return decks[deck_name]
+
+        # Cartões pendentes: só nos baralhos cujo arquivo mudou
+        known_versions = state.get("deck_versions", {})
+        outgoing = []
+        for deck_name in deck_counts:
+            file_name = store.deck_files.get(deck_name)
+            if (since and file_name is not None and
+                    known_versions.get(file_name) == store.file_versions.get(file_name)):
+                continue
+            for card in load(deck_name):
+                if card.get("usn", -1) == -1:
+                    outgoing.append(dict(card, deck=deck_name))
+
+        journal = read_journal(store.directory)
+        if since:
+            deck_ops = [entry for entry in journal if entry["op"] in DECK_OPS]
+        else:
+            deck_ops = [{"op": "add_deck", "name": deck_name} for deck_name in deck_counts]
+        graves = [entry["id"] for entry in journal if entry["op"] == "delete_card"]
+
+        reply, bytes_sent, bytes_received = post_batch(server_url, {
+            "since": since,
+            "next_card_id": settings.get("next_card_id", 1),
+            "deck_ops": deck_ops,
+            "cards": outgoing,
+            "graves": graves,
+        }, timeout)
+        version = reply["version"]
+        changed = set()
+
+        # Confirmar os enviados (e aplicar ids trocados pelo servidor)
+        renumbered = {int(old_id): new_id for old_id, new_id in reply.get("renumbered", {}).items()}
+        for deck_name, cards in decks.items():
+            for card in cards:
+                if card.get("usn", -1) == -1:
+                    card["usn"] = version
+                    if card["id"] in renumbered:
+                        card["id"] = renumbered[card["id"]]
+                    changed.add(deck_name)
+
+        for op in reply.get("deck_ops", []):
+            _apply_deck_op(op, store, deck_counts, decks, load, changed)
+
+        # Alterações e exclusões vindas do servidor, agrupadas por baralho
+        saved_index = state.get("card_files", {})
+        updates = {}
+        additions = {}
+        if reply.get("cards") or reply.get("graves"):
+            # Índice id -> baralho: baralhos não lidos vêm do índice salvo
+            file_names = {file_name: deck_name for deck_name, file_name in store.deck_files.items()}
+            card_deck = {}
+            for file_name, ids in saved_index.items():
+                deck_name = file_names.get(file_name)
+                if deck_name is not None and deck_name not in decks:
+                    for card_id in ids:
+                        card_deck[card_id] = deck_name
+            for deck_name, cards in decks.items():
+                for card in cards:
+                    card_deck[card["id"]] = deck_name
+
+            for card_id in reply.get("graves", []):
+                deck_name = card_deck.pop(card_id, None)
+                if deck_name is not None:
+                    updates.setdefault(deck_name, {})[card_id] = None
+            for card in reply.get("cards", []):
+                deck_name = card.pop("deck")
+                if deck_name not in deck_counts:
+                    deck_counts[deck_name] = 0
+                current = card_deck.get(card["id"])
+                if current == deck_name:
+                    updates.setdefault(deck_name, {})[card["id"]] = card
+                    continue
+                if current is not None:
+                    updates.setdefault(current, {})[card["id"]] = None
+                additions.setdefault(deck_name, []).append(card)
+                card_deck[card["id"]] = deck_name
+
+        for deck_name in set(updates) | set(additions):
+            replaced = updates.get(deck_name, {})
+            cards = []
+            for card in load(deck_name):
+                new = replaced.get(card["id"], card)
+                if new is not None:
+                    cards.append(new)
+            cards.extend(additions.get(deck_name, []))
+            decks[deck_name] = cards
+            changed.add(deck_name)
+
+        for deck_name, cards in decks.items():
+            deck_counts[deck_name] = len(cards)
+        settings["next_card_id"] = max(settings.get("next_card_id", 1),
+                                       reply.get("next_card_id", 1))
+        changed_decks = {deck_name: decks[deck_name] for deck_name in changed
+                         if deck_name in deck_counts}
+        store.save(settings, deck_counts, changed_decks)
+
+        # Novo estado: versões e ids de cada arquivo de baralho (os
+        # baralhos não lidos não mudaram, então o índice salvo vale)
+        card_files = {}
+        for deck_name in deck_counts:
+            file_name = store.deck_files[deck_name]
+            if deck_name in decks:
+                card_files[file_name] = [card["id"] for card in decks[deck_name]]
+            else:
+                card_files[file_name] = saved_index.get(file_name, [])
+        state.update({
+            "version": version,
+            "last_sync": time.time(),
+            "deck_versions": dict(store.file_versions),
+            "card_files": card_files,
+        })
+        write_json_atomic(os.path.join(store.directory, SYNC_STATE_NAME), state)
+        journal_path = os.path.join(store.directory, JOURNAL_NAME)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+
+    return {
+        "sent": len(outgoing) + len(graves) + len(deck_ops),
+        "received": len(reply.get("cards", [])) + len(reply.get("graves", []))
+                    + len(reply.get("deck_ops", [])),
+        "bytes_sent": bytes_sent,
+        "bytes_received": bytes_received,
+        "seconds": time.perf_counter() - start,
+        "version": version,
+    }
+
+
+def _apply_deck_op(op, store, deck_counts, decks, load, changed):
+    """Aplica localmente uma operação de baralho feita em outro dispositivo"""
+    kind = op["op"]
+    if kind == "add_deck":
+        deck_counts.setdefault(op["name"], 0)
+    elif kind == "rename_deck":
+        old_name, new_name = op["old"], op["new"]
+        if old_name not in deck_counts or new_name in deck_counts:
+            return
+        # Renomear preserva a ordem dos baralhos
+        items = [(new_name if name == old_name else name, count)
+                 for name, count in deck_counts.items()]
+        deck_counts.clear()
+        deck_counts.update(items)
+        store.rename_deck(old_name, new_name)
+        if old_name in decks:
+            decks[new_name] = decks.pop(old_name)
+        if old_name in changed:
+            changed.discard(old_name)
+            changed.add(new_name)
+    elif kind == "delete_deck":
+        deck_name = op["name"]
+        if deck_name == "Geral" or deck_name not in deck_counts:
+            return
+        # Como no aplicativo, os cartões vão para o baralho Geral
+        load("Geral").extend(load(deck_name))
+        del deck_counts[deck_name]
+        decks.pop(deck_name, None)
+        changed.discard(deck_name)
+        changed.add("Geral")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza a coleção do PyCard")
+    parser.add_argument("--server", help="URL do servidor (padrão: o último usado)")
+    parser.add_argument("--data", default="flashcards_data", help="pasta de dados")
+    args = parser.parse_args()
+    try:
+        summary = sync_collection(DeckStore(args.data), args.server)
+    except SyncError as e:
+        raise SystemExit(f"Erro: {e}")
+    print(f"Enviados: {summary['sent']} ({summary['bytes_sent']} bytes), "
+          f"recebidos: {summary['received']} ({summary['bytes_received']} bytes), "
+          f"{summary['seconds'] * 1000:.0f} ms, versão {summary['version']}")
+
+
+if __name__ == "__main__":
+    main()
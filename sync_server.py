@@ -0,0 +1,321 @@
+"""Servidor de referência da sincronização (ver sync.py).
+
+Mantém a coleção sincronizada em memória. Cada sincronização aceita recebe
+um número de versão; cada cartão guarda a versão em que mudou pela última
+vez ("usn"), e uma lista de (versão, id) em ordem crescente permite
+responder "o que mudou desde a versão N" sem percorrer a coleção.
+
+Em disco, um snapshot (snapshot.json) mais um log somente-anexação com uma
+linha por sincronização (log.jsonl); o log é compactado no snapshot quando
+cresce. As gravações rodam em uma única thread auxiliar, na ordem das
+versões, e a resposta só é enviada depois que o lote foi gravado.
+
+Uso:
+    python sync_server.py --dir sync_data --port 8766
+
+Rotas:
+    POST /sync      lote comprimido (sync.encode_batch) -> lote de resposta
+    GET  /status    versão atual e totais
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from server import HTTPError, ReviewServer
+from storage import write_json_atomic
+from sync import CONTENT_TYPE, decode_batch, encode_batch
+
+SNAPSHOT_NAME = "snapshot.json"
+LOG_NAME = "log.jsonl"
+MAX_SYNC_BODY_SIZE = 256 * 1024 * 1024
+# Compactar quando o log passar deste tamanho (e do próprio snapshot)
+MIN_COMPACT_SIZE = 4 * 1024 * 1024
+
+
+class SyncCollection:
+    """Coleção do servidor: cartões (ou lápides de excluídos) por id"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.version = 0
+        self.next_card_id = 1
+        self.decks = ["Geral"]
+        self.records = {}         # id -> cartão com "deck" e "usn", ou lápide
+        self.change_usns = []     # versões, em ordem crescente...
+        self.change_ids = []      # ...e o id alterado em cada uma
+        self.deck_ops = []        # [(versão, operação)]
+        self.log_size = 0
+        self.snapshot_size = 0
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+    def load(self):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                snapshot = json.load(file)
+            self.version = snapshot["version"]
+            self.next_card_id = snapshot["next_card_id"]
+            self.decks = snapshot["decks"]
+            self.deck_ops = [tuple(item) for item in snapshot.get("deck_ops", [])]
+            for record in sorted(snapshot["records"], key=lambda record: record["usn"]):
+                self._store(record)
+            self.snapshot_size = os.path.getsize(self.snapshot_path)
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # linha incompleta: gravação interrompida
+                    self._replay(entry)
+            self.log_size = os.path.getsize(self.log_path)
+
+    def _replay(self, entry):
+        version = entry["version"]
+        for op in entry["deck_ops"]:
+            self._apply_deck_op(op)
+            self.deck_ops.append((version, op))
+        for record in entry["records"]:
+            self._store(record)
+        self.next_card_id = entry["next_card_id"]
+        self.version = version
+
+    def write_entry(self, line):
+        """Anexa uma sincronização ao log (roda na thread de gravação)"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as file:
+            file.write(line)
+        self.log_size += len(line.encode("utf-8"))
+
+    def needs_compaction(self):
+        return self.log_size > max(MIN_COMPACT_SIZE, self.snapshot_size)
+
+    def snapshot_data(self):
+        """Cópia rasa do estado para compactar fora do laço de eventos
+        (os registros nunca são alterados in-place, só substituídos)"""
+        return {
+            "version": self.version,
+            "next_card_id": self.next_card_id,
+            "decks": list(self.decks),
+            "deck_ops": list(self.deck_ops),
+            "records": list(self.records.values()),
+        }
+
+    def write_snapshot(self, snapshot):
+        """Grava o snapshot e esvazia o log (roda na thread de gravação)"""
+        os.makedirs(self.directory, exist_ok=True)
+        write_json_atomic(self.snapshot_path, snapshot)
+        self.snapshot_size = os.path.getsize(self.snapshot_path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.log_size = 0
+
+    # ------------------------------------------------------------------
+    # Alterações
+    # ------------------------------------------------------------------
+    def _store(self, record):
+        self.records[record["id"]] = record
+        self.change_usns.append(record["usn"])
+        self.change_ids.append(record["id"])
+        if record.get("deck") is not None and record["deck"] not in self.decks:
+            self.decks.append(record["deck"])
+        self.next_card_id = max(self.next_card_id, record["id"] + 1)
+
+    def _apply_deck_op(self, op):
+        kind = op["op"]
+        if kind == "add_deck":
+            if op["name"] not in self.decks:
+                self.decks.append(op["name"])
+        elif kind == "rename_deck":
+            old_name, new_name = op["old"], op["new"]
+            if old_name not in self.decks or new_name in self.decks:
+                return
+            self.decks[self.decks.index(old_name)] = new_name
+            # Os clientes aplicam a mesma operação: os cartões não mudam de versão
+            for card_id, record in self.records.items():
+                if record.get("deck") == old_name:
+                    self.records[card_id] = dict(record, deck=new_name)
+        elif kind == "delete_deck":
+            deck_name = op["name"]
+            if deck_name == "Geral" or deck_name not in self.decks:
+                return
+            self.decks.remove(deck_name)
+            for card_id, record in self.records.items():
+                if record.get("deck") == deck_name:
+                    self.records[card_id] = dict(record, deck="Geral")
+
+    def changes_since(self, since, until):
+        """Cartões e exclusões com versão em (since, until]"""
+        cards = []
+        graves = []
+        seen = set()
+        start = bisect_right(self.change_usns, since)
+        end = bisect_right(self.change_usns, until)
+        for usn, card_id in zip(self.change_usns[start:end], self.change_ids[start:end]):
+            record = self.records[card_id]
+            if card_id in seen or record["usn"] != usn:
+                continue  # substituído por uma alteração mais nova
+            seen.add(card_id)
+            if record.get("deleted"):
+                graves.append(card_id)
+            else:
+                cards.append(record)
+        return cards, graves
+
+    def apply(self, request):
+        """Aplica um lote de um cliente; retorna (resposta, linha do log ou None)"""
+        since = request["since"]
+        current = self.version
+        version = current + 1
+        self.next_card_id = max(self.next_card_id, request.get("next_card_id", 1))
+
+        deck_ops = request.get("deck_ops", [])
+        for op in deck_ops:
+            self._apply_deck_op(op)
+
+        accepted = []
+        renumbered = {}
+        for card in request.get("cards", []):
+            card_id = card["id"]
+            existing = self.records.get(card_id)
+            if "usn" not in card:
+                # Cartão nunca sincronizado: o id pode já estar em uso
+                if existing is not None:
+                    renumbered[card_id] = self.next_card_id
+                    card_id = self.next_card_id
+                    self.next_card_id += 1
+            elif existing is not None and existing["usn"] > since:
+                # Alterado por outro cliente depois da última sincronização
+                # deste: vence a exclusão ou a alteração mais recente
+                if existing.get("deleted") or existing.get("mod", 0) > card.get("mod", 0):
+                    continue
+            record = dict(card, id=card_id, usn=version)
+            accepted.append(record)
+            self._store(record)
+
+        for card_id in request.get("graves", []):
+            existing = self.records.get(card_id)
+            if existing is not None and not existing.get("deleted"):
+                record = {"id": card_id, "deleted": True, "usn": version}
+                accepted.append(record)
+                self._store(record)
+
+        line = None
+        if accepted or deck_ops:
+            self.version = version
+            for op in deck_ops:
+                self.deck_ops.append((version, op))
+            line = json.dumps({"version": version, "deck_ops": deck_ops, "records": accepted,
+                               "next_card_id": self.next_card_id},
+                              ensure_ascii=False, separators=(",", ":")) + "\n"
+
+        cards, graves = self.changes_since(since, current)
+        response = {
+            "version": self.version,
+            "next_card_id": self.next_card_id,
+            "deck_ops": [op for usn, op in self.deck_ops if since < usn <= current],
+            "cards": cards,
+            "graves": graves,
+            "renumbered": renumbered,
+        }
+        return response, line
+
+    def status(self):
+        live = sum(1 for record in self.records.values() if not record.get("deleted"))
+        return {"version": self.version, "cards": live, "decks": list(self.decks)}
+
+
+class SyncService:
+    """Aplica os lotes no laço de eventos e grava em uma thread dedicada"""
+
+    def __init__(self, directory):
+        self.collection = SyncCollection(directory)
+        # Uma única thread: as linhas do log ficam na ordem das versões
+        self.writer = ThreadPoolExecutor(max_workers=1)
+
+    async def sync(self, request):
+        if not isinstance(request.get("since"), int):
+            raise HTTPError(400, "campo since ausente")
+        response, line = self.collection.apply(request)
+        if line is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.writer, self.collection.write_entry, line)
+            if self.collection.needs_compaction():
+                snapshot = self.collection.snapshot_data()
+                await loop.run_in_executor(self.writer, self.collection.write_snapshot, snapshot)
+        return response
+
+    def close(self):
+        self.writer.shutdown(wait=True)
+
+
+class SyncServer(ReviewServer):
+    """Rotas de sincronização sobre o mesmo servidor HTTP do server.py"""
+
+    max_body_size = MAX_SYNC_BODY_SIZE
+
+    async def dispatch(self, method, target, body):
+        path = urlsplit(target).path.rstrip("/")
+        if path == "/sync":
+            if method != "POST":
+                raise HTTPError(405, "método não permitido")
+            try:
+                request = decode_batch(body)
+            except (OSError, EOFError, ValueError):
+                raise HTTPError(400, "lote inválido")
+            if not isinstance(request, dict):
+                raise HTTPError(400, "lote inválido")
+            response = await self.service.sync(request)
+            return 200, encode_batch(response), CONTENT_TYPE
+        if path == "/status" and method == "GET":
+            payload = json.dumps(self.service.collection.status(), ensure_ascii=False)
+            return 200, payload.encode("utf-8"), "application/json; charset=utf-8"
+        raise HTTPError(404, "rota não encontrada")
+
+
+async def serve(directory, host, port):
+    service = SyncService(directory)
+    server = SyncServer(service)
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+
+    status = service.collection.status()
+    print(f"Servidor de sincronização em http://{host}:{port}/ "
+          f"(versão {status['version']}, {status['cards']} cartões)")
+    try:
+        await stop.wait()
+    finally:
+        tcp_server.close()
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de sincronização do PyCard")
+    parser.add_argument("--dir", default="sync_data", help="pasta dos dados do servidor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.dir, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
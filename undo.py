@@ -0,0 +1,391 @@
+"""Desfazer/refazer por diferenças.
+
+Cada ação do usuário (criar, editar, excluir ou mover cartões, operações em
+lote, criar, renomear ou excluir baralhos, responder na revisão) registra um
+passo com as operações inversas necessárias, e não uma cópia da coleção: a
+memória usada cresce com o tamanho das alterações (uma cópia rasa de cada
+cartão alterado, o baralho anterior de cada cartão movido) e não com o da
+coleção, então centenas de passos cabem mesmo em coleções enormes.
+
+As operações são simétricas: aplicar uma operação troca o estado guardado
+pelo atual, e a mesma operação serve depois para refazer. Os passos são
+desfeitos em ordem inversa, então cada um encontra a coleção como a deixou:
+cada cartão é guardado com a sua posição na lista e o seu baralho, e
+aplicar um passo altera só as listas dos baralhos envolvidos e as entradas
+desses cartões no índice (ver index.CardIndex), sem percorrer a coleção.
+Cartões devolvidos voltam ao fim da lista; ao excluir, o último cartão da
+lista ocupa a posição liberada, então a ordem da lista (não a dos
+baralhos) pode mudar.
+
+Exclusões e merges feitos fora do UndoLog mudam as posições; o cartão é
+então procurado pelo próprio dicionário (preservado nos merges, ver
+FlashcardApp.replace_deck_cards) no índice. Cartões que sumiram nesse meio
+tempo (excluídos por outro processo) são ignorados.
+
+As operações recebem o aplicativo (FlashcardApp) e usam suas estruturas e
+auxiliares (flashcards, decks, card_index, sync_journal, reindex_cards,
+ensure_deck_loaded...); cada uma retorna os baralhos a gravar.
+"""
+from collections import deque
+
+from cards import SEARCH_KEYS, touch_card
+
+# Passos mantidos para desfazer; os mais antigos são descartados
+UNDO_LIMIT = 300
+
+
+class UndoError(Exception):
+    """A coleção mudou de um jeito que impede desfazer o passo (ex.: um
+    baralho com o mesmo nome foi criado por outro processo)"""
+
+
+def _index(app):
+    """O índice do aplicativo, se está em dia com a lista (senão ele é
+    descartado e será recriado no próximo uso)"""
+    index = app.card_index
+    if index is not None and index.size != len(app.flashcards):
+        app.card_index = index = None
+    return index
+
+
+def _locate(app, entries):
+    """Confere a posição e o baralho guardados de cada cartão ([(cartão,
+    posição, baralho)]) e retorna a lista conferida, com posição None para
+    os cartões que não estão mais na coleção.
+
+    Enquanto a disposição da lista não muda a conferência é O(1) por
+    cartão; os que mudaram de posição (exclusões ou merges depois do passo)
+    são procurados no índice.
+    """
+    flashcards = app.flashcards
+    located = []
+    index = None
+    for card, i, deck_name in entries:
+        if (i is None or i >= len(flashcards) or flashcards[i] is not card
+                or deck_name not in app.decks):
+            if index is None:
+                index = app.get_card_index()
+            i = index.position(card)
+            if i is not None:
+                deck_name = index.owners()[i] or "Geral"
+        located.append((card, i, deck_name))
+    return located
+
+
+def _drop_positions(deck_cards, positions):
+    """Tira as posições da lista de um baralho; se são as últimas (cartões
+    acrescentados pelo próprio passo) a lista não é percorrida"""
+    tail = len(deck_cards) - len(positions)
+    if tail >= 0 and positions.issuperset(deck_cards[tail:]):
+        del deck_cards[tail:]
+    else:
+        deck_cards[:] = [i for i in deck_cards if i not in positions]
+
+
+def _replace_position(deck_cards, old, new):
+    """Troca uma posição na lista de um baralho, mantendo a ordem"""
+    slot = len(deck_cards) - 1 if deck_cards and deck_cards[-1] == old else deck_cards.index(old)
+    deck_cards[slot] = new
+
+
+def _remove_cards(app, found):
+    """Exclui os cartões localizados ([(cartão, posição, baralho)]) e
+    retorna os baralhos alterados.
+
+    Cada cartão troca de lugar com o último da lista e é retirado do fim:
+    só o cartão que ocupa a posição liberada muda de posição (nas listas
+    dos baralhos ele continua no mesmo lugar), e o índice é atualizado com
+    swap_cards e remove_tail, sem percorrer a coleção.
+    """
+    if not found:
+        return set()
+    flashcards = app.flashcards
+    app.sync_journal.extend({"op": "delete_card", "id": card["id"]}
+                            for card, _, _ in sorted(found, key=lambda entry: entry[1]))
+    index = app.get_card_index()
+    owners = index.owners()
+    changed = set()
+    # Das posições maiores para as menores: o último cartão nunca é um dos
+    # que ainda faltam excluir
+    for card, i, _ in sorted(found, key=lambda entry: entry[1], reverse=True):
+        deck_name = owners[i]
+        if deck_name is not None:
+            deck_cards = app.decks[deck_name]
+            if deck_cards[-1] == i:
+                deck_cards.pop()
+            else:
+                deck_cards.remove(i)
+            changed.add(deck_name)
+        last = len(flashcards) - 1
+        if i != last:
+            if owners[last] is not None:
+                _replace_position(app.decks[owners[last]], last, i)
+            index.swap_cards(i, last)
+            flashcards[i], flashcards[last] = flashcards[last], flashcards[i]
+        index.remove_tail(1)
+        flashcards.pop()
+        for filtered_deck in app.filtered_decks.values():
+            filtered_deck.discard(card)
+    return changed
+
+
+class CardEdit:
+    """Cartões alterados no lugar (edição, revisão, operações em lote):
+    guarda uma cópia rasa de cada um, tirada antes da alteração.
+    entries: [(cartão, posição, baralho)]"""
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.contents = [dict(card) for card, _, _ in self.entries]
+
+    def apply(self, app):
+        contents = []
+        for (card, _, _), content in zip(self.entries, self.contents):
+            contents.append(dict(card))
+            card.clear()
+            card.update(content)
+            touch_card(card)
+        self.contents = contents
+        SEARCH_KEYS.add_cards([card for card, _, _ in self.entries])
+        self.entries = _locate(app, self.entries)
+        found = [(i, deck_name) for _, i, deck_name in self.entries if i is not None]
+        app.reindex_cards([i for i, _ in found])
+        return {deck_name for _, deck_name in found}
+
+
+class ReviewAnswer(CardEdit):
+    """Uma resposta na revisão: o agendamento do cartão, a linha anexada ao
+    histórico (removida ao desfazer, se ainda for a última) e a contagem no
+    resumo diário"""
+
+    def __init__(self, card, position, deck_name):
+        super().__init__([(card, position, deck_name)])
+        self.card = card
+        self.row = None
+        self.values = None
+        self.rollup = None       # argumentos de DailyActivity.record
+        self.counted_in = False
+
+    def counted(self, *rollup):
+        """Informa a resposta somada ao resumo diário"""
+        self.rollup = rollup
+        self.counted_in = True
+
+    def recorded(self, row, **values):
+        """Informa a linha e os valores gravados no histórico"""
+        self.row = row
+        self.values = values
+
+    def apply(self, app):
+        if self.row is not None:
+            if not app.history.retract(self.row):
+                self.values = None   # outra revisão veio depois: a linha fica
+            self.row = None
+        elif self.values is not None:
+            self.row = app.history.append(**self.values)
+        if self.rollup is not None:
+            app.activity.record(*self.rollup, undo=self.counted_in)
+            self.counted_in = not self.counted_in
+        return super().apply(app)
+
+
+class CardRows:
+    """Cartões criados ou excluídos. present diz se eles estão na coleção
+    agora; aplicar exclui os presentes ou devolve os ausentes ao fim dos
+    seus baralhos. entries: [(cartão, posição, baralho)]"""
+
+    def __init__(self, entries, present):
+        self.entries = list(entries)
+        self.present = present
+
+    def apply(self, app):
+        if self.present:
+            found = [entry for entry in _locate(app, self.entries) if entry[1] is not None]
+            changed = _remove_cards(app, found)
+            self.entries = [(card, None, deck_name) for card, _, deck_name in found]
+        else:
+            changed = set()
+            entries = []
+            SEARCH_KEYS.add_cards([card for card, _, _ in self.entries])
+            for card, _, deck_name in self.entries:
+                if deck_name not in app.decks:
+                    deck_name = "Geral"
+                app.ensure_deck_loaded(deck_name)
+                # A exclusão pode já ter chegado ao servidor: sem "usn" o
+                # cartão é enviado como novo (e recebe outro id se preciso)
+                card.pop("usn", None)
+                touch_card(card)
+                i = len(app.flashcards)
+                index = _index(app)
+                app.decks[deck_name].append(i)
+                app.flashcards.append(card)
+                if index is not None:
+                    index.append_card(deck_name)
+                entries.append((card, i, deck_name))
+                changed.add(deck_name)
+            self.entries = entries
+            app.reindex_cards([i for _, i, _ in entries])   # baralhos filtrados
+        self.present = not self.present
+        return changed
+
+
+class CardMoves:
+    """Cartões movidos de baralho. entries: [(cartão, posição, baralho
+    anterior)]; deck_name: o baralho em que eles estão agora"""
+
+    def __init__(self, entries, deck_name):
+        self.entries = [(card, i, deck_name, previous) for card, i, previous in entries]
+
+    def apply(self, app):
+        located = _locate(app, [(card, i, current) for card, i, current, _ in self.entries])
+        moves = []
+        for (card, i, current), (_, _, _, target) in zip(located, self.entries):
+            if i is None:
+                continue
+            if target not in app.decks:
+                target = "Geral"
+            app.ensure_deck_loaded(target)   # só acrescenta: as posições valem
+            moves.append((card, i, current, target))
+
+        sources = {}
+        targets = {}
+        for card, i, current, target in moves:
+            if current != target:
+                sources.setdefault(current, set()).add(i)
+                targets.setdefault(target, []).append(i)
+                touch_card(card)
+        for deck_name, positions in sources.items():
+            _drop_positions(app.decks[deck_name], positions)
+        for deck_name, positions in targets.items():
+            app.decks[deck_name].extend(sorted(positions))
+        index = _index(app)
+        if index is not None:
+            for _, i, current, target in moves:
+                if current != target:
+                    index.move_card(i, current, target)
+        app.reindex_cards([i for positions in sources.values() for i in positions])
+        self.entries = [(card, i, target, current) for card, i, current, target in moves]
+        return set(sources) | set(targets)
+
+
+class DeckPresence:
+    """Baralho criado ou excluído. present diz se ele existe agora; ao ser
+    recriado volta à mesma posição, com seus parâmetros e limite diário"""
+
+    def __init__(self, name, present, position=None, params=None, limit=None):
+        self.name = name
+        self.present = present
+        self.position = position
+        self.params = params
+        self.limit = limit
+
+    def apply(self, app):
+        changed = set()
+        if self.present:
+            if self.name not in app.decks:
+                raise UndoError(f"o baralho '{self.name}' não existe mais")
+            app.ensure_deck_loaded(self.name)
+            self.position = list(app.decks).index(self.name)
+            self.params = app.scheduler_params.pop(self.name, None)
+            self.limit = app.daily_limits.pop(self.name, None)
+            # Cartões que entraram no baralho por fora vão para o Geral
+            leftovers = app.decks[self.name]
+            if leftovers:
+                app.ensure_deck_loaded("Geral")
+                app.decks["Geral"].extend(sorted(leftovers))
+                index = _index(app)
+                for i in leftovers:
+                    touch_card(app.flashcards[i])
+                    if index is not None:
+                        index.move_card(i, self.name, "Geral")
+                app.reindex_cards(leftovers)
+                app.decks[self.name] = []
+                changed.add("Geral")
+            app.drop_deck_in_memory(self.name)
+            app.sync_journal.append({"op": "delete_deck", "name": self.name})
+        else:
+            if self.name in app.decks:
+                raise UndoError(f"já existe um baralho chamado '{self.name}'")
+            items = list(app.decks.items())
+            items.insert(min(self.position, len(items)), (self.name, []))
+            app.decks.clear()
+            app.decks.update(items)
+            index = _index(app)
+            if index is not None:
+                index.add_deck(self.name)
+            if self.params is not None:
+                app.scheduler_params[self.name] = self.params
+            if self.limit is not None:
+                app.daily_limits[self.name] = self.limit
+            app.sync_journal.append({"op": "add_deck", "name": self.name})
+            changed.add(self.name)
+        self.present = not self.present
+        return changed
+
+
+class DeckRename:
+    """Baralho renomeado de old para new"""
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+
+    def apply(self, app):
+        if self.new not in app.decks or self.old in app.decks:
+            raise UndoError(f"o baralho '{self.new}' não pode voltar a se chamar '{self.old}'")
+        app.wait_for_save()
+        app.rename_deck_in_memory(self.new, self.old)
+        app.store.rename_deck(self.new, self.old)
+        app.sync_journal.append({"op": "rename_deck", "old": self.new, "new": self.old})
+        self.old, self.new = self.new, self.old
+        return set()
+
+
+class UndoLog:
+    """Pilhas de passos (título, operações) para desfazer e refazer"""
+
+    def __init__(self, limit=UNDO_LIMIT):
+        self._undo = deque(maxlen=limit)
+        self._redo = []
+
+    def record(self, title, *ops):
+        """Registra uma ação já feita; a pilha de refazer é descartada"""
+        self._undo.append((title, ops))
+        self._redo.clear()
+
+    @property
+    def undo_title(self):
+        return self._undo[-1][0] if self._undo else None
+
+    @property
+    def redo_title(self):
+        return self._redo[-1][0] if self._redo else None
+
+    def undo(self, app):
+        """Desfaz o último passo: (título, operações, baralhos alterados)"""
+        title, ops = self._undo.pop()
+        changed = self._apply(app, reversed(ops))
+        self._redo.append((title, ops))
+        return title, ops, changed
+
+    def redo(self, app):
+        """Refaz o último passo desfeito: (título, operações, baralhos alterados)"""
+        title, ops = self._redo.pop()
+        changed = self._apply(app, ops)
+        self._undo.append((title, ops))
+        return title, ops, changed
+
+    def _apply(self, app, ops):
+        changed = set()
+        try:
+            for op in ops:
+                changed |= op.apply(app)
+        except UndoError:
+            # Os passos restantes contam com um estado que não existe mais
+            self.clear()
+            raise
+        return changed
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()